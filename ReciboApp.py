@@ -1,66 +1,70 @@
 import sys
-import pandas as pd
+import time
+
+# Marcas de tempo da abertura do programa (exibidas no console ao mostrar a janela)
+_MARCAS_INICIALIZACAO = [("início", time.perf_counter())]
+
+
+def _marcar_inicializacao(etapa):
+    _MARCAS_INICIALIZACAO.append((etapa, time.perf_counter()))
+
+
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QGroupBox, QLabel, QLineEdit, QTextEdit, QPushButton,
     QListWidget, QMessageBox, QFileDialog, QSizePolicy, QComboBox,
     QStyle,
-    QScrollArea
+    QScrollArea, QInputDialog, QProgressBar, QTableView, QAbstractItemView, QHeaderView, QCompleter
 )
 from PyQt5.QtGui import QFont, QPainter, QPageLayout, QPageSize, QTextOption, QPixmap, QDoubleValidator, QIntValidator
-from PyQt5.QtCore import Qt, QDateTime, QRectF, QSizeF, QPointF
+from PyQt5.QtCore import Qt, QDateTime, QRectF, QSizeF, QPointF, QThreadPool, QStringListModel, QModelIndex, QTimer
+_marcar_inicializacao("PyQt5")
+import math
 import os
-import requests
 import subprocess
 import platform
-import base64
-from PIL import Image
+import multiprocessing
 import tempfile
 import atexit
-import io
 
-# --- IMPORTS PARA JINJA2 E WEASYPRINT ---
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML, CSS
+from armazenamento import (
+    ConflitoVersao, ALTERACAO_TODOS, normalizar_numero_recibo, normalizar_placa, normalizar_documento, normalizar_nome, normalizar_codigo_item,
+    chave_catalogo, ler_detalhes_itens_legado
+)
+from tarefas import TarefaGerarPDF, TarefaExportacaoLote, TarefaConsultarCEP
+from dialogos import DialogoExportacaoLote, DialogoHistorico, DialogoRelatorios
+from modelo_itens import ModeloItens
+from nucleo import (
+    resource_path, ARQUIVO_BANCO_RECIBOS, URL_SERVIDOR, ARQUIVO_EXCEL_RECIBO, PASTA_RECIBOS_GERADOS, ARQUIVO_LOGO,
+    INFO_OFICINA, ErroValidacao, abrir_armazenamento, abrir_consulta_cep, criar_renderizador, calcular_item, montar_recibo,
+    validar_recibo, preparar_para_salvar, nome_arquivo_pdf, IndicePrefixo
+)
+_marcar_inicializacao("módulos do aplicativo")
 
+# Pacotes pesados carregados só quando usados: WeasyPrint/Jinja2 no primeiro PDF,
+# requests na primeira consulta de CEP, pandas ao importar/exportar Excel
+MODULOS_ADIADOS = ["weasyprint", "jinja2", "requests", "pandas", "numpy", "PIL"]
 
-# --- FIM DOS IMPORTS ---
+# Verificação de alterações feitas por outras estações no mesmo banco. Acima do limite de recibos
+# alterados de uma vez, histórico e sugestões são relidos inteiros em vez de recibo a recibo
+INTERVALO_ALTERACOES_MS = 2000
+LIMITE_ALTERACOES_INCREMENTAIS = 200
 
-# --- Configurações Globais ---
-def resource_path(relative_path):
-    """ Retorna o caminho absoluto para um recurso, funciona para dev e para PyInstaller """
-    try:
-        # PyInstaller cria uma pasta temporária e armazena o caminho em _MEIPASS
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
-# Determina o diretório base para arquivos de DADOS (Excel, PDFs gerados)
-if getattr(sys, 'frozen', False):
-    # Se estiver rodando como um executável PyInstaller (.exe)
-    application_path = os.path.dirname(sys.executable)
-else:
-    # Se estiver rodando como um script .py normal
-    application_path = os.path.dirname(os.path.abspath(__file__))
-
-# Arquivo Excel para salvar dados do Recibo (sempre ao lado do .exe)
-ARQUIVO_EXCEL_RECIBO = os.path.join(application_path, "Recibos_Historico.xlsx")
-# Pasta para PDFs (sempre ao lado do .exe)
-PASTA_RECIBOS_GERADOS = os.path.join(application_path, "Recibos_Gerados")
-
-# Recursos internos da aplicação (imagens, templates)
-ARQUIVO_LOGO = resource_path(os.path.join("resources", "logo.png"))
-HTML_TEMPLATE_RECIBO = resource_path("recibo_template.html") # Ajustado para pegar da raiz do bundle
-
-INFO_OFICINA = {
-    "nome": "CR Soluções Automotivas",
-    "endereco": "Estrada do barro vermelho 341 - Rocha Miranda - RJ",
-    "cep": "21540-500",
-    "telefone": "(21) 99757-0103 / 97125-0490",
-    "email": "thiagosoarescruz01@gmail.com",
-    "cnpj": "48.969.894/0001-59"
-}
+
+def _relatorio_inicializacao():
+    """ Tempo de cada etapa da abertura, e aviso se algum pacote adiado foi importado antes da hora """
+    linhas = ["Tempo de inicialização:"]
+    for (_, anterior), (etapa, instante) in zip(_MARCAS_INICIALIZACAO, _MARCAS_INICIALIZACAO[1:]):
+        linhas.append(f"  {etapa:<28}{(instante - anterior) * 1000:8.1f} ms")
+    total = _MARCAS_INICIALIZACAO[-1][1] - _MARCAS_INICIALIZACAO[0][1]
+    linhas.append(f"  {'total':<28}{total * 1000:8.1f} ms")
+    carregados = [nome for nome in MODULOS_ADIADOS if nome in sys.modules]
+    if carregados:
+        linhas.append(f"  ALERTA: importados antes da janela aparecer: {', '.join(carregados)}")
+    return "\n".join(linhas)
+
+
+# --- FIM DOS IMPORTS ---
 
 _temp_files_to_clean = []
 
@@ -215,120 +219,70 @@ class ReciboApp(QWidget):
                                  f"Não foi possível criar a pasta '{PASTA_RECIBOS_GERADOS}': {e}\nVerifique as permissões.")
             print(f"Erro ao criar pasta: {e}", file=sys.stderr)
 
-        self.df_recibos = self._carregar_dados_recibos()
-        self.itens_pecas_servicos_cache = []
-
-        self.env = Environment(loader=FileSystemLoader(resource_path("resources")))
-        self.env.filters['format_money'] = self._format_money_filter
-        self.env.filters['km_format'] = self._km_format_filter
-        self.env.filters['default_if_nan'] = self._default_if_nan_filter
+        self.armazenamento = self._abrir_armazenamento()
+        _marcar_inicializacao("banco de recibos")
+        # Número do recibo carregado do histórico (None = recibo novo, numerado ao salvar) e a versão
+        # lida, conferida ao salvar para não sobrescrever alterações feitas em outra estação
+        self.recibo_carregado = None
+        self.versao_carregada = None
+        self.modelo_itens = ModeloItens(self)
+        self.dialogo_historico = None
+        self.dialogo_relatorios = None
+        self.consulta_cep = None
+        # Consultas de CEP em segundo plano; a geração invalida respostas de CEPs já editados
+        self.pool_cep = QThreadPool(self)
+        self.pool_cep.setMaxThreadCount(2)
+        self._tarefa_cep = None
+        self._geracao_cep = 0
+        self._cep_consultado = None
+        # Sugestões de CPF/CNPJ e placa já cadastrados; cada índice é lido do banco na primeira digitação
+        self._indices_cadastro = {}
+        self._autocompletar = {}
+        self._sugestoes_cadastro = {}
+        # Catálogo de peças e serviços (chave -> item com o último preço), lido junto com seus índices
+        self._catalogo = {}
+
+        self.renderizador = criar_renderizador()
+        # Uma thread para PDFs: a interface continua livre e as renderizações não disputam o WeasyPrint
+        self.pool_pdf = QThreadPool(self)
+        self.pool_pdf.setMaxThreadCount(1)
+        self._tarefas_pdf = set()
+        self._tarefa_lote = None
 
         self._criar_interface()
         self._gerar_novo_id_recibo()
-
-    def _format_money_filter(self, value):
-        try:
-            if pd.isna(value) or value is None:
-                value = 0.0
-            val = float(value)
-            return f"{val:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-        except (ValueError, TypeError):
-            return f"{0.00:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-
-    def _km_format_filter(self, value):
-        try:
-            if pd.isna(value) or value is None:
-                value = ""
-            clean_text = ''.join(filter(str.isdigit, str(value)))
-            if clean_text:
-                return f"{int(clean_text):,}".replace(',', '.')
-            return ""
-        except (ValueError, TypeError):
-            return ""
-
-    def _default_if_nan_filter(self, value):
-        if pd.isna(value) or value is None:
-            return ""
-        return str(value)
-
-    def _carregar_dados_recibos(self):
-        excel_path = resource_path(ARQUIVO_EXCEL_RECIBO)
-        if os.path.exists(excel_path):
-            try:
-                converters = {
-                    'Numero_Recibo': str,
-                    'KM_Atual_Veiculo': lambda x: int(str(x).replace('.', '').replace(',', '')) if str(x).replace('.',
-                                                                                                                  '').replace(
-                        ',', '').isdigit() else pd.NA,
-                    'Valor_Total_Final': lambda x: float(str(x).replace('.', '').replace(',', '.')) if isinstance(x,
-                                                                                                                  str) and ',' in x else float(
-                        x) if x is not None else pd.NA,
-                    'Deslocamento': lambda x: float(str(x).replace('.', '').replace(',', '.')) if isinstance(x,
-                                                                                                             str) and ',' in x else float(
-                        x) if x is not None else pd.NA,
-                    'Desconto_Geral': lambda x: float(str(x).replace('.', '').replace(',', '.')) if isinstance(x,
-                                                                                                               str) and ',' in x else float(
-                        x) if x is not None else pd.NA,
-                }
-                df = pd.read_excel(excel_path, converters=converters)
-                df['Numero_Recibo'] = df['Numero_Recibo'].astype(str).str.strip()
-                print(f"Dados carregados de {excel_path}")
-                for col in self._get_expected_columns():
-                    if col not in df.columns:
-                        df[col] = pd.NA
-                return df
-            except Exception as e:
-                QMessageBox.critical(self, "Erro de Leitura",
-                                     f"Erro ao carregar o arquivo Excel: {e}\nUm novo arquivo será criado.")
-                return self._criar_dataframe_vazio_e_salvar()
-        else:
-            print(f"Arquivo {excel_path} não encontrado. Criando e inicializando novo DataFrame.")
-            return self._criar_dataframe_vazio_e_salvar()
-
-    def _get_expected_columns(self):
-        return [
-            "Numero_Recibo", "Data_Recibo", "Hora_Recibo",
-            "Nome_Cliente",
-            "Rua_Cliente", "Numero_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente", 
-            "CEP_Cliente", "Telefone_Cliente", "CPF_CNPJ_Cliente",
-            "Placa_Veiculo", "Marca_Veiculo", "Modelo_Veiculo", "Cor_Veiculo", "Ano_Veiculo",
-            "KM_Entrada_Veiculo", "KM_Saida_Veiculo",
-            "Combustivel_Veiculo", "Box_Veiculo",
-            "Problema_Informado", "Problema_Constatado", "Servico_Executado",
-            "Detalhes_Itens", "Total_Itens",
-            "Deslocamento", "Desconto_Geral", "Valor_Total_Final",
-            "Responsavel", "Situacao_Atual", "Condicoes_Pagamento",
-            "Email_Cliente", "Observacoes_Gerais", "Prox_Revisao",
-            # Coluna antiga mantida para compatibilidade, mas não usada na UI nova
-            "Endereco_Cliente"
-        ]
-
-    def _criar_dataframe_vazio_e_salvar(self):
-        colunas = self._get_expected_columns()
-        df = pd.DataFrame(columns=colunas)
+        self._atualizar_painel()
+
+        # Alterações de outras estações: PRAGMA data_version é consultado a cada intervalo (sem ler
+        # tabelas); só quando ele muda o registro de alterações é lido, a partir da última vista
+        self._versao_dados = self.armazenamento.versao_dados()
+        self._ultima_alteracao = self.armazenamento.ultima_alteracao()
+        self.timer_alteracoes = QTimer(self)
+        self.timer_alteracoes.setInterval(INTERVALO_ALTERACOES_MS)
+        self.timer_alteracoes.timeout.connect(self._verificar_alteracoes)
+        self.timer_alteracoes.start()
+
+    def _abrir_armazenamento(self):
         try:
-            df.to_excel(resource_path(ARQUIVO_EXCEL_RECIBO), index=False)
-            print(f"Arquivo Excel vazio '{ARQUIVO_EXCEL_RECIBO}' criado com sucesso.")
+            armazenamento = abrir_armazenamento()
+            print(f"Banco de recibos aberto em {URL_SERVIDOR or ARQUIVO_BANCO_RECIBOS}")
+            return armazenamento
         except Exception as e:
-            QMessageBox.critical(self, "Erro de Escritura",
-                                 f"Não foi possível criar o arquivo Excel vazio: {e}. Verifique as permissões da pasta.")
-        return df
+            QMessageBox.critical(self, "Erro de Leitura",
+                                 f"Erro ao abrir o banco de recibos: {e}\nVerifique as permissões da pasta.")
+            raise
 
     def _gerar_novo_id_recibo(self):
-        if not self.df_recibos.empty:
-            numeros_validos = self.df_recibos['Numero_Recibo'].astype(str).apply(
-                lambda x: ''.join(filter(str.isdigit, x)))
-            ultimos_numeros = [int(n) for n in numeros_validos if n]
-            if ultimos_numeros:
-                novo_id = max(ultimos_numeros) + 1
-            else:
-                novo_id = 1
-        else:
-            novo_id = 1
+        self.recibo_carregado = None
+        self.versao_carregada = None
+        novo_id = self.armazenamento.proximo_numero()
         self.entry_numero_recibo.setText(str(novo_id).zfill(6))
         self.entry_numero_recibo.setReadOnly(True)
 
     def _limpar_campos(self):
+        # Uma consulta de CEP pendente não deve preencher o endereço do próximo recibo
+        self._cancelar_consulta_cep()
+        self._cep_consultado = None
         for entry in self.findChildren(QLineEdit):
             entry.clear()
         for text_edit in self.findChildren(QTextEdit):
@@ -346,12 +300,8 @@ class ReciboApp(QWidget):
         # Limpar combobox de tipo de item
         self.combo_item_tipo.setCurrentIndex(0)
         
-        # Limpar lista de itens
-        self.itens_pecas_servicos_cache = []
-        self.listbox_itens.clear()
-        
-        # Atualizar totais
-        self._atualizar_totais()
+        # Limpar lista de itens (os totais são atualizados pelo modelo)
+        self.modelo_itens.limpar()
         
         # Gerar novo ID de recibo
         self._gerar_novo_id_recibo()
@@ -413,15 +363,33 @@ class ReciboApp(QWidget):
         recibo_info_layout.addWidget(self.label_data, 0, 3, Qt.AlignLeft)
         recibo_info_layout.setColumnStretch(3, 0)
 
-        recibo_info_layout.addWidget(QLabel("Buscar Recibo por ID:"), 1, 0, Qt.AlignLeft)
+        # Painel do dia e do mês, lido dos resumos materializados (consulta por chave, não soma o histórico)
+        self.label_painel = QLabel()
+        self.label_painel.setFont(QFont("Arial", 8))
+        recibo_info_layout.addWidget(self.label_painel, 0, 4, 1, 2, Qt.AlignRight)
+
+        recibo_info_layout.addWidget(QLabel("Buscar Recibo por:"), 1, 0, Qt.AlignLeft)
+        self.combo_busca_campo = QComboBox()
+        # texto exibido -> campo de busca do armazenamento
+        for texto, campo in [("Número", "numero"), ("Placa", "placa"), ("CPF/CNPJ", "cpf_cnpj"), ("Nome", "nome"),
+                             ("Qualquer palavra", "texto")]:
+            self.combo_busca_campo.addItem(texto, campo)
+        recibo_info_layout.addWidget(self.combo_busca_campo, 1, 1, Qt.AlignLeft)
+
         self.entry_busca_recibo = QLineEdit()
-        self.entry_busca_recibo.setFixedWidth(80)
-        recibo_info_layout.addWidget(self.entry_busca_recibo, 1, 1, Qt.AlignLeft)
+        self.entry_busca_recibo.setFixedWidth(160)
+        self.entry_busca_recibo.returnPressed.connect(self._buscar_recibo)
+        recibo_info_layout.addWidget(self.entry_busca_recibo, 1, 2, Qt.AlignLeft)
 
         btn_buscar = QPushButton("Buscar")
         btn_buscar.clicked.connect(self._buscar_recibo)
         btn_buscar.setIcon(self.style().standardIcon(QStyle.SP_FileDialogToParent))
-        recibo_info_layout.addWidget(btn_buscar, 1, 2, 1, 2, Qt.AlignLeft)
+        recibo_info_layout.addWidget(btn_buscar, 1, 3, Qt.AlignLeft)
+
+        btn_historico = QPushButton("Histórico")
+        btn_historico.clicked.connect(self._abrir_historico)
+        btn_historico.setIcon(self.style().standardIcon(QStyle.SP_FileDialogDetailedView))
+        recibo_info_layout.addWidget(btn_historico, 1, 4, Qt.AlignLeft)
 
         # --- Layout Horizontal para Dados do Cliente e Dados do Veículo ---
         main_content_top_horizontal_layout = QHBoxLayout()
@@ -472,9 +440,11 @@ class ReciboApp(QWidget):
             elif field_name_internal == "cpf_cnpj":
                 entry.setValidator(QIntValidator())
                 entry.textChanged.connect(lambda text, e=entry: self._formatar_telefone_cpf_cnpj(e, "cpf_cnpj"))
+                self._configurar_autocompletar(entry, "clientes")
             elif field_name_internal == "cep":
                 entry.setValidator(QIntValidator())
                 entry.editingFinished.connect(self._autopreencher_cep)
+                entry.textEdited.connect(self._cep_editado)
             elif field_name_internal == "número":
                 entry.setValidator(QIntValidator())
 
@@ -526,6 +496,9 @@ class ReciboApp(QWidget):
                 self.entries_veiculo[field_name_internal] = entry
                 veiculo_layout.addWidget(entry, row, widget_col)
 
+                if field_name_internal == "placa":
+                    self._configurar_autocompletar(entry, "veiculos")
+
                 if field_name_internal == "ano":
                     entry.setValidator(QIntValidator(1900, QDateTime.currentDateTime().date().year() + 5))
                 elif field_name_internal == "km_entrada" or field_name_internal == "km_saída":
@@ -554,12 +527,14 @@ class ReciboApp(QWidget):
         self.entry_item_codigo.setPlaceholderText("Código/Ref")
         self.entry_item_codigo.setFixedWidth(80)
         itens_layout.addWidget(self.entry_item_codigo, 0, 3, Qt.AlignLeft)
+        self._configurar_autocompletar(self.entry_item_codigo, "codigo_item")
         itens_layout.setColumnStretch(3, 0)
 
         itens_layout.addWidget(QLabel("Descrição:"), 0, 4, Qt.AlignLeft)
         self.entry_item_desc = QLineEdit()
         self.entry_item_desc.setPlaceholderText("Descrição do Item/Serviço")
         itens_layout.addWidget(self.entry_item_desc, 0, 5, Qt.AlignLeft)
+        self._configurar_autocompletar(self.entry_item_desc, "descricao_item")
         itens_layout.setColumnStretch(5, 1)
 
         itens_layout.addWidget(QLabel("Val Unit:"), 0, 6, Qt.AlignLeft)
@@ -587,8 +562,18 @@ class ReciboApp(QWidget):
         itens_layout.addWidget(btn_add_item, 0, 12, 1, 2, Qt.AlignLeft)
         itens_layout.setColumnStretch(12, 0)
 
-        self.listbox_itens = QListWidget()
-        itens_layout.addWidget(self.listbox_itens, 1, 0, 1, 14)
+        # Quantidade, valor unitário e desconto podem ser editados direto na tabela (duplo clique)
+        self.tabela_itens = QTableView()
+        self.tabela_itens.setModel(self.modelo_itens)
+        self.tabela_itens.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabela_itens.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tabela_itens.verticalHeader().setVisible(False)
+        self.tabela_itens.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.tabela_itens.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.modelo_itens.totalAlterado.connect(self._atualizar_totais)
+        self.modelo_itens.edicaoInvalida.connect(
+            lambda mensagem: QMessageBox.warning(self, "Entrada Inválida", mensagem))
+        itens_layout.addWidget(self.tabela_itens, 1, 0, 1, 14)
         itens_layout.setRowStretch(1, 1)
         btn_rem_item = QPushButton("Remover Item Selecionado")
         btn_rem_item.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
@@ -687,6 +672,33 @@ class ReciboApp(QWidget):
         btn_imprimir.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
         button_layout.addWidget(btn_imprimir)
 
+        btn_exportar = QPushButton("Exportar Excel")
+        btn_exportar.clicked.connect(self._exportar_excel)
+        btn_exportar.setObjectName("btnExportar")
+        btn_exportar.setIcon(self.style().standardIcon(QStyle.SP_DialogSaveButton))
+        button_layout.addWidget(btn_exportar)
+
+        self.btn_exportar_lote = QPushButton("PDFs em Lote")
+        self.btn_exportar_lote.clicked.connect(self._exportar_lote)
+        self.btn_exportar_lote.setObjectName("btnGerarPDF")
+        self.btn_exportar_lote.setIcon(self.style().standardIcon(QStyle.SP_DirIcon))
+        button_layout.addWidget(self.btn_exportar_lote)
+
+        btn_relatorios = QPushButton("Relatórios")
+        btn_relatorios.clicked.connect(self._abrir_relatorios)
+        btn_relatorios.setObjectName("btnExportar")
+        btn_relatorios.setIcon(self.style().standardIcon(QStyle.SP_FileDialogContentsView))
+        button_layout.addWidget(btn_relatorios)
+
+        self.barra_progresso_pdf = QProgressBar()
+        self.barra_progresso_pdf.setRange(0, 100)
+        self.barra_progresso_pdf.setFixedWidth(140)
+        self.barra_progresso_pdf.setVisible(False)
+        button_layout.addWidget(self.barra_progresso_pdf)
+
+        self.label_status_pdf = QLabel("")
+        button_layout.addWidget(self.label_status_pdf)
+
         btn_sair = QPushButton("Sair")
         btn_sair.clicked.connect(self.close)
         btn_sair.setObjectName("btnSair")
@@ -782,49 +794,16 @@ class ReciboApp(QWidget):
             QMessageBox.warning(self, "Formato Inválido", "Valor monetário inválido. Use apenas números.")
 
     def _adicionar_item(self):
-        tipo = self.combo_item_tipo.currentText().strip()
-        referencia = self.entry_item_codigo.text().strip()
-        descricao = self.entry_item_desc.text().strip()
-        valor_str = self.entry_item_valor.text().strip().replace(',', '.')
-        qtd_str = self.entry_item_qtd.text().strip()
-        desc_perc_str = self.entry_item_desc_perc.text().strip()
-
-        if not tipo or not referencia or not descricao or not valor_str or not qtd_str:
-            QMessageBox.warning(self, "Entrada Inválida", "Por favor, preencha todos os campos do item.")
-            return
-
         try:
-            valor_unitario = float(valor_str)
-            quantidade = int(qtd_str)
-            desconto_percentual = float(desc_perc_str) if desc_perc_str else 0.0
-
-            if valor_unitario <= 0 or quantidade <= 0:
-                QMessageBox.warning(self, "Entrada Inválida", "Valor unitário e quantidade devem ser maiores que zero.")
-                return
-            if not (0 <= desconto_percentual <= 100):
-                QMessageBox.warning(self, "Entrada Inválida", "Desconto percentual deve estar entre 0 e 100.")
-                return
-
-        except ValueError:
-            QMessageBox.warning(self, "Entrada Inválida", "Valores numéricos inválidos. Use apenas números.")
+            item_data = calcular_item(
+                self.combo_item_tipo.currentText(), self.entry_item_codigo.text(), self.entry_item_desc.text(),
+                self.entry_item_valor.text(), self.entry_item_qtd.text(), self.entry_item_desc_perc.text()
+            )
+        except ErroValidacao as e:
+            QMessageBox.warning(self, "Entrada Inválida", str(e))
             return
 
-        valor_total_item_sem_desc = valor_unitario * quantidade
-        valor_total_item = valor_total_item_sem_desc * (1 - (desconto_percentual / 100))
-
-        item_data = {
-            "tipo": tipo,
-            "codigo": referencia,
-            "descricao": descricao,
-            "uni": "un",
-            "valor": valor_unitario,
-            "quantia": quantidade,
-            "desc": desconto_percentual,
-            "valor_total": valor_total_item
-        }
-        self.itens_pecas_servicos_cache.append(item_data)
-        self.listbox_itens.addItem(
-            f"Tipo: {tipo} | Código: {referencia} - {descricao} | Qtd: {quantidade} x R${valor_unitario:.2f} | Desc: {desconto_percentual:.0f}% = R${valor_total_item:.2f}")
+        self.modelo_itens.adicionar(item_data)
 
         self.combo_item_tipo.setCurrentIndex(0)
         self.entry_item_codigo.clear()
@@ -833,23 +812,20 @@ class ReciboApp(QWidget):
         self.entry_item_qtd.setText("1")
         self.entry_item_desc_perc.setText("0")
 
-        self._atualizar_totais()
-
     def _remover_item(self):
         try:
-            selected_row = self.listbox_itens.currentRow()
+            selected_row = self.tabela_itens.currentIndex().row()
             if selected_row != -1:
-                self.listbox_itens.takeItem(selected_row)
-                del self.itens_pecas_servicos_cache[selected_row]
-                self._atualizar_totais()
+                self.modelo_itens.remover(selected_row)
             else:
                 QMessageBox.warning(self, "Seleção Inválida", "Por favor, selecione um item para remover.")
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Ocorreu um erro ao remover o item: {e}")
 
-    def _atualizar_totais(self):
+    def _atualizar_totais(self, subtotal_itens=None):
         try:
-            subtotal_itens = sum(item['valor_total'] for item in self.itens_pecas_servicos_cache)
+            if subtotal_itens is None:
+                subtotal_itens = self.modelo_itens.total
             
             # Agora o valor total é igual ao subtotal dos itens
             valor_total_final = subtotal_itens
@@ -868,53 +844,241 @@ class ReciboApp(QWidget):
             self.label_subtotal_itens.setText("Subtotal Itens: R$ 0,00")
             self.label_valor_total.setText("Valor Total: R$ 0,00")
 
+    def _consulta_cep(self):
+        # Criada no primeiro uso: a primeira abertura semeia o cache a partir do histórico
+        if self.consulta_cep is None:
+            self.consulta_cep = abrir_consulta_cep(self.armazenamento)
+        return self.consulta_cep
+
+    def _limpar_endereco(self):
+        self.entries_cliente["rua"].clear()
+        self.entries_cliente["bairro"].clear()
+        self.entries_cliente["cidade"].clear()
+        self.entries_cliente["uf"].clear()
+
+    def _cep_editado(self, texto):
+        self._cep_consultado = None
+        self._cancelar_consulta_cep()
+
+    def _cancelar_consulta_cep(self):
+        """ O CEP foi editado: a resposta de uma consulta anterior não deve mais preencher o endereço """
+        self._geracao_cep += 1
+        if self._tarefa_cep is not None:
+            # Ainda na fila: nem chega a ir à rede. Já em execução: a resposta será descartada
+            self.pool_cep.tryTake(self._tarefa_cep)
+            self._tarefa_cep = None
+            self.entries_cliente["rua"].setPlaceholderText("")
+
     def _autopreencher_cep(self):
         cep = self.entries_cliente["cep"].text().strip().replace('-', '')
         print(f"DEBUG: Autopreencher CEP chamado para: '{cep}'", file=sys.stderr)
         if len(cep) == 8 and cep.isdigit():
-            url = f"https://viacep.com.br/ws/{cep}/json/"
+            if self._cep_consultado == cep:
+                return  # editingFinished repetido (ex.: foco saiu de novo) sem o CEP ter mudado
+            self._cancelar_consulta_cep()
+            self._cep_consultado = cep
             try:
-                response = requests.get(url, timeout=5)
-                response.raise_for_status()
-                data = response.json()
-                print(f"DEBUG: Resposta da ViaCEP: {data}", file=sys.stderr)
-
-                if "erro" not in data:
-                    self.entries_cliente["rua"].setText(data.get("logradouro", "") or "")
-                    self.entries_cliente["bairro"].setText(data.get("bairro", "") or "")
-                    self.entries_cliente["cidade"].setText(data.get("localidade", "") or "")
-                    self.entries_cliente["uf"].setText(data.get("uf", "") or "")
-                    self.entries_cliente["número"].setFocus() # Pula para o campo número
-                else:
-                    QMessageBox.warning(self, "CEP Inválido", "CEP não encontrado ou inválido.")
-                    self.entries_cliente["rua"].clear()
-                    self.entries_cliente["bairro"].clear()
-                    self.entries_cliente["cidade"].clear()
-                    self.entries_cliente["uf"].clear()
-            except requests.exceptions.RequestException as e:
-                QMessageBox.critical(self, "Erro de Conexão",
-                                     f"Não foi possível consultar o CEP: {e}\nVerifique sua conexão com a internet.")
+                consulta_cep = self._consulta_cep()
+                # Em cache ou na base offline a resposta é imediata; só a ida à rede vai para segundo plano
+                data = consulta_cep.consultar_local(cep)
+                if data is not None:
+                    self._preencher_endereco(data)
+                    return
             except Exception as e:
                 QMessageBox.critical(self, "Erro Inesperado", f"Ocorreu um erro ao autopreencher o CEP: {e}")
+                return
+
+            tarefa = TarefaConsultarCEP(consulta_cep, cep, self._geracao_cep)
+            tarefa.sinais.concluido.connect(self._cep_consultado_ok)
+            tarefa.sinais.falhou.connect(self._cep_falhou)
+            self._tarefa_cep = tarefa
+            self.entries_cliente["rua"].setPlaceholderText("Consultando CEP...")
+            self.pool_cep.start(tarefa)
         elif len(cep) > 0 and (len(cep) != 8 or not cep.isdigit()):
             QMessageBox.warning(self, "CEP Inválido", "CEP deve conter 8 dígitos numéricos.")
-            self.entries_cliente["rua"].clear()
-            self.entries_cliente["bairro"].clear()
-            self.entries_cliente["cidade"].clear()
-            self.entries_cliente["uf"].clear()
+            self._limpar_endereco()
+
+    def _preencher_endereco(self, data):
+        self.entries_cliente["rua"].setText(data.get("logradouro", "") or "")
+        self.entries_cliente["bairro"].setText(data.get("bairro", "") or "")
+        self.entries_cliente["cidade"].setText(data.get("localidade", "") or "")
+        self.entries_cliente["uf"].setText(data.get("uf", "") or "")
+        self.entries_cliente["número"].setFocus() # Pula para o campo número
+
+    def _resposta_cep_atual(self, geracao):
+        if geracao != self._geracao_cep:
+            return False  # Pedido abandonado: o usuário já digitou outro CEP
+        self._tarefa_cep = None
+        self.entries_cliente["rua"].setPlaceholderText("")
+        return True
+
+    def _cep_consultado_ok(self, geracao, cep, data):
+        if not self._resposta_cep_atual(geracao):
+            return
+        if data is not None:
+            self._preencher_endereco(data)
+        else:
+            QMessageBox.warning(self, "CEP Inválido", "CEP não encontrado ou inválido.")
+            self._limpar_endereco()
 
-    def _coletar_dados_form(self):
-        # Coleta os campos de endereço separados
-        rua = self.entries_cliente["rua"].text()
-        numero = self.entries_cliente["número"].text()
-        bairro = self.entries_cliente["bairro"].text()
-        cidade = self.entries_cliente["cidade"].text()
-        uf = self.entries_cliente["uf"].text()
+    def _cep_falhou(self, geracao, cep, mensagem, erro_de_conexao):
+        if not self._resposta_cep_atual(geracao):
+            return
+        self._cep_consultado = None  # Permite tentar de novo
+        if erro_de_conexao:
+            QMessageBox.critical(self, "Erro de Conexão",
+                                 f"Não foi possível consultar o CEP: {mensagem}\nVerifique sua conexão com a internet.")
+        else:
+            QMessageBox.critical(self, "Erro Inesperado", f"Ocorreu um erro ao autopreencher o CEP: {mensagem}")
+
+    # --- Cadastros de Clientes, Veículos e Catálogo de Itens (autocompletar) ---
+    _NORMALIZAR_CADASTRO = {
+        "clientes": normalizar_documento, "veiculos": normalizar_placa,
+        "codigo_item": normalizar_codigo_item, "descricao_item": normalizar_nome,
+    }
+
+    def _configurar_autocompletar(self, entry, tipo):
+        modelo = QStringListModel(self)
+        completer = QCompleter(modelo, self)
+        # Sem filtro do Qt: a lista já chega pronta do índice de prefixos
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setWidget(entry)
+        completer.activated[QModelIndex].connect(lambda index, t=tipo: self._cadastro_escolhido(t, index.row()))
+        entry.textEdited.connect(lambda texto, t=tipo: self._sugerir_cadastro(t, texto))
+        entry.editingFinished.connect(lambda t=tipo: self._cadastro_digitado(t))
+        self._autocompletar[tipo] = (entry, completer, modelo)
+
+    def _indice_cadastro(self, tipo):
+        """ Índice de prefixos do tipo: chave -> texto mostrado na lista de sugestões """
+        if tipo not in self._indices_cadastro:
+            if tipo in ("codigo_item", "descricao_item"):
+                self._carregar_catalogo()
+            else:
+                self._indices_cadastro[tipo] = IndicePrefixo(
+                    (chave, f"{chave}  {rotulo}".strip()) for chave, rotulo in self.armazenamento.listar_cadastro(tipo))
+        return self._indices_cadastro[tipo]
+
+    def _carregar_catalogo(self):
+        self._catalogo = {}
+        self._indices_cadastro["codigo_item"] = IndicePrefixo()
+        self._indices_cadastro["descricao_item"] = IndicePrefixo()
+        for item in self.armazenamento.listar_catalogo():
+            self._incluir_no_catalogo(item)
+
+    def _incluir_no_catalogo(self, item):
+        anterior = self._catalogo.get(item["chave"])
+        if anterior is not None:
+            self._indices_cadastro["descricao_item"].remover(f"{normalizar_nome(anterior['descricao'])}\0{item['chave']}")
+        self._catalogo[item["chave"]] = item
+        preco = f"R$ {item['valor'] or 0:.2f}".replace('.', ',')
+        if not item["chave"].startswith("#"):
+            self._indices_cadastro["codigo_item"].adicionar(item["chave"], f"{item['codigo']}  {item['descricao']}  {preco}")
+        # Descrições podem se repetir entre códigos: a chave do catálogo vai depois de um separador
+        self._indices_cadastro["descricao_item"].adicionar(
+            f"{normalizar_nome(item['descricao'])}\0{item['chave']}", f"{item['descricao']}  ({item['codigo']})  {preco}")
+
+    def _sugerir_cadastro(self, tipo, texto):
+        _, completer, modelo = self._autocompletar[tipo]
+        prefixo = self._NORMALIZAR_CADASTRO[tipo](texto)
+        sugestoes = self._indice_cadastro(tipo).sugestoes(prefixo) if len(prefixo) >= 2 else []
+        self._sugestoes_cadastro[tipo] = [chave for chave, _ in sugestoes]
+        modelo.setStringList([rotulo for _, rotulo in sugestoes])
+        if sugestoes:
+            completer.complete()
+        else:
+            completer.popup().hide()
+
+    def _cadastro_escolhido(self, tipo, linha):
+        chave = self._sugestoes_cadastro[tipo][linha]
+        if tipo in ("codigo_item", "descricao_item"):
+            self._preencher_item_catalogo(chave.split("\0")[-1], trocar=True)
+        else:
+            self._preencher_cadastro(tipo, chave, trocar_chave=True)
+
+    def _cadastro_digitado(self, tipo):
+        if tipo == "descricao_item":
+            return  # Descrição só preenche o item quando uma sugestão é escolhida
+        chave = self._NORMALIZAR_CADASTRO[tipo](self._autocompletar[tipo][0].text())
+        if not chave or chave not in self._indice_cadastro(tipo):
+            return
+        if tipo == "codigo_item":
+            self._preencher_item_catalogo(chave)
+        else:
+            self._preencher_cadastro(tipo, chave)
 
-        # Cria a string de endereço combinado para compatibilidade
-        endereco_completo = ", ".join(filter(None, [rua, numero, bairro, cidade, uf]))
+    def _preencher_item_catalogo(self, chave, trocar=False):
+        """ Preenche tipo, código, descrição e o último valor unitário usado para o item do catálogo.
+        Sem trocar (código digitado), mantém a descrição e o valor já digitados """
+        item = self._catalogo.get(chave)
+        if item is None:
+            return
+        if item["tipo"] and (trocar or not self.combo_item_tipo.currentText()):
+            self.combo_item_tipo.setCurrentText(item["tipo"])
+        if trocar or not self.entry_item_codigo.text().strip():
+            self.entry_item_codigo.setText(item["codigo"] or "")
+        if trocar or not self.entry_item_desc.text().strip():
+            self.entry_item_desc.setText(item["descricao"] or "")
+        valor_atual = self.entry_item_valor.text().strip().replace(',', '.')
+        if item["valor"] and (trocar or not valor_atual or valor_atual in ("0", "0.00", "0.0")):
+            self.entry_item_valor.setText(f"{item['valor']:.2f}")
+
+    def _campos_cadastro(self):
+        """ Coluna do recibo -> widget do formulário, para os campos guardados nos cadastros """
+        return {
+            "CPF_CNPJ_Cliente": self.entries_cliente["cpf_cnpj"], "Nome_Cliente": self.entries_cliente["nome"],
+            "Telefone_Cliente": self.entries_cliente["telefone"], "Email_Cliente": self.entries_cliente["email"],
+            "CEP_Cliente": self.entries_cliente["cep"], "Rua_Cliente": self.entries_cliente["rua"],
+            "Numero_Cliente": self.entries_cliente["número"], "Bairro_Cliente": self.entries_cliente["bairro"],
+            "Cidade_Cliente": self.entries_cliente["cidade"], "UF_Cliente": self.entries_cliente["uf"],
+            "Placa_Veiculo": self.entries_veiculo["placa"], "Marca_Veiculo": self.entries_veiculo["marca"],
+            "Modelo_Veiculo": self.entries_veiculo["modelo"], "Cor_Veiculo": self.entries_veiculo["cor"],
+            "Ano_Veiculo": self.entries_veiculo["ano"], "Combustivel_Veiculo": self.entries_veiculo["combustível"],
+        }
+
+    def _preencher_cadastro(self, tipo, chave, trocar_chave=False):
+        """ Completa o formulário com o cadastro do cliente ou do veículo. Só campos vazios são
+        preenchidos, para não desfazer o que já foi digitado neste recibo """
+        dados = self.armazenamento.obter_cadastro(tipo, chave)
+        if dados is None:
+            return
+        campos = self._campos_cadastro()
+        if trocar_chave:
+            coluna_chave = "CPF_CNPJ_Cliente" if tipo == "clientes" else "Placa_Veiculo"
+            campos[coluna_chave].setText(dados[coluna_chave] or chave)
+        for coluna, valor in dados.items():
+            widget = campos[coluna]
+            if not valor:
+                continue
+            if isinstance(widget, QComboBox):
+                if not widget.currentText():
+                    widget.setCurrentText(valor)
+            elif not widget.text():
+                widget.setText(valor)
+        if tipo == "veiculos" and dados.get("CPF_CNPJ_Cliente"):
+            # Dono do veículo no último recibo: completa também os dados do cliente
+            self._preencher_cadastro("clientes", dados["CPF_CNPJ_Cliente"])
+
+    def _registrar_cadastros(self, dados):
+        """ Inclui o cliente, o veículo e os itens recém-salvos nos índices já carregados, sem reler o banco """
+        documento = normalizar_documento(dados.get("CPF_CNPJ_Cliente"))
+        if documento and "clientes" in self._indices_cadastro:
+            self._indices_cadastro["clientes"].adicionar(
+                documento, f"{documento}  {dados.get('Nome_Cliente') or ''}".strip())
+        placa = normalizar_placa(dados.get("Placa_Veiculo"))
+        if placa and "veiculos" in self._indices_cadastro:
+            rotulo = " ".join(filter(None, [placa, dados.get("Marca_Veiculo"), dados.get("Modelo_Veiculo")]))
+            self._indices_cadastro["veiculos"].adicionar(placa, rotulo)
+        if "codigo_item" in self._indices_cadastro:
+            for item in dados.get("Itens_Recibo") or []:
+                chave = chave_catalogo(item.get("codigo"), item.get("descricao"))
+                if chave:
+                    self._incluir_no_catalogo({
+                        "chave": chave, "codigo": item.get("codigo"), "descricao": item.get("descricao"),
+                        "tipo": item.get("tipo"), "uni": item.get("uni"), "valor": item.get("valor"),
+                    })
 
-        dados = {
+    def _coletar_dados_form(self):
+        campos = {
             "Numero_Recibo": self.entry_numero_recibo.text(),
             "Data_Recibo": self.label_data.text().split(' ')[0],
             "Hora_Recibo": self.label_data.text().split(' ')[1],
@@ -922,17 +1086,13 @@ class ReciboApp(QWidget):
             "Telefone_Cliente": self.entries_cliente["telefone"].text(),
             "CPF_CNPJ_Cliente": self.entries_cliente["cpf_cnpj"].text(),
             "Email_Cliente": self.entries_cliente.get("email", QLineEdit()).text(),
-            
-            # Campos novos
-            "Rua_Cliente": rua,
-            "Numero_Cliente": numero,
-            "Bairro_Cliente": bairro,
-            "Cidade_Cliente": cidade,
-            "UF_Cliente": uf,
-            
-            # Campo antigo para compatibilidade
-            "Endereco_Cliente": endereco_completo,
-            
+
+            # Campos de endereço separados (o endereço combinado é montado em montar_recibo)
+            "Rua_Cliente": self.entries_cliente["rua"].text(),
+            "Numero_Cliente": self.entries_cliente["número"].text(),
+            "Bairro_Cliente": self.entries_cliente["bairro"].text(),
+            "Cidade_Cliente": self.entries_cliente["cidade"].text(),
+            "UF_Cliente": self.entries_cliente["uf"].text(),
             "CEP_Cliente": self.entries_cliente["cep"].text(),
 
             "Placa_Veiculo": self.entries_veiculo["placa"].text(),
@@ -945,41 +1105,28 @@ class ReciboApp(QWidget):
             "Combustivel_Veiculo": self.entries_veiculo["combustível"].currentText() if isinstance(self.entries_veiculo["combustível"], QComboBox) else "",
             "Box_Veiculo": self.entries_veiculo["box"].currentText() if isinstance(self.entries_veiculo["box"], QComboBox) else "",
 
-            "Problema_Informado": "",  # Não usado diretamente no recibo
-            "Problema_Constatado": "",  # Não usado diretamente no recibo
-            "Servico_Executado": "",  # Não usado diretamente no recibo
-
-            "Detalhes_Itens": "; ".join([
-                                            f"Tipo: {item['tipo']} | Código: {item['codigo']} | Descrição: {item['descricao']} | Quantia: {item['quantia']} | Valor Unit: {item['valor']:.2f} | Desc(%): {item['desc']:.0f} | Valor Total: {item['valor_total']:.2f}"
-                                            for item in self.itens_pecas_servicos_cache]),
-            "Total_Itens": sum(item['valor_total'] for item in self.itens_pecas_servicos_cache),
-            "Deslocamento": 0.0,  # Removido da interface, mantido para compatibilidade
-            "Desconto_Geral": 0.0,  # Removido da interface, mantido para compatibilidade
-            "Valor_Total_Final": sum(item['valor_total'] for item in self.itens_pecas_servicos_cache),
             "Responsavel": self.entry_responsavel.text(),
             "Situacao_Atual": self.combo_situacao_atual.currentText(),
             "Condicoes_Pagamento": self.combo_condicoes_pagamento.currentText(),
             "Observacoes_Gerais": self.text_observacoes.toPlainText(),
             "Prox_Revisao": self.entry_prox_revisao.text()
         }
-        dados["Valor_Total_Final"] = dados["Total_Itens"]  # Simplificado - apenas subtotal dos itens
-
-        dados["Itens_Recibo"] = self.itens_pecas_servicos_cache
-
-        return dados
+        return montar_recibo(campos, self.modelo_itens.itens())
 
     def _preencher_campos_form(self, dados_recibo_dict):
         self._limpar_campos()
 
         def get_display_value(key, default_value=""):
             value = dados_recibo_dict.get(key, default_value)
-            if pd.isna(value) or value is None:
+            if value is None or (isinstance(value, float) and math.isnan(value)):
                 return ""
             return str(value)
 
         self.entry_numero_recibo.setReadOnly(False)
         self.entry_numero_recibo.setText(get_display_value("Numero_Recibo"))
         self.entry_numero_recibo.setReadOnly(True)
+        self.recibo_carregado = get_display_value("Numero_Recibo")
+        self.versao_carregada = dados_recibo_dict.get("versao")
 
         self.label_data.setText(f"{get_display_value('Data_Recibo')} {get_display_value('Hora_Recibo')}")
 
@@ -1017,65 +1164,54 @@ class ReciboApp(QWidget):
         self.text_observacoes.setText(get_display_value("Observacoes_Gerais"))
         self.entry_prox_revisao.setText(get_display_value("Prox_Revisao"))
 
-        self.itens_pecas_servicos_cache = []
-        self.listbox_itens.clear()
-
-        detalhes_itens_excel_str = get_display_value("Detalhes_Itens")
-        if detalhes_itens_excel_str:
-            for item_entry_str in detalhes_itens_excel_str.split('; '):
-                if item_entry_str.strip():
-                    try:
-                        parts = {}
-                        for part in item_entry_str.split(' | '):
-                            if ': ' in part:
-                                k, v = part.split(': ', 1)
-                                parts[k.strip()] = v.strip()
-
-                        item_data = {
-                            "tipo": parts.get("Tipo", "N/A"),
-                            "codigo": parts.get("Código", parts.get("Ref", "N/A")),
-                            "descricao": parts.get("Descrição", parts.get("Desc", "N/A")),
-                            "uni": parts.get("Uni", "un"),
-                            "valor": float(parts.get("Valor Unit", "0.0").replace('R$', '').replace(',', '.').strip()),
-                            "quantia": int(parts.get("Quantia", "0").strip()),
-                            "desc": float(parts.get("Desc(%)", "0.0").replace('%', '').strip()),
-                            "valor_total": float(
-                                parts.get("Valor Total", "0.0").replace('R$', '').replace(',', '.').strip()),
-                        }
-                        self.itens_pecas_servicos_cache.append(item_data)
-                        self.listbox_itens.addItem(
-                            f"Tipo: {item_data['tipo']} | Código: {item_data['codigo']} - {item_data['descricao']} | Qtd: {item_data['quantia']} x R${item_data['valor']:.2f} | Desc: {item_data['desc']:.0f}% = R${item_data['valor_total']:.2f}"
-                        )
-                    except Exception as e:
-                        print(f"Erro ao parsear item do Excel durante o carregamento: '{item_entry_str}' - {e}",
-                              file=sys.stderr)
-                        self.listbox_itens.addItem(item_entry_str)
-
-        self._atualizar_totais()
+        itens = dados_recibo_dict.get("Itens_Recibo")
+        if itens is None:
+            # Recibo no formato antigo: itens ainda como texto em Detalhes_Itens
+            itens = ler_detalhes_itens_legado(get_display_value("Detalhes_Itens"))
+        self.modelo_itens.carregar(itens)
 
     def _buscar_recibo(self):
         try:
-            recibo_id_busca = self.entry_busca_recibo.text().strip()
+            termo_busca = self.entry_busca_recibo.text().strip()
+            campo_busca = self.combo_busca_campo.currentData()
+            texto_campo = self.combo_busca_campo.currentText()
 
-            if not recibo_id_busca:
-                QMessageBox.warning(self, "Campo Vazio", "Por favor, digite o número do Recibo para buscar.")
+            if not termo_busca:
+                QMessageBox.warning(self, "Campo Vazio", f"Por favor, digite o {texto_campo} para buscar.")
                 return
 
-            if recibo_id_busca.isdigit():
-                recibo_id_busca = str(recibo_id_busca).zfill(6)
-            print(f"DEBUG: Buscando Recibo com ID formatado: '{recibo_id_busca}'", file=sys.stderr)
+            if campo_busca == "numero":
+                termo_busca = normalizar_numero_recibo(termo_busca)
+            print(f"DEBUG: Buscando Recibo por {campo_busca}: '{termo_busca}'", file=sys.stderr)
 
-            recibo_encontrado = self.df_recibos[self.df_recibos['Numero_Recibo'] == recibo_id_busca]
+            recibos_encontrados = self.armazenamento.buscar(campo_busca, termo_busca)
 
-            if not recibo_encontrado.empty:
-                dados_recibo_dict = recibo_encontrado.iloc[0].to_dict()
-                self._preencher_campos_form(dados_recibo_dict)
-                QMessageBox.information(self, "Recibo Encontrado", f"Recibo {recibo_id_busca} carregado com sucesso!")
-                self.entry_busca_recibo.clear()
-            else:
+            if not recibos_encontrados:
                 QMessageBox.warning(self, "Recibo Não Encontrado",
-                                    f"Recibo {recibo_id_busca} não encontrado no arquivo Excel.")
-                self._limpar_campos()
+                                    f"Nenhum recibo encontrado para {texto_campo} '{termo_busca}'.")
+                if campo_busca == "numero":
+                    self._limpar_campos()
+                return
+
+            dados_recibo_dict = recibos_encontrados[0]
+            if len(recibos_encontrados) > 1:
+                opcoes = [
+                    f"{r['Numero_Recibo']} - {r['Data_Recibo'] or ''} - {r['Nome_Cliente'] or ''} - {r['Placa_Veiculo'] or ''}"
+                    for r in recibos_encontrados
+                ]
+                escolha, ok = QInputDialog.getItem(self, "Recibos Encontrados",
+                                                   f"{len(recibos_encontrados)} recibos encontrados. Selecione um:",
+                                                   opcoes, 0, False)
+                if not ok:
+                    return
+                dados_recibo_dict = recibos_encontrados[opcoes.index(escolha)]
+
+            # A busca traz só o cabeçalho; o recibo completo (com itens) vem pela chave primária
+            dados_recibo_dict = self.armazenamento.obter(dados_recibo_dict['Numero_Recibo'])
+            self._preencher_campos_form(dados_recibo_dict)
+            QMessageBox.information(self, "Recibo Encontrado",
+                                    f"Recibo {dados_recibo_dict['Numero_Recibo']} carregado com sucesso!")
+            self.entry_busca_recibo.clear()
         except Exception as e:
             QMessageBox.critical(self, "Erro na Busca", f"Erro ao buscar recibo: {str(e)}")
             print(f"Erro na busca de recibo: {e}", file=sys.stderr)
@@ -1084,85 +1220,43 @@ class ReciboApp(QWidget):
         try:
             dados_recibo_coletados = self._coletar_dados_form()
 
-            # Validação mais robusta dos campos obrigatórios
-            campos_obrigatorios = {
-                "Nome_Cliente": "Nome do Cliente",
-                "Valor_Total_Final": "Valor Total Final"
-            }
-            
-            campos_vazios = []
-            for campo, nome_exibicao in campos_obrigatorios.items():
-                valor = dados_recibo_coletados.get(campo)
-                if valor is None or (isinstance(valor, str) and not valor.strip()) or (isinstance(valor, (int, float)) and valor == 0):
-                    if campo == "Valor_Total_Final" and str(valor) in ["0,00", "0.0", "0"]:
-                        campos_vazios.append(nome_exibicao)
-                    elif campo != "Valor_Total_Final":
-                        campos_vazios.append(nome_exibicao)
-            
-            # Verificar se há pelo menos um item
-            if not self.itens_pecas_servicos_cache:
-                campos_vazios.append("Pelo menos um item/serviço")
-            
+            campos_vazios = validar_recibo(dados_recibo_coletados)
             if campos_vazios:
                 QMessageBox.warning(self, "Dados Incompletos",
                                     f"Os seguintes campos são obrigatórios:\n\n• " + "\n• ".join(campos_vazios))
                 return
 
-            dados_salvar = dados_recibo_coletados.copy()
-
-            # Define colunas que devem ser tratadas como texto
-            colunas_texto = [
-                "Rua_Cliente", "Numero_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente", 
-                "CEP_Cliente", "Telefone_Cliente", "CPF_CNPJ_Cliente", "Nome_Cliente", 
-                "Placa_Veiculo", "Marca_Veiculo", "Modelo_Veiculo", "Cor_Veiculo", "Ano_Veiculo"
-            ]
-            for col in colunas_texto:
-                if col in dados_salvar:
-                    dados_salvar[col] = str(dados_salvar[col]) if pd.notna(dados_salvar[col]) else ""
-
-            # Conversão e limpeza de dados numéricos para salvar no Excel
-            colunas_numericas = ["KM_Entrada_Veiculo", "KM_Saida_Veiculo", "Total_Itens", "Valor_Total_Final"]
-            for key in colunas_numericas:
-                val = dados_salvar.get(key)
-                if isinstance(val, str):
-                    clean_val = val.replace('.', '').replace(',', '.')
-                    if clean_val.isdigit():
-                        dados_salvar[key] = float(clean_val)
-                    else:
-                        dados_salvar[key] = pd.NA
-                elif isinstance(val, (int, float)):
-                    pass # já está no formato correto
-                else:
-                    dados_salvar[key] = pd.NA
-
-            if str(dados_salvar["Numero_Recibo"]).isdigit():
-                dados_salvar["Numero_Recibo"] = str(dados_salvar["Numero_Recibo"]).zfill(6)
-            
-            df_nova_recibo_linha = pd.DataFrame([dados_salvar])
-
-            current_recibo_id = str(dados_recibo_coletados['Numero_Recibo'])
-            recibo_existente_idx = self.df_recibos[self.df_recibos['Numero_Recibo'].astype(str) == current_recibo_id].index
-
-            if not recibo_existente_idx.empty:
-                idx = recibo_existente_idx[0]
-                # Garante que todas as colunas existem no DataFrame antes de atribuir
-                for col in df_nova_recibo_linha.columns:
-                    if col not in self.df_recibos.columns:
-                        self.df_recibos[col] = pd.NA
-                    # Tenta converter o tipo da coluna se for incompatível
-                    try:
-                        self.df_recibos.at[idx, col] = df_nova_recibo_linha.at[0, col]
-                    except (ValueError, TypeError):
-                        self.df_recibos[col] = self.df_recibos[col].astype(object)
-                        self.df_recibos.at[idx, col] = df_nova_recibo_linha.at[0, col]
+            dados_salvar = preparar_para_salvar(dados_recibo_coletados)
 
+            # Grava apenas a linha deste recibo, em uma transação. Recibos novos recebem o número
+            # da sequência no momento da gravação (outra estação pode ter usado o número exibido)
+            numero_exibido = dados_salvar["Numero_Recibo"]
+            versao = self.versao_carregada if self.recibo_carregado is not None else None
+            try:
+                current_recibo_id, atualizado = self.armazenamento.salvar(
+                    dados_salvar, novo=self.recibo_carregado is None, versao=versao)
+            except ConflitoVersao as conflito:
+                if not self._confirmar_sobrescrita(conflito):
+                    return
+                versao = conflito.versao_atual
+                current_recibo_id, atualizado = self.armazenamento.salvar(dados_salvar, versao=versao)
+            self.recibo_carregado = current_recibo_id
+            self.versao_carregada = (versao or 0) + 1 if atualizado else 1
+            self.entry_numero_recibo.setText(current_recibo_id)
+
+            if atualizado:
                 QMessageBox.information(self, "Recibo Atualizado", f"Recibo {current_recibo_id} atualizado com sucesso!")
+            elif current_recibo_id != numero_exibido:
+                QMessageBox.information(self, "Recibo Salvo",
+                                        f"O número {numero_exibido} já foi usado em outra estação.\n"
+                                        f"Recibo salvo com sucesso como {current_recibo_id}!")
             else:
-                self.df_recibos = pd.concat([self.df_recibos, df_nova_recibo_linha], ignore_index=True)
                 QMessageBox.information(self, "Recibo Salvo", f"Recibo {current_recibo_id} salvo com sucesso!")
-
-            self.df_recibos.to_excel(resource_path(ARQUIVO_EXCEL_RECIBO), index=False)
-            print(f"Dados salvos em {ARQUIVO_EXCEL_RECIBO}")
+            print(f"Recibo {current_recibo_id} salvo em {URL_SERVIDOR or ARQUIVO_BANCO_RECIBOS}")
+            self._registrar_cadastros(dados_salvar)
+            self._atualizar_historico()
+            self._atualizar_painel()
+            return current_recibo_id
 
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Salvar", f"Ocorreu um erro inesperado ao salvar o recibo:\n\n{e}")
@@ -1170,6 +1264,115 @@ class ReciboApp(QWidget):
             import traceback
             traceback.print_exc()
 
+    def _confirmar_sobrescrita(self, conflito):
+        """ Recibo alterado ou excluído em outra estação depois de aberto aqui. Retorna True para gravar
+        mesmo assim; "Não" descarta a edição local e abre a versão gravada """
+        if conflito.versao_atual is None:
+            texto = f"O recibo {conflito.numero_recibo} foi excluído em outra estação.\n\nDeseja gravá-lo novamente?"
+        else:
+            texto = (f"O recibo {conflito.numero_recibo} foi alterado em outra estação depois de aberto aqui.\n\n"
+                     "Sim: gravar esta versão, substituindo a alteração da outra estação.\n"
+                     "Não: descartar as alterações feitas aqui e abrir a versão gravada.")
+        resposta = QMessageBox.question(self, "Recibo Alterado em Outra Estação", texto,
+                                        QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Cancel)
+        if resposta == QMessageBox.No and conflito.versao_atual is not None:
+            self._carregar_recibo_historico(conflito.numero_recibo)
+        return resposta == QMessageBox.Yes
+
+    def _verificar_alteracoes(self):
+        try:
+            versao_dados = self.armazenamento.versao_dados()
+            if versao_dados == self._versao_dados:
+                return
+            self._versao_dados = versao_dados
+            alteracoes = self.armazenamento.alteracoes_desde(self._ultima_alteracao)
+        except Exception as e:
+            print(f"Erro ao verificar alterações de outras estações: {e}", file=sys.stderr)
+            return
+        if alteracoes:
+            self._ultima_alteracao = alteracoes[-1]["id"]
+            self._aplicar_alteracoes(alteracoes)
+
+    def _aplicar_alteracoes(self, alteracoes):
+        """ Atualiza histórico, sugestões, painel e próximo número com os recibos gravados em outra estação """
+        numeros = list(dict.fromkeys(alteracao["Numero_Recibo"] for alteracao in alteracoes))
+        print(f"{len(numeros)} recibo(s) alterado(s) em outra estação", file=sys.stderr)
+        if ALTERACAO_TODOS in numeros or len(numeros) > LIMITE_ALTERACOES_INCREMENTAIS:
+            # Alteração em massa: os índices são relidos na próxima digitação
+            self._indices_cadastro = {}
+            self._catalogo = {}
+            self._atualizar_historico()
+        else:
+            for alteracao in alteracoes:
+                if not alteracao["excluido"]:
+                    dados = self.armazenamento.obter(alteracao["Numero_Recibo"])
+                    if dados is not None:
+                        self._registrar_cadastros(dados)
+            if self.dialogo_historico is not None and self.dialogo_historico.isVisible():
+                self.dialogo_historico.atualizar_recibos(numeros)
+        self._atualizar_painel()
+        if self.recibo_carregado is None:
+            # O número exibido para o recibo novo pode ter sido usado pela outra estação
+            self.entry_numero_recibo.setText(str(self.armazenamento.proximo_numero()).zfill(6))
+        elif self.recibo_carregado in numeros and self._versao_gravada(self.recibo_carregado) != self.versao_carregada:
+            print(f"O recibo aberto ({self.recibo_carregado}) foi alterado em outra estação; "
+                  f"a diferença será avisada ao salvar", file=sys.stderr)
+
+    def _versao_gravada(self, numero_recibo):
+        dados = self.armazenamento.obter(numero_recibo)
+        return dados["versao"] if dados else None
+
+    def _abrir_historico(self):
+        # Janela não modal, reaproveitada: pode ficar aberta enquanto se edita o recibo
+        if self.dialogo_historico is None:
+            self.dialogo_historico = DialogoHistorico(self.armazenamento, self)
+            self.dialogo_historico.reciboEscolhido.connect(self._carregar_recibo_historico)
+        self.dialogo_historico.show()
+        self.dialogo_historico.raise_()
+        self.dialogo_historico.activateWindow()
+
+    def _abrir_relatorios(self):
+        if self.dialogo_relatorios is None:
+            self.dialogo_relatorios = DialogoRelatorios(self.armazenamento, self)
+            self.dialogo_relatorios.gerar()
+        self.dialogo_relatorios.show()
+        self.dialogo_relatorios.raise_()
+        self.dialogo_relatorios.activateWindow()
+
+    def _atualizar_historico(self):
+        if self.dialogo_historico is not None and self.dialogo_historico.isVisible():
+            self.dialogo_historico.atualizar()
+
+    def _atualizar_painel(self):
+        hoje = QDateTime.currentDateTime().date()
+        try:
+            dia = self.armazenamento.resumo_periodo("dia", hoje.toString("yyyy-MM-dd"))
+            mes = self.armazenamento.resumo_periodo("mes", hoje.toString("yyyy-MM"))
+        except Exception as e:
+            print(f"Erro ao ler o painel: {e}", file=sys.stderr)
+            return
+        def moeda(valor):
+            return "R$ " + f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+        recibos_dia, valor_dia = dia.get("recibos", (0, 0.0))
+        recibos_mes, valor_mes = mes.get("recibos", (0, 0.0))
+        servicos_mes, valor_servicos = mes.get("itens:Serviço", (0, 0.0))
+        self.label_painel.setText(
+            f"Hoje: {recibos_dia} recibo(s), {moeda(valor_dia)}<br>"
+            f"Mês: {recibos_mes} recibo(s), {moeda(valor_mes)} · {servicos_mes} serviço(s), {moeda(valor_servicos)}"
+        )
+
+    def _carregar_recibo_historico(self, numero_recibo):
+        try:
+            dados_recibo_dict = self.armazenamento.obter(numero_recibo)
+            if dados_recibo_dict is None:
+                QMessageBox.warning(self, "Recibo Não Encontrado", f"O recibo {numero_recibo} não existe mais.")
+                self._atualizar_historico()
+                return
+            self._preencher_campos_form(dados_recibo_dict)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro na Busca", f"Erro ao carregar recibo: {str(e)}")
+            print(f"Erro ao carregar recibo do histórico: {e}", file=sys.stderr)
+
     def _deletar_recibo(self):
         current_recibo_id = self.entry_numero_recibo.text().strip()
 
@@ -1177,57 +1380,128 @@ class ReciboApp(QWidget):
 
         if not id_to_delete:
             search_recibo_id = self.entry_busca_recibo.text().strip()
-            if search_recibo_id:
+            if search_recibo_id and self.combo_busca_campo.currentData() == "numero":
                 id_to_delete = search_recibo_id
             else:
                 QMessageBox.warning(self, "Deletar Recibo", "Nenhum Recibo carregado ou ID de busca para deletar.")
                 return
 
-        if id_to_delete.isdigit():
-            id_to_delete = str(id_to_delete).zfill(6)
+        id_to_delete = normalizar_numero_recibo(id_to_delete)
 
         reply = QMessageBox.question(self, 'Deletar Recibo',
                                      f"Tem certeza que deseja deletar o Recibo {id_to_delete}?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            recibo_existente_idx = self.df_recibos[self.df_recibos['Numero_Recibo'].astype(str) == id_to_delete].index
-            if not recibo_existente_idx.empty:
-                self.df_recibos = self.df_recibos.drop(recibo_existente_idx).reset_index(drop=True)
-                try:
-                    self.df_recibos.to_excel(resource_path(ARQUIVO_EXCEL_RECIBO), index=False)
+            # Recibo aberto na tela: só exclui a versão que está sendo vista
+            versao = self.versao_carregada if id_to_delete == self.recibo_carregado else None
+            try:
+                if self.armazenamento.deletar(id_to_delete, versao=versao):
                     QMessageBox.information(self, "Recibo Deletado",
-                                            f"Recibo {id_to_delete} deletado com sucesso do Excel!")
+                                            f"Recibo {id_to_delete} deletado com sucesso!")
                     self._limpar_campos()
-                except Exception as e:
-                    QMessageBox.critical(self, "Erro ao Deletar", f"Não foi possível deletar o Recibo do Excel: {e}")
-                    print(f"Detalles del error al eliminar Excel: {e}", file=sys.stderr)
-            else:
-                QMessageBox.warning(self, "Deletar Recibo", f"Recibo {id_to_delete} não encontrado para deletar.")
+                    self._atualizar_historico()
+                    self._atualizar_painel()
+                else:
+                    QMessageBox.warning(self, "Deletar Recibo", f"Recibo {id_to_delete} não encontrado para deletar.")
+            except ConflitoVersao as e:
+                QMessageBox.warning(self, "Deletar Recibo", f"{e}\nAbra o recibo novamente antes de excluí-lo.")
+            except Exception as e:
+                QMessageBox.critical(self, "Erro ao Deletar", f"Não foi possível deletar o Recibo: {e}")
+                print(f"Detalles del error al eliminar: {e}", file=sys.stderr)
+
+    def _exportar_excel(self):
+        caminho_excel, _ = QFileDialog.getSaveFileName(self, "Exportar Histórico", ARQUIVO_EXCEL_RECIBO,
+                                                       "Planilhas Excel (*.xlsx)")
+        if not caminho_excel:
+            return
+        try:
+            total = self.armazenamento.exportar_excel(caminho_excel)
+            QMessageBox.information(self, "Exportação Concluída",
+                                    f"{total} recibos exportados para:\n{caminho_excel}")
+        except Exception as e:
+            QMessageBox.critical(self, "Erro ao Exportar",
+                                 f"Não foi possível exportar o Excel: {e}\nFeche o arquivo se estiver aberto em outro programa.")
+            print(f"Erro ao exportar Excel: {e}", file=sys.stderr)
+
+    def _exportar_lote(self):
+        if self._tarefa_lote is not None:
+            QMessageBox.warning(self, "Exportação em Lote", "Já existe uma exportação em lote em andamento.")
+            return
+        dialogo = DialogoExportacaoLote(self, pasta_inicial=resource_path(PASTA_RECIBOS_GERADOS))
+        if dialogo.exec_() != DialogoExportacaoLote.Accepted:
+            return
+        parametros = dialogo.parametros()
+        if not parametros["pasta_saida"]:
+            QMessageBox.warning(self, "Exportação em Lote", "Escolha a pasta de destino.")
+            return
+        try:
+            numeros = self.armazenamento.listar_numeros(
+                parametros["data_inicio"], parametros["data_fim"], parametros["campo"], parametros["valor"])
+        except Exception as e:
+            QMessageBox.critical(self, "Exportação em Lote", f"Erro ao selecionar os recibos: {e}")
+            return
+        if not numeros:
+            QMessageBox.warning(self, "Exportação em Lote", "Nenhum recibo corresponde aos filtros escolhidos.")
+            return
+
+        arquivo_unico = None
+        if parametros["arquivo_unico"]:
+            nome = f"recibos_{QDateTime.currentDateTime().toString('yyyy-MM-dd_hhmmss')}.pdf"
+            arquivo_unico = os.path.join(parametros["pasta_saida"], nome)
+
+        self._tarefa_lote = TarefaExportacaoLote(self.armazenamento, numeros, parametros["pasta_saida"],
+                                                 self.renderizador, arquivo_unico)
+        self._tarefa_lote.sinais.progresso.connect(self._progresso_lote)
+        self._tarefa_lote.sinais.concluido.connect(self._lote_concluido)
+        self._tarefa_lote.sinais.falhou.connect(self._lote_falhou)
+        self.btn_exportar_lote.setEnabled(False)
+        self.barra_progresso_pdf.setValue(0)
+        self.barra_progresso_pdf.setVisible(True)
+        self.label_status_pdf.setText(f"Exportando {len(numeros)} recibos...")
+        QThreadPool.globalInstance().start(self._tarefa_lote)
+
+    def _progresso_lote(self, concluidos, total):
+        self.barra_progresso_pdf.setValue(int(concluidos * 100 / total))
+        self.label_status_pdf.setText(f"Exportando recibos: {concluidos}/{total}")
+
+    def _finalizar_lote(self):
+        self._tarefa_lote = None
+        self.btn_exportar_lote.setEnabled(True)
+        if not self._tarefas_pdf:
+            self.barra_progresso_pdf.setVisible(False)
+
+    def _lote_concluido(self, resultado):
+        self._finalizar_lote()
+        self.label_status_pdf.setText(f"Lote exportado: {resultado.resumo()}")
+        mensagem = f"Exportação concluída:\n{resultado.resumo()}"
+        if resultado.falhas:
+            mensagem += "\n\nFalhas:\n" + "\n".join(f"• {numero}: {erro}" for numero, erro in resultado.falhas[:10])
+        QMessageBox.information(self, "Exportação em Lote", mensagem)
+
+    def _lote_falhou(self, mensagem):
+        self._finalizar_lote()
+        self.label_status_pdf.setText("Falha na exportação em lote")
+        QMessageBox.critical(self, "Exportação em Lote", f"Erro na exportação em lote:\n\n{mensagem}")
+
+    def closeEvent(self, event):
+        self.timer_alteracoes.stop()
+        # Espera PDFs em andamento antes de fechar o banco
+        self.pool_pdf.waitForDone()
+        QThreadPool.globalInstance().waitForDone()
+        self._cancelar_consulta_cep()
+        self.pool_cep.waitForDone()
+        if self.consulta_cep is not None:
+            self.consulta_cep.fechar()
+        self.armazenamento.fechar()
+        super().closeEvent(event)
 
     def _imprimir_recibo_pdf(self):
         try:
             # Primeiro, validamos os dados do formulário sem salvar
             dados_recibo = self._coletar_dados_form()
 
-            campos_obrigatorios_pdf = {
-                "Numero_Recibo": "Número do Recibo",
-                "Nome_Cliente": "Nome do Cliente",
-                "Valor_Total_Final": "Valor Total Final"
-            }
-            campos_vazios_pdf = []
-            for campo, nome_exibicao in campos_obrigatorios_pdf.items():
-                valor = dados_recibo.get(campo)
-                # Checa se o valor é None, string vazia, ou um número que é zero
-                if valor is None or (isinstance(valor, str) and not valor.strip()) or (isinstance(valor, (int, float)) and valor == 0):
-                    # Especial para Valor_Total_Final que pode ser string "0,00"
-                    if campo == "Valor_Total_Final" and str(valor) in ["0,00", "0.0", "0"]:
-                        campos_vazios_pdf.append(nome_exibicao)
-                    elif campo != "Valor_Total_Final":
-                         campos_vazios_pdf.append(nome_exibicao)
-
-            if not self.itens_pecas_servicos_cache:
-                campos_vazios_pdf.append("Pelo menos um item/serviço")
+            campos_vazios_pdf = validar_recibo(dados_recibo, exigir_numero=True)
 
             if campos_vazios_pdf:
                 QMessageBox.warning(self, "Dados Mínimos",
@@ -1236,61 +1510,78 @@ class ReciboApp(QWidget):
                 return
 
             # Se os dados são válidos, agora sim salvamos
-            self._salvar_recibo()
+            numero_salvo = self._salvar_recibo()
+            if numero_salvo:
+                dados_recibo['Numero_Recibo'] = numero_salvo
 
             # Gerar o PDF com os dados já coletados
-            formatted_date_for_filename = QDateTime.currentDateTime().toString("yyyy-MM-dd")
-            safe_recibo_number = "".join(c for c in dados_recibo['Numero_Recibo'] if c.isalnum() or c == '_')
-            
             # Usar um arquivo temporário para evitar lixo
-            temp_file = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False, prefix=f"recibo_{safe_recibo_number}_", dir=resource_path(PASTA_RECIBOS_GERADOS))
+            temp_file = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False, prefix=nome_arquivo_pdf(dados_recibo['Numero_Recibo']) + "_", dir=resource_path(PASTA_RECIBOS_GERADOS))
             filename_full_path = temp_file.name
             temp_file.close()
-            
-            atexit.register(lambda: os.remove(filename_full_path) if os.path.exists(filename_full_path) else None)
+            _temp_files_to_clean.append(filename_full_path)
+
+            # Itens_Recibo já é uma cópia (ModeloItens.itens): o formulário pode ser editado enquanto o PDF é gerado
+            agora = QDateTime.currentDateTime()
+            tarefa = TarefaGerarPDF(self.renderizador, dados_recibo, filename_full_path,
+                                    agora.toString("dd/MM/yyyy"), agora.toString("hh:mm:ss"))
+            tarefa.sinais.progresso.connect(self._progresso_pdf)
+            tarefa.sinais.concluido.connect(lambda numero, caminho, t=tarefa: self._pdf_concluido(t, numero, caminho))
+            tarefa.sinais.falhou.connect(lambda numero, mensagem, t=tarefa: self._pdf_falhou(t, numero, mensagem))
+            self._tarefas_pdf.add(tarefa)
+
+            self.label_status_pdf.setText(f"Gerando PDF do recibo {dados_recibo['Numero_Recibo']}...")
+            self.barra_progresso_pdf.setValue(0)
+            self.barra_progresso_pdf.setVisible(True)
+            self.pool_pdf.start(tarefa)
+
+        except Exception as e:
+            QMessageBox.critical(self, "Erro na Geração do PDF",
+                                 f"Ocorreu um erro inesperado ao gerar o PDF:\n\n{e}\n\nPor favor, verifique os dados e tente novamente.")
+            print(f"ERRO CRÍTICO ao gerar PDF: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
 
-            logo_base64_data = None
-            logo_absolute_path = resource_path("logo.png") # Simplificado para procurar na raiz ou na pasta de recursos
-            if not os.path.exists(logo_absolute_path):
-                 logo_absolute_path = resource_path(os.path.join("resources", "logo.png"))
+    def _progresso_pdf(self, numero_recibo, percentual, etapa):
+        self.barra_progresso_pdf.setValue(percentual)
+        self.label_status_pdf.setText(f"Recibo {numero_recibo}: {etapa}")
 
-            if os.path.exists(logo_absolute_path):
-                with open(logo_absolute_path, "rb") as image_file:
-                    logo_base64_data = base64.b64encode(image_file.read()).decode('utf-8')
-            else:
-                print(f"ALERTA: Arquivo de logo não encontrado em 'logo.png' ou 'resources/logo.png'", file=sys.stderr)
-
-            template = self.env.get_template("recibo_template.html")
-            html_content = template.render({
-                'dados': dados_recibo,
-                'info_oficina': INFO_OFICINA,
-                'logo_base64': logo_base64_data,
-                'data_atual': QDateTime.currentDateTime().toString("dd/MM/yyyy"),
-                 'hora_atual': QDateTime.currentDateTime().toString("hh:mm:ss")
-            })
-
-            HTML(string=html_content, base_url=os.getcwd()).write_pdf(filename_full_path)
-            
-            QMessageBox.information(self, "PDF Gerado", f"Recibo gerado com sucesso!")
+    def _finalizar_tarefa_pdf(self, tarefa):
+        self._tarefas_pdf.discard(tarefa)
+        if not self._tarefas_pdf and self._tarefa_lote is None:
+            self.barra_progresso_pdf.setVisible(False)
 
+    def _pdf_concluido(self, tarefa, numero_recibo, filename_full_path):
+        self._finalizar_tarefa_pdf(tarefa)
+        self.label_status_pdf.setText(f"PDF do recibo {numero_recibo} gerado com sucesso!")
+        try:
             if platform.system() == "Windows":
                 os.startfile(filename_full_path)
             elif platform.system() == "Darwin":
                 subprocess.run(["open", filename_full_path], check=True)
             else:
                 subprocess.run(["xdg-open", filename_full_path], check=True)
-
         except Exception as e:
-            QMessageBox.critical(self, "Erro na Geração do PDF",
-                                 f"Ocorreu um erro inesperado ao gerar o PDF:\n\n{e}\n\nPor favor, verifique os dados e tente novamente.")
-            print(f"ERRO CRÍTICO ao gerar PDF: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
+            QMessageBox.warning(self, "PDF Gerado",
+                                f"Recibo gerado em:\n{filename_full_path}\n\nNão foi possível abrir o visualizador: {e}")
+
+    def _pdf_falhou(self, tarefa, numero_recibo, mensagem):
+        self._finalizar_tarefa_pdf(tarefa)
+        self.label_status_pdf.setText(f"Falha ao gerar o PDF do recibo {numero_recibo}")
+        QMessageBox.critical(self, "Erro na Geração do PDF",
+                             f"Ocorreu um erro inesperado ao gerar o PDF do recibo {numero_recibo}:\n\n{mensagem}\n\nPor favor, verifique os dados e tente novamente.")
 
 
 # --- Ejecución de la Aplicación ---
 if __name__ == "__main__":
+    # Necessário para o pool de processos da exportação em lote no executável do PyInstaller
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
+    _marcar_inicializacao("QApplication")
     window = ReciboApp()
+    _marcar_inicializacao("janela montada")
     window.show()
+    app.processEvents()
+    _marcar_inicializacao("janela visível")
+    print(_relatorio_inicializacao(), file=sys.stderr)
     sys.exit(app.exec_())
@@ -0,0 +1,1553 @@
+import os
+import sqlite3
+import sys
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from arquivos import gravacao_atomica
+from particoes import PASTA_PARTICOES, ParticoesAnuais
+
+# --- Armazenamento dos Recibos ---
+# O histórico fica em um banco SQLite (modo WAL). Cada operação grava apenas a
+# linha do recibo afetado dentro de uma transação, então o custo de salvar não
+# cresce com o tamanho do histórico. A planilha Excel passa a ser só exportação.
+#
+# O WAL é o diário de gravações: cada transação é acrescentada ao fim do arquivo -wal e,
+# com synchronous=FULL, sincronizada com o disco (fsync) antes de salvar retornar. Depois
+# de uma queda de energia o SQLite reaplica o diário na abertura; uma transação pela metade
+# é descartada inteira, sem tocar nos recibos já gravados.
+#
+# Recibos de anos fechados podem ser arquivados em partições Parquet (particoes.py, método
+# arquivar). As consultas continuam as mesmas: as chaves de busca, as colunas da lista do histórico
+# e o índice de texto dos arquivados ficam no banco (tabela recibos_arquivados), então buscas e
+# páginas do histórico acham os recibos sem abrir partições; só são lidas as partições que têm um
+# recibo encontrado (ou o período de um relatório). O custo do dia a dia acompanha o volume do ano
+# corrente, não a idade da oficina.
+
+COLUNAS_RECIBO = [
+    "Numero_Recibo", "Data_Recibo", "Hora_Recibo",
+    "Nome_Cliente",
+    "Rua_Cliente", "Numero_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente",
+    "CEP_Cliente", "Telefone_Cliente", "CPF_CNPJ_Cliente",
+    "Placa_Veiculo", "Marca_Veiculo", "Modelo_Veiculo", "Cor_Veiculo", "Ano_Veiculo",
+    "KM_Entrada_Veiculo", "KM_Saida_Veiculo",
+    "Combustivel_Veiculo", "Box_Veiculo",
+    "Problema_Informado", "Problema_Constatado", "Servico_Executado",
+    "Detalhes_Itens", "Total_Itens",
+    "Deslocamento", "Desconto_Geral", "Valor_Total_Final",
+    "Responsavel", "Situacao_Atual", "Condicoes_Pagamento",
+    "Email_Cliente", "Observacoes_Gerais", "Prox_Revisao",
+    # Coluna antiga mantida para compatibilidade, mas não usada na UI nova
+    "Endereco_Cliente"
+]
+
+# Colunas internas com as chaves de busca normalizadas (indexadas, não exportadas)
+COLUNAS_NORMALIZADAS = {
+    "nome_normalizado": "Nome_Cliente",
+    "placa_normalizada": "Placa_Veiculo",
+    "documento_normalizado": "CPF_CNPJ_Cliente",
+    "data_iso": "Data_Recibo",
+}
+
+CAMPOS_BUSCA = {
+    "texto": None,   # qualquer palavra: nome, placa, veículo, observações, códigos e descrições dos itens
+    "numero": "Numero_Recibo",
+    "placa": "placa_normalizada",
+    "cpf_cnpj": "documento_normalizado",
+    "nome": "nome_normalizado",
+}
+
+# Índice de texto (FTS5) para a busca por qualquer palavra: uma linha por recibo, com o
+# rowid vindo de busca_ids. Mantido por salvar/deletar e reconstruído em importações.
+_SQL_TEXTO_BUSCA = (
+    "SELECT i.id, COALESCE(r.Nome_Cliente, ''), "
+    "COALESCE(r.Placa_Veiculo, '') || ' ' || COALESCE(r.placa_normalizada, ''), "
+    "COALESCE(r.Marca_Veiculo, '') || ' ' || COALESCE(r.Modelo_Veiculo, ''), "
+    "COALESCE(r.Observacoes_Gerais, ''), "
+    "(SELECT group_concat(COALESCE(t.codigo, '') || ' ' || COALESCE(t.descricao, ''), ' ') "
+    " FROM itens_recibo t WHERE t.Numero_Recibo = r.Numero_Recibo) "
+    "FROM recibos r JOIN busca_ids i ON i.Numero_Recibo = r.Numero_Recibo"
+)
+
+
+def expressao_busca_texto(texto):
+    """ Consulta FTS5 em que cada palavra digitada precisa aparecer (a última também como prefixo,
+    para resultados enquanto se digita), ou None se não houver palavras """
+    palavras = [p for p in "".join(c if c.isalnum() else " " for c in str(texto or "")).split()]
+    if not palavras:
+        return None
+    termos = [f'"{p}"' for p in palavras[:-1]] + [f'"{palavras[-1]}"*']
+    return " ".join(termos)
+
+
+# Cadastros de clientes (por CPF/CNPJ) e veículos (por placa), montados a partir dos recibos.
+# Cada cadastro guarda os dados do recibo mais recente; campos vazios nele não apagam os anteriores.
+#   chave: coluna da chave no cadastro; origem: coluna normalizada de recibos com a chave
+#   colunas: colunas de recibos copiadas; rotulo: expressão mostrada nas sugestões
+CADASTROS = {
+    "clientes": {
+        "chave": "documento", "origem": "documento_normalizado",
+        "colunas": ["CPF_CNPJ_Cliente", "Nome_Cliente", "Telefone_Cliente", "Email_Cliente", "CEP_Cliente",
+                    "Rua_Cliente", "Numero_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente"],
+        "rotulo": "COALESCE(Nome_Cliente, '')",
+    },
+    "veiculos": {
+        "chave": "placa", "origem": "placa_normalizada",
+        "colunas": ["Placa_Veiculo", "Marca_Veiculo", "Modelo_Veiculo", "Cor_Veiculo", "Ano_Veiculo",
+                    "Combustivel_Veiculo", "CPF_CNPJ_Cliente", "Nome_Cliente"],
+        "rotulo": "TRIM(COALESCE(Marca_Veiculo, '') || ' ' || COALESCE(Modelo_Veiculo, ''))",
+    },
+}
+
+
+def _sql_cadastro(tipo, filtro="", linhas=False):
+    """ Upsert do cadastro a partir dos recibos (todos, ou os do filtro extra em SQL) ou, com linhas,
+    de parâmetros (chave, número, colunas) para executemany, em ordem de número """
+    cadastro = CADASTROS[tipo]
+    colunas = ", ".join(f'"{col}"' for col in cadastro["colunas"])
+    atualizacoes = ", ".join(f'"{col}" = COALESCE(NULLIF(excluded."{col}", \'\'), {tipo}."{col}")'
+                             for col in cadastro["colunas"])
+    if linhas:
+        origem = "VALUES (" + ", ".join("?" for _ in range(len(cadastro["colunas"]) + 2)) + ")"
+    else:
+        origem = (f"SELECT {cadastro['origem']}, Numero_Recibo, {colunas} FROM recibos "
+                  f"WHERE COALESCE({cadastro['origem']}, '') != '' {filtro} ORDER BY Numero_Recibo")
+    # Em ordem de número: quando a mesma chave aparece várias vezes, o recibo mais recente prevalece
+    return (
+        f"INSERT INTO {tipo} ({cadastro['chave']}, ultimo_recibo, {colunas}) {origem} "
+        f"ON CONFLICT({cadastro['chave']}) DO UPDATE SET ultimo_recibo = excluded.ultimo_recibo, {atualizacoes} "
+        f"WHERE excluded.ultimo_recibo >= {tipo}.ultimo_recibo"
+    )
+
+
+# Catálogo de peças e serviços: um registro por chave_catalogo, com a descrição, o tipo e o
+# valor unitário do uso mais recente (o preço sugerido ao lançar o item de novo)
+COLUNAS_CATALOGO = ["chave", "codigo", "descricao", "tipo", "uni", "valor", "ultimo_recibo"]
+
+
+def _sql_catalogo(filtro="", linhas=False):
+    """ Upsert do catálogo a partir dos itens dos recibos (todos, ou os do filtro extra em SQL) ou, com
+    linhas, de parâmetros (as colunas de catalogo) para executemany, em ordem de número e posição """
+    if linhas:
+        origem = "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    else:
+        origem = ("SELECT chave_catalogo(codigo, descricao), codigo, descricao, nome_normalizado(descricao), "
+                  "tipo, uni, valor, Numero_Recibo FROM itens_recibo "
+                  f"WHERE chave_catalogo(codigo, descricao) IS NOT NULL {filtro} ORDER BY Numero_Recibo, posicao")
+    return (
+        "INSERT INTO catalogo (chave, codigo, descricao, descricao_normalizada, tipo, uni, valor, ultimo_recibo) "
+        f"{origem} ON CONFLICT(chave) DO UPDATE SET codigo = excluded.codigo, descricao = excluded.descricao, "
+        "descricao_normalizada = excluded.descricao_normalizada, tipo = excluded.tipo, uni = excluded.uni, "
+        "valor = excluded.valor, ultimo_recibo = excluded.ultimo_recibo "
+        "WHERE excluded.ultimo_recibo >= catalogo.ultimo_recibo"
+    )
+
+
+# Ordenações do histórico: chave -> expressão SQL indexada junto com Numero_Recibo (esquema v5).
+# COALESCE mantém a expressão sem NULL, o que permite paginar por chave (valor, número)
+ORDENACOES_HISTORICO = {
+    "numero": "Numero_Recibo",
+    "data": "COALESCE(data_iso, '')",
+    "nome": "COALESCE(nome_normalizado, '')",
+    "placa": "COALESCE(placa_normalizada, '')",
+    "valor": "COALESCE(Valor_Total_Final, 0)",
+}
+
+# Colunas mostradas na lista do histórico
+COLUNAS_HISTORICO = ["Numero_Recibo", "Data_Recibo", "Nome_Cliente", "Placa_Veiculo", "Modelo_Veiculo", "Valor_Total_Final"]
+
+# Colunas dos recibos arquivados copiadas para recibos_arquivados (esquema v12): as da lista do
+# histórico e as chaves de busca, para buscar e paginar os arquivados sem ler as partições
+COLUNAS_ARQUIVADOS = COLUNAS_HISTORICO[1:] + list(COLUNAS_NORMALIZADAS)
+
+# Colunas lidas para os relatórios (relatorios.py)
+COLUNAS_RELATORIO = ["Numero_Recibo", "data_iso", "Nome_Cliente", "nome_normalizado", "documento_normalizado",
+                     "Responsavel", "Box_Veiculo", "Valor_Total_Final"]
+COLUNAS_RELATORIO_ITENS = ["Numero_Recibo", "data_iso", "tipo", "codigo", "descricao", "quantia", "valor_total"]
+
+# Resumos materializados por dia ("aaaa-mm-dd") e mês ("aaaa-mm"). Categorias: "recibos"
+# (quantidade de recibos e soma de Valor_Total_Final) e "itens:<tipo>" (linhas de itens do tipo e
+# soma de valor_total). Atualizados por diferença a cada recibo salvo ou excluído.
+PERIODOS_RESUMO = {"dia": 10, "mes": 7}   # período -> tamanho do prefixo de data_iso
+
+_SQL_CONTRIBUICAO_RESUMO = (
+    "SELECT data_iso, 'recibos', 1, COALESCE(Valor_Total_Final, 0) FROM recibos "
+    "WHERE Numero_Recibo = :numero AND data_iso IS NOT NULL "
+    "UNION ALL "
+    "SELECT r.data_iso, 'itens:' || COALESCE(NULLIF(i.tipo, ''), 'Outros'), COUNT(*), SUM(COALESCE(i.valor_total, 0)) "
+    "FROM recibos r JOIN itens_recibo i ON i.Numero_Recibo = r.Numero_Recibo "
+    "WHERE r.Numero_Recibo = :numero AND r.data_iso IS NOT NULL GROUP BY i.tipo"
+)
+
+# Registro de alterações (uma linha por recibo, com o id da alteração mais recente), para que
+# outras instâncias abertas no mesmo banco atualizem só o que mudou. ALTERACAO_TODOS marca uma
+# alteração em massa (importação): quem a receber relê tudo.
+ALTERACAO_TODOS = "*"
+
+# Itens (peças e serviços) ficam em linhas tipadas da tabela itens_recibo, na ordem de "posicao".
+# As chaves são as mesmas dos dicionários de item usados pela interface.
+COLUNAS_ITEM = ["tipo", "codigo", "descricao", "uni", "valor", "quantia", "desc", "valor_total"]
+
+COLUNAS_INTEIRAS = ["KM_Entrada_Veiculo", "KM_Saida_Veiculo"]
+COLUNAS_MONETARIAS = ["Total_Itens", "Deslocamento", "Desconto_Geral", "Valor_Total_Final"]
+
+# Colunas das partições arquivadas (particoes.py): recibos com as chaves normalizadas e a versão;
+# itens com a data do recibo, para o filtro de período dos relatórios. Partições gravadas antes do
+# esquema v12 têm também texto_busca (as palavras do índice de texto), lido só na migração
+COLUNAS_PARTICAO_RECIBOS = COLUNAS_RECIBO + list(COLUNAS_NORMALIZADAS) + ["versao"]
+COLUNAS_PARTICAO_ITENS = ["Numero_Recibo", "posicao"] + COLUNAS_ITEM + ["data_iso"]
+_INTEIRAS_PARTICAO = COLUNAS_INTEIRAS + ["versao", "posicao", "quantia"]
+_REAIS_PARTICAO = COLUNAS_MONETARIAS + ["valor", "desc", "valor_total"]
+
+
+def normalizar_numero_recibo(numero_recibo):
+    """ Remove espaços e completa com zeros à esquerda quando o número é só dígitos """
+    numero_recibo = str(numero_recibo).strip()
+    if numero_recibo.isdigit():
+        numero_recibo = numero_recibo.zfill(6)
+    return numero_recibo
+
+
+def normalizar_nome(nome):
+    """ Minúsculas, sem acentos e com espaços simples: 'José  da Silva' -> 'jose da silva' """
+    nome = unicodedata.normalize("NFKD", str(nome or ""))
+    nome = "".join(c for c in nome if not unicodedata.combining(c))
+    return " ".join(nome.lower().split())
+
+
+def normalizar_placa(placa):
+    return "".join(c for c in str(placa or "").upper() if c.isalnum())
+
+
+def normalizar_documento(documento):
+    return "".join(c for c in str(documento or "") if c.isdigit())
+
+
+def normalizar_codigo_item(codigo):
+    """ Código de peça/serviço em maiúsculas, só letras e dígitos ('' se vazio ou 'N/A') """
+    codigo = str(codigo or "").strip().upper()
+    if codigo == "N/A":
+        return ""
+    return "".join(c for c in codigo if c.isalnum())
+
+
+def chave_catalogo(codigo, descricao):
+    """ Chave do item no catálogo: o código normalizado ou, para itens sem código,
+    '#' + descrição normalizada. None se o item não tiver nenhum dos dois """
+    codigo = normalizar_codigo_item(codigo)
+    if codigo:
+        return codigo
+    descricao = normalizar_nome(descricao)
+    return "#" + descricao if descricao and descricao != "n/a" else None
+
+
+def normalizar_data(data_recibo):
+    """ 'dd/MM/yyyy' -> 'yyyy-MM-dd', para ordenar e filtrar por período """
+    partes = str(data_recibo or "").strip().split(" ")[0].split("/")
+    if len(partes) == 3 and all(p.isdigit() for p in partes):
+        dia, mes, ano = partes
+        return f"{ano.zfill(4)}-{mes.zfill(2)}-{dia.zfill(2)}"
+    return None
+
+
+_NORMALIZADORES = {
+    "nome_normalizado": normalizar_nome,
+    "placa_normalizada": normalizar_placa,
+    "documento_normalizado": normalizar_documento,
+    "data_iso": normalizar_data,
+}
+
+
+def ler_detalhes_itens_legado(detalhes_itens):
+    """ Converte o texto da antiga coluna Detalhes_Itens
+    ("Tipo: ... | Código: ... | ...; Tipo: ...") em uma lista de itens.
+    Trechos que não puderem ser interpretados viram um item só com a descrição. """
+    itens = []
+    for item_entry_str in str(detalhes_itens or "").split('; '):
+        if not item_entry_str.strip():
+            continue
+        try:
+            parts = {}
+            for part in item_entry_str.split(' | '):
+                if ': ' in part:
+                    k, v = part.split(': ', 1)
+                    parts[k.strip()] = v.strip()
+            if not parts:
+                raise ValueError("nenhum campo 'Rótulo: valor' encontrado")
+
+            itens.append({
+                "tipo": parts.get("Tipo", "N/A"),
+                "codigo": parts.get("Código", parts.get("Ref", "N/A")),
+                "descricao": parts.get("Descrição", parts.get("Desc", "N/A")),
+                "uni": parts.get("Uni", "un"),
+                "valor": float(parts.get("Valor Unit", "0.0").replace('R$', '').replace(',', '.').strip()),
+                "quantia": int(parts.get("Quantia", "0").strip()),
+                "desc": float(parts.get("Desc(%)", "0.0").replace('%', '').strip()),
+                "valor_total": float(parts.get("Valor Total", "0.0").replace('R$', '').replace(',', '.').strip()),
+            })
+        except Exception as e:
+            print(f"Erro ao parsear item legado: '{item_entry_str}' - {e}", file=sys.stderr)
+            itens.append({"tipo": "N/A", "codigo": "", "descricao": item_entry_str.strip(), "uni": "un",
+                          "valor": 0.0, "quantia": 0, "desc": 0.0, "valor_total": 0.0})
+    return itens
+
+
+def formatar_detalhes_itens(itens):
+    """ Texto legível dos itens, no formato da antiga coluna Detalhes_Itens (usado na exportação) """
+    return "; ".join(
+        f"Tipo: {item['tipo']} | Código: {item['codigo']} | Descrição: {item['descricao']} | Quantia: {item['quantia']} | Valor Unit: {item['valor']:.2f} | Desc(%): {item['desc']:.0f} | Valor Total: {item['valor_total']:.2f}"
+        for item in itens)
+
+_SELECT_RECIBO = ", ".join(f'"{col}"' for col in COLUNAS_RECIBO)
+
+
+class ConflitoVersao(RuntimeError):
+    """ O recibo foi alterado ou excluído por outra instância depois de lido.
+    versao_atual é a versão gravada no banco (None se o recibo foi excluído) """
+
+    def __init__(self, numero_recibo, versao_atual):
+        self.numero_recibo = numero_recibo
+        self.versao_atual = versao_atual
+        situacao = "excluído" if versao_atual is None else f"alterado (versão {versao_atual})"
+        super().__init__(f"Recibo {numero_recibo} {situacao} por outra estação.")
+
+
+def _sincronizado(metodo):
+    """ Serializa o uso da conexão SQLite entre threads (GUI, tarefas em segundo plano) """
+    @wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        with self._trava:
+            return metodo(self, *args, **kwargs)
+    return envoltorio
+
+
+def _relendo_particoes(metodo):
+    """ Repete a consulta uma vez se um arquivo de partição sumiu no meio dela: outra estação
+    terminou um arquivamento e apagou a geração que o índice lido antes ainda apontava """
+    @wraps(metodo)
+    def envoltorio(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        except FileNotFoundError:
+            return metodo(self, *args, **kwargs)
+    return envoltorio
+
+
+def _tipo_coluna(coluna):
+    if coluna in COLUNAS_INTEIRAS:
+        return "INTEGER"
+    if coluna in COLUNAS_MONETARIAS:
+        return "REAL"
+    return "TEXT"
+
+
+def _serie_monetaria(serie):
+    """ Converte uma coluna da planilha antiga com números ou textos no formato 1.234,56 """
+    import pandas as pd
+
+    texto = serie.astype("string").str.strip()
+    formato_brasileiro = texto.str.contains(",", regex=False, na=False)
+    convertido = pd.to_numeric(
+        texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False), errors="coerce")
+    return convertido.where(formato_brasileiro, pd.to_numeric(texto, errors="coerce"))
+
+
+def _serie_quilometragem(serie):
+    import pandas as pd
+
+    texto = serie.astype("string").str.replace(r"\.0$", "", regex=True).str.replace(r"[.,]", "", regex=True)
+    return pd.to_numeric(texto, errors="coerce")
+
+
+def _tipar_particao(df):
+    """ Um tipo por coluna para o Parquet (no SQLite cada valor tem o seu): números inteiros como Int64,
+    demais números como float; uma coluna numérica com algum texto fora do padrão fica como texto """
+    import pandas as pd
+
+    for coluna in df.columns:
+        if coluna in _INTEIRAS_PARTICAO or coluna in _REAIS_PARTICAO:
+            numeros = pd.to_numeric(df[coluna], errors="coerce")
+            if numeros.notna().sum() != df[coluna].notna().sum():
+                df[coluna] = df[coluna].astype("string")
+            elif coluna in _INTEIRAS_PARTICAO and (numeros.dropna() % 1 == 0).all():
+                df[coluna] = numeros.astype("Int64")
+            else:
+                df[coluna] = numeros.astype("float64")
+        else:
+            df[coluna] = df[coluna].astype("string")
+    return df
+
+
+def _registros(df):
+    """ Linhas do DataFrame como dicionários com tipos do Python (None no lugar de NaN/NA),
+    iguais aos lidos do banco. A conversão pelo pyarrow é bem mais rápida que a do pandas """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df.astype(object).where(df.notna(), None).to_dict("records")
+    return pa.Table.from_pandas(df, preserve_index=False).to_pylist()
+
+
+def _concatenar(partes, colunas):
+    """ pd.concat das partes não vazias (DataFrame vazio com as colunas dadas se não houver nenhuma) """
+    import pandas as pd
+
+    partes = [parte for parte in partes if not parte.empty]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas)
+
+
+class ArmazenamentoRecibos:
+    """ Interface comum dos backends de armazenamento de recibos """
+
+    def obter(self, numero_recibo):
+        """ Retorna o recibo como dicionário (coluna -> valor) ou None.
+        Os itens vêm em "Itens_Recibo", como lista de dicionários com as chaves de COLUNAS_ITEM,
+        e a versão gravada em "versao" (para salvar/deletar com versao=) """
+        raise NotImplementedError
+
+    def salvar(self, dados, novo=False, versao=None):
+        """ Insere ou atualiza um recibo e retorna (numero_recibo, atualizado).
+        Com novo=True o número é reservado na sequência no momento da gravação,
+        ignorando o número exibido, para que duas instâncias nunca gravem o mesmo.
+        Com versao (a de obter) a gravação só acontece se o recibo ainda estiver nessa versão;
+        senão levanta ConflitoVersao. Cada gravação incrementa a versão """
+        raise NotImplementedError
+
+    def deletar(self, numero_recibo, versao=None):
+        """ Remove um recibo. Retorna True se ele existia. versao como em salvar """
+        raise NotImplementedError
+
+    def versao_dados(self):
+        """ Número que muda quando outra conexão grava no banco (consulta barata, para polling) """
+        raise NotImplementedError
+
+    def ultima_alteracao(self):
+        """ id da alteração mais recente do registro de alterações (0 se não houver) """
+        raise NotImplementedError
+
+    def alteracoes_desde(self, id_alteracao):
+        """ Recibos alterados depois de id_alteracao, em ordem: dicionários {"id", "Numero_Recibo",
+        "excluido"}. Numero_Recibo ALTERACAO_TODOS indica alteração em massa """
+        raise NotImplementedError
+
+    def linhas_historico(self, numeros):
+        """ Linhas do histórico (colunas de COLUNAS_HISTORICO) dos recibos dados: {numero: linha} """
+        raise NotImplementedError
+
+    def listar_recentes(self, limite=50, deslocamento=0):
+        """ Página de recibos, do mais recente para o mais antigo """
+        raise NotImplementedError
+
+    def buscar(self, campo, valor, limite=200):
+        """ Recibos cujo campo ('numero', 'placa', 'cpf_cnpj', 'nome' ou 'texto') corresponde ao valor.
+        Para 'nome' a correspondência é por prefixo do nome normalizado; para 'texto' todas as palavras
+        precisam aparecer em algum dos campos indexados (a última pode ser só o início da palavra) """
+        raise NotImplementedError
+
+    def listar_numeros(self, data_inicio=None, data_fim=None, campo=None, valor=None):
+        """ Números dos recibos no período (datas ISO, inclusivas) que atendem ao filtro
+        opcional campo/valor (mesmos campos de buscar), em ordem crescente """
+        raise NotImplementedError
+
+    def contar(self, campo=None, valor=None):
+        """ Quantidade de recibos, opcionalmente só os que atendem ao filtro campo/valor de buscar """
+        raise NotImplementedError
+
+    def listar_pagina(self, ordem="numero", decrescente=True, campo=None, valor=None, apos=None, limite=200):
+        """ Página do histórico (colunas de COLUNAS_HISTORICO) ordenada por uma chave de
+        ORDENACOES_HISTORICO, com filtro opcional campo/valor como em buscar.
+
+        apos: "_chave" do último registro da página anterior. A paginação é por chave, não por
+        OFFSET: buscar a página seguinte custa o mesmo no início ou no fim do histórico """
+        raise NotImplementedError
+
+    def totais_por_tipo_item(self, data_inicio=None, data_fim=None):
+        """ Soma de valor_total dos itens por tipo ("Peça", "Serviço"...) no período (datas ISO, inclusivas) """
+        raise NotImplementedError
+
+    def dados_relatorio(self, data_inicio=None, data_fim=None):
+        """ (recibos, itens) do período (datas ISO, inclusivas) como DataFrames do pandas, com as
+        colunas de COLUNAS_RELATORIO e COLUNAS_RELATORIO_ITENS """
+        raise NotImplementedError
+
+    def resumo_periodo(self, periodo, data):
+        """ Resumo materializado de um dia ("dia", "aaaa-mm-dd") ou mês ("mes", "aaaa-mm"):
+        {categoria: (quantidade, valor)}, com as categorias de PERIODOS_RESUMO """
+        raise NotImplementedError
+
+    def proximo_numero(self):
+        """ Número que o próximo recibo novo deve receber (apenas consulta, não reserva) """
+        raise NotImplementedError
+
+    def enderecos_por_cep(self):
+        """ Endereço mais recente registrado no histórico para cada CEP (8 dígitos), no formato da
+        ViaCEP: {"logradouro", "bairro", "localidade", "uf"} """
+        raise NotImplementedError
+
+    def listar_cadastro(self, tipo):
+        """ Pares (chave, rótulo) de um cadastro de CADASTROS, em ordem de chave: CPF/CNPJ só com
+        dígitos e nome do cliente, ou placa normalizada e marca/modelo do veículo """
+        raise NotImplementedError
+
+    def obter_cadastro(self, tipo, chave):
+        """ Dados mais recentes do cliente ou veículo (colunas do recibo), ou None """
+        raise NotImplementedError
+
+    def listar_catalogo(self):
+        """ Todo o catálogo de peças e serviços (dicionários com as chaves de COLUNAS_CATALOGO), em ordem de chave """
+        raise NotImplementedError
+
+    def buscar_catalogo(self, codigo=None, descricao=None, limite=20):
+        """ Itens do catálogo cujo código ou descrição (normalizados) começam com o valor dado """
+        raise NotImplementedError
+
+    def exportar_excel(self, caminho_excel):
+        raise NotImplementedError
+
+    def copiar_banco(self, caminho):
+        """ Cópia consistente do banco em caminho, feita sem interromper as gravações (backup) """
+        raise NotImplementedError
+
+    def arquivar(self, ate_ano=None):
+        """ Move para partições anuais (Parquet) os recibos com data anterior a ate_ano (padrão: o ano
+        corrente). As consultas continuam encontrando os recibos arquivados, e editar ou excluir um
+        deles o traz de volta ao banco. Retorna {ano: recibos arquivados agora}. Requer pyarrow """
+        raise NotImplementedError
+
+    def listar_particoes(self):
+        """ Partições arquivadas, da mais antiga para a mais recente: dicionários {"ano", "recibos",
+        "numero_min", "numero_max", "bytes"} """
+        raise NotImplementedError
+
+    def fechar(self):
+        pass
+
+
+class ArmazenamentoSQLite(ArmazenamentoRecibos):
+    def __init__(self, caminho_banco, caminho_excel_legado=None):
+        self.caminho_banco = caminho_banco
+        # isolation_level=None: as transações são abertas explicitamente em _transacao()
+        # A conexão é compartilhada entre threads; _sincronizado garante um uso por vez
+        self._trava = threading.RLock()
+        self.conexao = sqlite3.connect(caminho_banco, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conexao.row_factory = sqlite3.Row
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        # FULL: um fsync do diário por transação (~0,2 ms); com NORMAL uma queda de energia
+        # podia perder os últimos recibos salvos, ainda que sem corromper o banco
+        self.conexao.execute("PRAGMA synchronous=FULL")
+        for coluna, normalizador in _NORMALIZADORES.items():
+            self.conexao.create_function(coluna, 1, normalizador, deterministic=True)
+        self.conexao.create_function("chave_catalogo", 2, chave_catalogo, deterministic=True)
+        # Partições ao lado do banco: todas as estações que abrem o banco enxergam as mesmas
+        self.particoes = ParticoesAnuais(os.path.join(os.path.dirname(os.path.abspath(caminho_banco)), PASTA_PARTICOES))
+        self._migrar_esquema()
+
+        if caminho_excel_legado and os.path.exists(caminho_excel_legado) and not self._meta("excel_importado"):
+            self._importar_excel_legado(caminho_excel_legado)
+
+    def _importar_excel_legado(self, caminho_excel):
+        # Só em banco vazio: se uma importação anterior falhou e já há recibos novos, os números
+        # da planilha poderiam substituir recibos gravados depois
+        if self.contar():
+            print(f"ALERTA: {caminho_excel} não foi importada porque o banco já tem recibos", file=sys.stderr)
+            return
+        try:
+            self.importar_excel(caminho_excel)
+        except Exception as e:
+            # Planilha danificada (ex.: gravação interrompida) não impede a abertura nem apaga nada:
+            # a transação da importação é desfeita e a planilha fica como está
+            print(f"ALERTA: não foi possível importar {caminho_excel}: {e}", file=sys.stderr)
+
+    def _migrar_esquema(self):
+        """ Aplica, em ordem, as migrações ainda não registradas em PRAGMA user_version """
+        migracoes = [self._esquema_v1, self._esquema_v2, self._esquema_v3, self._esquema_v4, self._esquema_v5,
+                     self._esquema_v6, self._esquema_v7, self._esquema_v8, self._esquema_v9, self._esquema_v10,
+                     self._esquema_v11, self._esquema_v12, self._esquema_v13]
+        for versao, migracao in enumerate(migracoes, start=1):
+            with self._transacao() as cur:
+                # Relido dentro da transação: outra instância pode ter migrado enquanto esperávamos
+                if cur.execute("PRAGMA user_version").fetchone()[0] >= versao:
+                    continue
+                migracao(cur)
+                cur.execute(f"PRAGMA user_version = {versao}")
+
+    def _esquema_v1(self, cur):
+        colunas_sql = ",\n".join(
+            f'"{col}" {_tipo_coluna(col)}' + (" PRIMARY KEY" if col == "Numero_Recibo" else "")
+            for col in COLUNAS_RECIBO
+        )
+        cur.execute(f"CREATE TABLE IF NOT EXISTS recibos (\n{colunas_sql}\n)")
+        cur.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+
+    def _esquema_v2(self, cur):
+        # Chaves de busca normalizadas e indexadas
+        colunas = ["nome_normalizado", "placa_normalizada", "documento_normalizado"]
+        for coluna in colunas:
+            cur.execute(f"ALTER TABLE recibos ADD COLUMN {coluna} TEXT")
+            cur.execute(f"CREATE INDEX idx_recibos_{coluna} ON recibos ({coluna})")
+        self._preencher_colunas_normalizadas(cur, colunas)
+
+    def _esquema_v3(self, cur):
+        # Sequência persistida para a numeração dos recibos
+        cur.execute("CREATE TABLE sequencias (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+        cur.execute("INSERT INTO sequencias (nome, valor) VALUES ('recibo', 0)")
+        self._ajustar_sequencia(cur)
+
+    def _esquema_v4(self, cur):
+        # Itens em linhas tipadas, no lugar do texto em Detalhes_Itens
+        cur.execute(
+            "CREATE TABLE itens_recibo ("
+            "Numero_Recibo TEXT NOT NULL, posicao INTEGER NOT NULL, "
+            "tipo TEXT, codigo TEXT, descricao TEXT, uni TEXT, "
+            "valor REAL, quantia INTEGER, \"desc\" REAL, valor_total REAL, "
+            "PRIMARY KEY (Numero_Recibo, posicao))"
+        )
+        cur.execute("CREATE INDEX idx_itens_recibo_tipo ON itens_recibo (tipo)")
+        cur.execute("ALTER TABLE recibos ADD COLUMN data_iso TEXT")
+        cur.execute("CREATE INDEX idx_recibos_data_iso ON recibos (data_iso)")
+        self._preencher_colunas_normalizadas(cur, ["data_iso"])
+        self._migrar_itens_legados(cur)
+
+    def _esquema_v5(self, cur):
+        # Índices (chave de ordenação, número) para a lista paginada do histórico
+        for chave, expressao in ORDENACOES_HISTORICO.items():
+            if chave != "numero":
+                cur.execute(f"CREATE INDEX idx_recibos_ordem_{chave} ON recibos ({expressao}, Numero_Recibo)")
+
+    def _esquema_v6(self, cur):
+        # Busca por qualquer palavra (sem diferenciar acentos e maiúsculas)
+        cur.execute("CREATE TABLE busca_ids (id INTEGER PRIMARY KEY, Numero_Recibo TEXT NOT NULL UNIQUE)")
+        cur.execute(
+            "CREATE VIRTUAL TABLE busca_recibos USING fts5("
+            "nome, placa, veiculo, observacoes, itens, "
+            # Índices de prefixo: as primeiras letras digitadas não percorrem todos os termos do índice
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+        self._reindexar_texto(cur)
+
+    def _esquema_v7(self, cur):
+        # Cadastros de clientes e veículos, para preencher o formulário pela placa ou CPF/CNPJ
+        for tipo, cadastro in CADASTROS.items():
+            colunas = ", ".join(f'"{col}" TEXT' for col in cadastro["colunas"])
+            cur.execute(f"CREATE TABLE {tipo} ({cadastro['chave']} TEXT PRIMARY KEY, ultimo_recibo TEXT, {colunas})")
+        self._reconstruir_cadastros(cur)
+
+    def _reconstruir_cadastros(self, cur):
+        for tipo in CADASTROS:
+            cur.execute(_sql_cadastro(tipo))
+
+    def _atualizar_cadastros(self, cur, numero_recibo):
+        for tipo in CADASTROS:
+            cur.execute(_sql_cadastro(tipo, "AND Numero_Recibo = ?"), (numero_recibo,))
+
+    def _chaves_cadastro(self, cur, numero_recibo):
+        """ {tipo: chave} dos cadastros em que o recibo do banco entra (chave vazia: em nenhum) """
+        origens = ", ".join(cadastro["origem"] for cadastro in CADASTROS.values())
+        row = cur.execute(f"SELECT {origens} FROM recibos WHERE Numero_Recibo = ?", (numero_recibo,)).fetchone()
+        return dict(zip(CADASTROS, row)) if row else {}
+
+    def _recalcular_cadastros(self, cur, chaves):
+        """ Refaz do zero os cadastros das chaves dadas ({tipo: chave}) com os recibos que ainda as têm,
+        do banco e arquivados: depois que um recibo sai de uma chave (exclusão ou CPF/placa trocado
+        na edição), os dados dele não podem continuar no cadastro """
+        for tipo, chave in chaves.items():
+            if not chave:
+                continue
+            cadastro = CADASTROS[tipo]
+            cur.execute(f"DELETE FROM {tipo} WHERE {cadastro['chave']} = ?", (chave,))
+            colunas = ", ".join(f'"{col}"' for col in cadastro["colunas"])
+            linhas = [dict(row) for row in cur.execute(
+                f"SELECT Numero_Recibo, {colunas} FROM recibos WHERE {cadastro['origem']} = ?", (chave,))]
+            # Os arquivados com a chave vêm do índice deles; só as partições desses recibos são lidas
+            linhas += self._ler_arquivados([row[0] for row in cur.execute(
+                f"SELECT Numero_Recibo FROM recibos_arquivados WHERE {cadastro['origem']} = ?", (chave,))])
+            linhas.sort(key=lambda linha: linha["Numero_Recibo"])
+            cur.executemany(_sql_cadastro(tipo, linhas=True),
+                            [[chave, linha["Numero_Recibo"]] + [linha[col] for col in cadastro["colunas"]]
+                             for linha in linhas])
+
+    def _esquema_v8(self, cur):
+        # Catálogo de peças e serviços, semeado com os itens de todos os recibos
+        cur.execute(
+            "CREATE TABLE catalogo (chave TEXT PRIMARY KEY, codigo TEXT, descricao TEXT, "
+            "descricao_normalizada TEXT, tipo TEXT, uni TEXT, valor REAL, ultimo_recibo TEXT)"
+        )
+        cur.execute("CREATE INDEX idx_catalogo_descricao ON catalogo (descricao_normalizada)")
+        cur.execute(_sql_catalogo())
+
+    def _esquema_v9(self, cur):
+        # Resumos por dia e mês, para o painel não somar o histórico inteiro
+        cur.execute(
+            "CREATE TABLE resumos (periodo TEXT NOT NULL, data TEXT NOT NULL, categoria TEXT NOT NULL, "
+            "quantidade INTEGER NOT NULL, valor REAL NOT NULL, PRIMARY KEY (periodo, data, categoria))"
+        )
+        self._reconstruir_resumos(cur)
+
+    def _esquema_v10(self, cur):
+        # Várias estações no mesmo banco: versão por recibo (concorrência otimista) e registro de alterações
+        cur.execute("ALTER TABLE recibos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1")
+        cur.execute(
+            "CREATE TABLE alteracoes (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "Numero_Recibo TEXT NOT NULL UNIQUE, excluido INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def _esquema_v11(self, cur):
+        # Índice das partições anuais: geração em uso e intervalos (para a poda) de cada ano, e a
+        # partição de cada recibo arquivado
+        cur.execute(
+            "CREATE TABLE particoes (ano TEXT PRIMARY KEY, geracao INTEGER NOT NULL, "
+            "quantidade INTEGER NOT NULL, linhas_arquivo INTEGER NOT NULL, "
+            "numero_min TEXT, numero_max TEXT, data_min TEXT, data_max TEXT)"
+        )
+        cur.execute("CREATE TABLE recibos_arquivados (Numero_Recibo TEXT PRIMARY KEY, ano TEXT NOT NULL)")
+        cur.execute("CREATE INDEX idx_recibos_arquivados_ano ON recibos_arquivados (ano)")
+
+    def _esquema_v12(self, cur):
+        # Chaves de busca, colunas do histórico e índice de texto dos arquivados no banco: buscas e
+        # páginas do histórico só abrem as partições dos recibos encontrados
+        for coluna in COLUNAS_ARQUIVADOS:
+            cur.execute(f'ALTER TABLE recibos_arquivados ADD COLUMN "{coluna}" {_tipo_coluna(coluna)}')
+        for coluna in COLUNAS_NORMALIZADAS:
+            cur.execute(f"CREATE INDEX idx_recibos_arquivados_{coluna} ON recibos_arquivados ({coluna})")
+        for chave, expressao in ORDENACOES_HISTORICO.items():
+            if chave != "numero":
+                cur.execute(f"CREATE INDEX idx_recibos_arquivados_ordem_{chave} "
+                            f"ON recibos_arquivados ({expressao}, Numero_Recibo)")
+        colunas = ", ".join(f'"{col}" = ?' for col in COLUNAS_ARQUIVADOS)
+        for particao in self._particoes_ativas():
+            vivos = [row[0] for row in cur.execute(
+                "SELECT Numero_Recibo FROM recibos_arquivados WHERE ano = ?", (particao["ano"],))]
+            linhas = self.particoes.registros("recibos", particao["ano"], particao["geracao"],
+                                              ["Numero_Recibo", "texto_busca"] + COLUNAS_ARQUIVADOS, vivos)
+            cur.executemany(f"UPDATE recibos_arquivados SET {colunas} WHERE Numero_Recibo = ?",
+                            [[linha[col] for col in COLUNAS_ARQUIVADOS] + [linha["Numero_Recibo"]] for linha in linhas])
+            # As palavras já normalizadas vão para uma coluna só: MATCH procura em todas
+            cur.executemany("INSERT OR IGNORE INTO busca_ids (Numero_Recibo) VALUES (?)",
+                            [(linha["Numero_Recibo"],) for linha in linhas])
+            cur.executemany(
+                "INSERT INTO busca_recibos (rowid, nome, placa, veiculo, observacoes, itens) "
+                "SELECT id, '', '', '', '', ? FROM busca_ids WHERE Numero_Recibo = ?",
+                [(linha["texto_busca"] or "", linha["Numero_Recibo"]) for linha in linhas])
+
+    def _esquema_v13(self, cur):
+        # Chaves do catálogo de cada recibo (do banco e arquivados), para refazer o registro de uma
+        # chave quando o recibo que o definiu perde o item ou é excluído
+        cur.execute("CREATE TABLE chaves_itens (chave TEXT NOT NULL, Numero_Recibo TEXT NOT NULL, "
+                    "PRIMARY KEY (chave, Numero_Recibo)) WITHOUT ROWID")
+        cur.execute("CREATE INDEX idx_chaves_itens_numero ON chaves_itens (Numero_Recibo)")
+        self._indexar_chaves_itens(cur)
+        for particao in self._particoes_ativas():
+            vivos = [row[0] for row in cur.execute(
+                "SELECT Numero_Recibo FROM recibos_arquivados WHERE ano = ?", (particao["ano"],))]
+            itens = self.particoes.registros("itens", particao["ano"], particao["geracao"],
+                                             ["Numero_Recibo", "codigo", "descricao"], vivos)
+            chaves = ((chave_catalogo(item["codigo"], item["descricao"]), item["Numero_Recibo"]) for item in itens)
+            cur.executemany("INSERT OR IGNORE INTO chaves_itens (chave, Numero_Recibo) VALUES (?, ?)",
+                            [(chave, numero) for chave, numero in chaves if chave is not None])
+
+    def _indexar_chaves_itens(self, cur, numero_recibo=None):
+        """ Regrava em chaves_itens as chaves dos itens do recibo no banco (ou de todos os do banco) """
+        filtro = "= ?" if numero_recibo else "IN (SELECT Numero_Recibo FROM recibos)"
+        parametros = (numero_recibo,) if numero_recibo else ()
+        cur.execute(f"DELETE FROM chaves_itens WHERE Numero_Recibo {filtro}", parametros)
+        cur.execute(
+            "INSERT OR IGNORE INTO chaves_itens (chave, Numero_Recibo) "
+            "SELECT chave_catalogo(codigo, descricao), Numero_Recibo FROM itens_recibo "
+            f"WHERE chave_catalogo(codigo, descricao) IS NOT NULL AND Numero_Recibo {filtro}", parametros)
+
+    def _chaves_catalogo(self, cur, numero_recibo):
+        """ Chaves do catálogo cujo registro veio deste recibo (o uso mais recente de cada uma) """
+        return {row[0] for row in cur.execute(
+            "SELECT chave FROM catalogo WHERE ultimo_recibo = ? AND chave IN "
+            "(SELECT chave FROM chaves_itens WHERE Numero_Recibo = ?)", (numero_recibo, numero_recibo))}
+
+    def _recalcular_catalogo(self, cur, chaves):
+        """ Refaz os registros do catálogo das chaves dadas com o uso mais recente que restou, no banco
+        ou arquivado (do arquivado mais recente só a partição dele é lida); chave sem uso sai do catálogo """
+        for chave in chaves:
+            cur.execute("DELETE FROM catalogo WHERE chave = ?", (chave,))
+            cur.execute(_sql_catalogo("AND chave_catalogo(codigo, descricao) = ? AND Numero_Recibo IN "
+                                      "(SELECT Numero_Recibo FROM chaves_itens WHERE chave = ?)"), (chave, chave))
+            row = cur.execute(
+                "SELECT c.Numero_Recibo FROM chaves_itens c JOIN recibos_arquivados a ON a.Numero_Recibo = c.Numero_Recibo "
+                "WHERE c.chave = ? ORDER BY c.Numero_Recibo DESC LIMIT 1", (chave,)).fetchone()
+            if row:
+                itens = self._ler_arquivado(row[0])[0]["Itens_Recibo"]
+                cur.executemany(_sql_catalogo(linhas=True), [
+                    (chave, item["codigo"], item["descricao"], normalizar_nome(item["descricao"]), item["tipo"],
+                     item["uni"], item["valor"], row[0])
+                    for item in itens if chave_catalogo(item["codigo"], item["descricao"]) == chave])
+
+    def _registrar_alteracao(self, cur, numero_recibo, excluido=False):
+        # REPLACE apaga a linha anterior do recibo: o registro não cresce com edições repetidas
+        cur.execute("INSERT OR REPLACE INTO alteracoes (Numero_Recibo, excluido) VALUES (?, ?)",
+                    (numero_recibo, int(excluido)))
+
+    def _verificar_versao(self, cur, numero_recibo, versao):
+        """ Versão gravada do recibo (None se não existe); ConflitoVersao se versao foi dada e difere """
+        row = cur.execute("SELECT versao FROM recibos WHERE Numero_Recibo = ?", (numero_recibo,)).fetchone()
+        atual = row[0] if row else None
+        if versao is not None and atual != versao:
+            raise ConflitoVersao(numero_recibo, atual)
+        return atual
+
+    def _reconstruir_resumos(self, cur):
+        cur.execute("DELETE FROM resumos")
+        for periodo, tamanho in PERIODOS_RESUMO.items():
+            cur.execute(
+                "INSERT INTO resumos (periodo, data, categoria, quantidade, valor) "
+                f"SELECT ?, substr(data_iso, 1, {tamanho}), 'recibos', COUNT(*), SUM(COALESCE(Valor_Total_Final, 0)) "
+                "FROM recibos WHERE data_iso IS NOT NULL GROUP BY 2", (periodo,))
+            cur.execute(
+                "INSERT INTO resumos (periodo, data, categoria, quantidade, valor) "
+                f"SELECT ?, substr(r.data_iso, 1, {tamanho}), 'itens:' || COALESCE(NULLIF(i.tipo, ''), 'Outros'), "
+                "COUNT(*), SUM(COALESCE(i.valor_total, 0)) "
+                "FROM recibos r JOIN itens_recibo i ON i.Numero_Recibo = r.Numero_Recibo "
+                "WHERE r.data_iso IS NOT NULL GROUP BY 2, 3", (periodo,))
+
+    def _contribuicao_resumo(self, cur, numero_recibo):
+        """ Linhas (data_iso, categoria, quantidade, valor) com que o recibo entra nos resumos """
+        return cur.execute(_SQL_CONTRIBUICAO_RESUMO, {"numero": numero_recibo}).fetchall()
+
+    def _aplicar_resumo(self, cur, contribuicao, sinal):
+        """ Soma (sinal=1) ou subtrai (sinal=-1) a contribuição de um recibo nos resumos do dia e do mês """
+        linhas = [(periodo, data_iso[:tamanho], categoria, sinal * quantidade, sinal * valor)
+                  for data_iso, categoria, quantidade, valor in contribuicao
+                  for periodo, tamanho in PERIODOS_RESUMO.items()]
+        cur.executemany(
+            "INSERT INTO resumos (periodo, data, categoria, quantidade, valor) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(periodo, data, categoria) DO UPDATE SET "
+            "quantidade = quantidade + excluded.quantidade, valor = valor + excluded.valor", linhas)
+        # Categoria que ficou sem recibos no período sai do resumo (sem resíduo de arredondamento)
+        cur.executemany("DELETE FROM resumos WHERE periodo = ? AND data = ? AND categoria = ? AND quantidade <= 0",
+                        [linha[:3] for linha in linhas])
+
+    def _reindexar_texto(self, cur):
+        cur.execute("DELETE FROM busca_ids WHERE Numero_Recibo NOT IN (SELECT Numero_Recibo FROM recibos)")
+        cur.execute("INSERT OR IGNORE INTO busca_ids (Numero_Recibo) SELECT Numero_Recibo FROM recibos")
+        cur.execute("DELETE FROM busca_recibos")
+        cur.execute(f"INSERT INTO busca_recibos (rowid, nome, placa, veiculo, observacoes, itens) {_SQL_TEXTO_BUSCA}")
+
+    def _indexar_texto(self, cur, numero_recibo):
+        cur.execute("INSERT OR IGNORE INTO busca_ids (Numero_Recibo) VALUES (?)", (numero_recibo,))
+        id_busca = cur.execute("SELECT id FROM busca_ids WHERE Numero_Recibo = ?", (numero_recibo,)).fetchone()[0]
+        cur.execute("DELETE FROM busca_recibos WHERE rowid = ?", (id_busca,))
+        cur.execute(f"INSERT INTO busca_recibos (rowid, nome, placa, veiculo, observacoes, itens) "
+                    f"{_SQL_TEXTO_BUSCA} WHERE r.Numero_Recibo = ?", (numero_recibo,))
+
+    def _desindexar_texto(self, cur, numero_recibo):
+        row = cur.execute("SELECT id FROM busca_ids WHERE Numero_Recibo = ?", (numero_recibo,)).fetchone()
+        if row:
+            cur.execute("DELETE FROM busca_recibos WHERE rowid = ?", (row[0],))
+            cur.execute("DELETE FROM busca_ids WHERE id = ?", (row[0],))
+
+    def _migrar_itens_legados(self, cur):
+        """ Converte o texto de Detalhes_Itens em linhas de itens_recibo e limpa a coluna """
+        legados = cur.execute(
+            "SELECT Numero_Recibo, Detalhes_Itens FROM recibos WHERE COALESCE(Detalhes_Itens, '') != ''"
+        ).fetchall()
+        for numero_recibo, detalhes_itens in legados:
+            self._gravar_itens(cur, numero_recibo, ler_detalhes_itens_legado(detalhes_itens))
+        cur.execute("UPDATE recibos SET Detalhes_Itens = NULL WHERE Detalhes_Itens IS NOT NULL")
+
+    def _gravar_itens(self, cur, numero_recibo, itens):
+        cur.execute("DELETE FROM itens_recibo WHERE Numero_Recibo = ?", (numero_recibo,))
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_ITEM)
+        marcadores = ", ".join("?" for _ in COLUNAS_ITEM)
+        cur.executemany(
+            f"INSERT INTO itens_recibo (Numero_Recibo, posicao, {colunas}) VALUES (?, ?, {marcadores})",
+            [[numero_recibo, posicao] + [item.get(col) for col in COLUNAS_ITEM]
+             for posicao, item in enumerate(itens)]
+        )
+
+    def _ler_itens(self, numero_recibo):
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_ITEM)
+        rows = self.conexao.execute(
+            f"SELECT {colunas} FROM itens_recibo WHERE Numero_Recibo = ? ORDER BY posicao", (numero_recibo,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- Partições arquivadas ---
+
+    def _particoes_ativas(self, data_inicio=None, data_fim=None):
+        """ Partições com recibos que podem cair no período (poda pelo intervalo de datas de cada uma),
+        da mais recente para a mais antiga. Sem partições, não custa mais que uma consulta ao índice """
+        rows = self.conexao.execute(
+            "SELECT ano, geracao, quantidade, linhas_arquivo, numero_min, numero_max, data_min, data_max "
+            "FROM particoes WHERE quantidade > 0 AND (? IS NULL OR data_max >= ?) AND (? IS NULL OR data_min <= ?) "
+            "ORDER BY ano DESC", (data_inicio, data_inicio, data_fim, data_fim)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _ler_particao(self, tabela, particao, colunas=None, numeros=None):
+        """ Linhas vivas de uma partição: as dos recibos que o índice ainda aponta para ela """
+        if particao["quantidade"] == particao["linhas_arquivo"]:
+            return self.particoes.ler(tabela, particao["ano"], particao["geracao"], colunas, numeros)
+        leitura = colunas if colunas is None or "Numero_Recibo" in colunas else ["Numero_Recibo"] + colunas
+        df = self.particoes.ler(tabela, particao["ano"], particao["geracao"], leitura, numeros)
+        vivos = [row[0] for row in self.conexao.execute(
+            "SELECT Numero_Recibo FROM recibos_arquivados WHERE ano = ?", (particao["ano"],))]
+        df = df[df["Numero_Recibo"].isin(vivos)]
+        return df if leitura is colunas else df[colunas]
+
+    def _consultar_arquivados(self, colunas, data_inicio=None, data_fim=None, particoes=None, tabela="recibos"):
+        """ DataFrame com as colunas pedidas dos recibos (ou itens) arquivados do período, lidos das
+        partições dadas (padrão: as que cruzam o período). O filtro de período lê primeiro só
+        Numero_Recibo e data_iso; as demais colunas, só dos recibos encontrados """
+        if particoes is None:
+            particoes = self._particoes_ativas(data_inicio, data_fim)
+        partes = []
+        for particao in particoes:
+            numeros = None
+            if data_inicio or data_fim:
+                df = self._ler_particao(tabela, particao, ["Numero_Recibo", "data_iso"])
+                datas = df["data_iso"].fillna("")
+                df = df[(datas >= (data_inicio or "")) & (datas <= (data_fim or "\U0010ffff"))]
+                if df.empty:
+                    continue
+                numeros = df["Numero_Recibo"].unique().tolist()
+            partes.append(self._ler_particao(tabela, particao, colunas, numeros))
+        return _concatenar(partes, colunas)
+
+    def _ler_arquivados(self, numeros):
+        """ Linhas (COLUNAS_RECIBO) dos recibos arquivados com os números dados. O índice diz a partição
+        de cada um: só as partições que têm algum deles são abertas """
+        if not numeros:
+            return []
+        marcadores = ", ".join("?" for _ in numeros)
+        por_particao = {}
+        for numero, ano, geracao in self.conexao.execute(
+                "SELECT a.Numero_Recibo, p.ano, p.geracao FROM recibos_arquivados a JOIN particoes p ON p.ano = a.ano "
+                f"WHERE a.Numero_Recibo IN ({marcadores})", numeros):
+            por_particao.setdefault((ano, geracao), []).append(numero)
+        linhas = []
+        for (ano, geracao), numeros_particao in por_particao.items():
+            linhas += self.particoes.registros("recibos", ano, geracao, COLUNAS_RECIBO, numeros_particao)
+        return linhas
+
+    def _recibos_recentes(self, condicao, parametros, limite, deslocamento=0):
+        """ Recibos (do banco e arquivados) que atendem à condição, em ordem decrescente de número,
+        do deslocamento até o limite. Os números dos arquivados vêm do índice recibos_arquivados
+        (mesmas colunas de busca); das partições só são lidas as linhas que entram no resultado """
+        where = f"WHERE {condicao}" if condicao else ""
+        rows = self.conexao.execute(
+            f"SELECT {_SELECT_RECIBO} FROM recibos {where} ORDER BY Numero_Recibo DESC LIMIT ?",
+            tuple(parametros) + (limite + deslocamento,)
+        ).fetchall()
+        linhas = [dict(row) for row in rows]
+        arquivados = [row[0] for row in self.conexao.execute(
+            f"SELECT Numero_Recibo FROM recibos_arquivados {where} ORDER BY Numero_Recibo DESC LIMIT ?",
+            tuple(parametros) + (limite + deslocamento,))]
+        if not arquivados:
+            return linhas[deslocamento:]
+        numeros = sorted([linha["Numero_Recibo"] for linha in linhas] + arquivados, reverse=True)
+        numeros = set(numeros[deslocamento:limite + deslocamento])
+        linhas = [linha for linha in linhas if linha["Numero_Recibo"] in numeros]
+        linhas += self._ler_arquivados([numero for numero in arquivados if numero in numeros])
+        return sorted(linhas, key=lambda linha: linha["Numero_Recibo"], reverse=True)
+
+    def _ler_arquivado(self, numero_recibo):
+        """ (recibo como em obter, ano da partição) de um recibo arquivado, ou None """
+        row = self.conexao.execute(
+            "SELECT p.* FROM recibos_arquivados a JOIN particoes p ON p.ano = a.ano WHERE a.Numero_Recibo = ?",
+            (numero_recibo,)
+        ).fetchone()
+        if not row:
+            return None
+        particao = dict(row)
+        dados = self.particoes.registros("recibos", particao["ano"], particao["geracao"], COLUNAS_RECIBO + ["versao"],
+                                         [numero_recibo])[0]
+        itens = self.particoes.registros("itens", particao["ano"], particao["geracao"], ["posicao"] + COLUNAS_ITEM,
+                                         [numero_recibo])
+        dados["Itens_Recibo"] = [{col: item[col] for col in COLUNAS_ITEM}
+                                 for item in sorted(itens, key=lambda item: item["posicao"])]
+        return dados, particao["ano"]
+
+    def _reidratar(self, cur, numero_recibo):
+        """ Traz de volta ao banco um recibo arquivado, para ser editado ou excluído como os demais.
+        Resumos, cadastros e catálogo já o contam; a linha na partição passa a ser ignorada """
+        arquivado = self._ler_arquivado(numero_recibo)
+        if arquivado is None:
+            return
+        dados, ano = arquivado
+        todas_colunas = COLUNAS_RECIBO + list(COLUNAS_NORMALIZADAS) + ["versao"]
+        colunas = ", ".join(f'"{col}"' for col in todas_colunas)
+        marcadores = ", ".join("?" for _ in todas_colunas)
+        cur.execute(f"INSERT INTO recibos ({colunas}) VALUES ({marcadores})",
+                    self._linha_para_parametros(dados) + [dados["versao"]])
+        self._gravar_itens(cur, numero_recibo, dados["Itens_Recibo"])
+        self._indexar_texto(cur, numero_recibo)
+        cur.execute("DELETE FROM recibos_arquivados WHERE Numero_Recibo = ?", (numero_recibo,))
+        cur.execute("UPDATE particoes SET quantidade = quantidade - 1 WHERE ano = ?", (ano,))
+
+    def _arquivar_ano(self, cur, ano):
+        """ Grava a nova geração da partição do ano (linhas vivas da anterior + recibos do ano no
+        banco) e tira esses recibos do banco. Retorna quantos saíram do banco """
+        import pandas as pd
+
+        # data_iso no intervalo [ano, ano seguinte): percorre o índice de data_iso
+        intervalo = "data_iso >= ? AND data_iso < ?"
+        parametros = (f"{ano}-", f"{int(ano) + 1:04d}-")
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_PARTICAO_RECIBOS)
+        recibos = pd.read_sql_query(f"SELECT {colunas} FROM recibos WHERE {intervalo}", self.conexao, params=parametros)
+        colunas_itens = ", ".join(f'i."{col}"' for col in COLUNAS_PARTICAO_ITENS[:-1])
+        itens = pd.read_sql_query(
+            f"SELECT {colunas_itens}, r.data_iso FROM itens_recibo i JOIN recibos r ON r.Numero_Recibo = i.Numero_Recibo "
+            "WHERE r.data_iso >= ? AND r.data_iso < ?", self.conexao, params=parametros)
+        novos = len(recibos)
+
+        anterior = cur.execute("SELECT * FROM particoes WHERE ano = ?", (ano,)).fetchone()
+        geracao = 1
+        if anterior:
+            anterior = dict(anterior)
+            geracao = anterior["geracao"] + 1
+            if anterior["quantidade"]:
+                recibos = _concatenar([self._ler_particao("recibos", anterior), recibos], COLUNAS_PARTICAO_RECIBOS)
+                itens = _concatenar([self._ler_particao("itens", anterior), itens], COLUNAS_PARTICAO_ITENS)
+        if recibos.empty:
+            # Todos os recibos do ano voltaram ao banco (editados ou excluídos): a partição fica vazia,
+            # em uma geração sem arquivos, para que a limpeza apague as anteriores
+            cur.execute("UPDATE particoes SET geracao = ?, quantidade = 0, linhas_arquivo = 0 WHERE ano = ?",
+                        (geracao, ano))
+            return novos
+        recibos = _tipar_particao(recibos[COLUNAS_PARTICAO_RECIBOS].sort_values("Numero_Recibo", ignore_index=True))
+        itens = _tipar_particao(itens[COLUNAS_PARTICAO_ITENS].sort_values(["Numero_Recibo", "posicao"], ignore_index=True))
+        # Arquivos primeiro: se a transação não se completar, o índice continua na geração anterior
+        self.particoes.gravar("recibos", ano, geracao, recibos)
+        self.particoes.gravar("itens", ano, geracao, itens)
+
+        # O índice de texto continua cobrindo os recibos arquivados: as linhas dele ficam no banco
+        selecao = f"SELECT Numero_Recibo FROM recibos WHERE {intervalo}"
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_ARQUIVADOS)
+        cur.execute(f"INSERT OR REPLACE INTO recibos_arquivados (Numero_Recibo, ano, {colunas}) "
+                    f"SELECT Numero_Recibo, ?, {colunas} FROM recibos WHERE {intervalo}", (ano,) + parametros)
+        cur.execute(f"DELETE FROM itens_recibo WHERE Numero_Recibo IN ({selecao})", parametros)
+        cur.execute(f"DELETE FROM recibos WHERE {intervalo}", parametros)
+        cur.execute(
+            "INSERT OR REPLACE INTO particoes (ano, geracao, quantidade, linhas_arquivo, numero_min, numero_max, "
+            "data_min, data_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (ano, geracao, len(recibos), len(recibos), recibos["Numero_Recibo"].min(), recibos["Numero_Recibo"].max(),
+             recibos["data_iso"].min(), recibos["data_iso"].max()))
+        return novos
+
+    def _ajustar_sequencia(self, cur):
+        """ Garante que a sequência não fique atrás do maior número gravado (varre a tabela; só em migrações) """
+        cur.execute(
+            "UPDATE sequencias SET valor = MAX(valor, COALESCE(("
+            "SELECT MAX(CAST(Numero_Recibo AS INTEGER)) FROM recibos "
+            "WHERE Numero_Recibo NOT GLOB '*[^0-9]*'), 0)) WHERE nome = 'recibo'"
+        )
+
+    def _preencher_colunas_normalizadas(self, cur, colunas=None):
+        colunas = colunas or list(COLUNAS_NORMALIZADAS)
+        cur.execute("UPDATE recibos SET " + ", ".join(
+            f'{coluna} = {coluna}("{COLUNAS_NORMALIZADAS[coluna]}")' for coluna in colunas))
+
+    @contextmanager
+    def _transacao(self):
+        # IMMEDIATE reserva a escrita já no início, evitando deadlock entre leitores que viram escritores
+        self.conexao.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conexao.cursor()
+        except BaseException:
+            self.conexao.execute("ROLLBACK")
+            raise
+        self.conexao.execute("COMMIT")
+
+    def _meta(self, chave, default=None):
+        row = self.conexao.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return row["valor"] if row else default
+
+    def _linha_para_parametros(self, dados):
+        # Detalhes_Itens não é mais gravado: os itens vivem em itens_recibo
+        return [None if col == "Detalhes_Itens" else dados.get(col) for col in COLUNAS_RECIBO] + [
+            _NORMALIZADORES[coluna](dados.get(origem)) for coluna, origem in COLUNAS_NORMALIZADAS.items()
+        ]
+
+    @_sincronizado
+    @_relendo_particoes
+    def obter(self, numero_recibo):
+        row = self.conexao.execute(
+            f"SELECT {_SELECT_RECIBO}, versao FROM recibos WHERE Numero_Recibo = ?",
+            (normalizar_numero_recibo(numero_recibo),)
+        ).fetchone()
+        if not row:
+            arquivado = self._ler_arquivado(normalizar_numero_recibo(numero_recibo))
+            return arquivado[0] if arquivado else None
+        dados = dict(row)
+        dados["Itens_Recibo"] = self._ler_itens(dados["Numero_Recibo"])
+        return dados
+
+    @_sincronizado
+    @_relendo_particoes
+    def listar_recentes(self, limite=50, deslocamento=0):
+        # Percorre o índice da chave primária de trás para frente: custo proporcional à página
+        return self._recibos_recentes("", (), limite, deslocamento)
+
+    def _condicao_busca(self, campo, valor):
+        """ (condição SQL, parâmetros) para buscar por campo, ou None se o valor normalizado for vazio """
+        if campo == "texto":
+            expressao = expressao_busca_texto(valor)
+            if expressao is None:
+                return None
+            return ("Numero_Recibo IN (SELECT i.Numero_Recibo FROM busca_recibos b "
+                    "JOIN busca_ids i ON i.id = b.rowid WHERE busca_recibos MATCH ?)"), (expressao,)
+        coluna = CAMPOS_BUSCA[campo]
+        if campo == "numero":
+            valor = normalizar_numero_recibo(valor)
+        else:
+            valor = _NORMALIZADORES[coluna](valor)
+        if not valor:
+            return None
+        if campo == "nome":
+            # Intervalo [prefixo, prefixo + maior caractere) percorre o índice sem varrer a tabela
+            return f"{coluna} >= ? AND {coluna} < ?", (valor, valor + "\U0010ffff")
+        return f"{coluna} = ?", (valor,)
+
+    @_sincronizado
+    @_relendo_particoes
+    def buscar(self, campo, valor, limite=200):
+        condicao_busca = self._condicao_busca(campo, valor)
+        if condicao_busca is None:
+            return []
+        condicao, parametros = condicao_busca
+        return self._recibos_recentes(condicao, parametros, limite)
+
+    @_sincronizado
+    @_relendo_particoes
+    def listar_numeros(self, data_inicio=None, data_fim=None, campo=None, valor=None):
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append("data_iso >= ?")
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append("data_iso <= ?")
+            parametros.append(data_fim)
+        if campo:
+            condicao_busca = self._condicao_busca(campo, valor)
+            if condicao_busca is None:
+                return []
+            condicoes.append(condicao_busca[0])
+            parametros.extend(condicao_busca[1])
+        where = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+        # Os arquivados têm as mesmas colunas de busca em recibos_arquivados: nenhuma partição é aberta
+        return [row[0] for row in self.conexao.execute(
+            f"SELECT Numero_Recibo FROM recibos {where} UNION ALL "
+            f"SELECT Numero_Recibo FROM recibos_arquivados {where} ORDER BY Numero_Recibo", parametros * 2)]
+
+    @_sincronizado
+    @_relendo_particoes
+    def contar(self, campo=None, valor=None):
+        if not campo:
+            # Os arquivados são contados pelo índice das partições, sem abrir nenhuma
+            return self.conexao.execute(
+                "SELECT (SELECT COUNT(*) FROM recibos) + (SELECT COUNT(*) FROM recibos_arquivados)"
+            ).fetchone()[0]
+        condicao_busca = self._condicao_busca(campo, valor)
+        if condicao_busca is None:
+            return 0
+        condicao, parametros = condicao_busca
+        if campo == "texto":
+            # Uma linha do índice de texto por recibo, do banco ou arquivado: conta direto no índice
+            return self.conexao.execute("SELECT COUNT(*) FROM busca_recibos WHERE busca_recibos MATCH ?",
+                                        parametros).fetchone()[0]
+        return self.conexao.execute(
+            f"SELECT (SELECT COUNT(*) FROM recibos WHERE {condicao}) + "
+            f"(SELECT COUNT(*) FROM recibos_arquivados WHERE {condicao})", parametros * 2).fetchone()[0]
+
+    @_sincronizado
+    @_relendo_particoes
+    def listar_pagina(self, ordem="numero", decrescente=True, campo=None, valor=None, apos=None, limite=200):
+        expressao = ORDENACOES_HISTORICO[ordem]
+        condicoes, parametros = [], []
+        if campo:
+            condicao_busca = self._condicao_busca(campo, valor)
+            if condicao_busca is None:
+                return []
+            condicoes.append(condicao_busca[0])
+            parametros.extend(condicao_busca[1])
+        direcao, comparacao = ("DESC", "<") if decrescente else ("ASC", ">")
+        if ordem == "numero":
+            chave_sql, ordem_sql = "Numero_Recibo", f"Numero_Recibo {direcao}"
+            if apos is not None:
+                condicoes.append(f"Numero_Recibo {comparacao} ?")
+                parametros.append(apos)
+        else:
+            # Desempate pelo número: a chave (ordenação, número) é única
+            chave_sql = expressao
+            ordem_sql = f"{expressao} {direcao}, Numero_Recibo {direcao}"
+            if apos is not None:
+                # Equivale a (expressao, número) < (?, ?), mas escrito assim o SQLite usa o índice como
+                # intervalo; a comparação de tuplas faria o planejador percorrer o índice desde o início
+                condicoes.append(f"{expressao} {comparacao}= ? AND ({expressao} {comparacao} ? OR Numero_Recibo {comparacao} ?)")
+                parametros.extend([apos[0], apos[0], apos[1]])
+        where = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_HISTORICO)
+        # A mesma consulta (e os mesmos índices) nos recibos do banco e no índice dos arquivados, que
+        # tem as colunas da lista: a página sai inteira do banco, sem abrir partições
+        pagina = []
+        for tabela in ("recibos", "recibos_arquivados"):
+            rows = self.conexao.execute(
+                f"SELECT {colunas}, {chave_sql} AS _ordem FROM {tabela} {where} ORDER BY {ordem_sql} LIMIT ?",
+                parametros + [limite]
+            ).fetchall()
+            for row in rows:
+                linha = dict(row)
+                ordem_valor = linha.pop("_ordem")
+                linha["_chave"] = linha["Numero_Recibo"] if ordem == "numero" else (ordem_valor, linha["Numero_Recibo"])
+                pagina.append(linha)
+        return sorted(pagina, key=lambda linha: linha["_chave"], reverse=decrescente)[:limite]
+
+    @_sincronizado
+    @_relendo_particoes
+    def totais_por_tipo_item(self, data_inicio=None, data_fim=None):
+        rows = self.conexao.execute(
+            "SELECT i.tipo, SUM(i.valor_total) FROM itens_recibo i "
+            "JOIN recibos r ON r.Numero_Recibo = i.Numero_Recibo "
+            "WHERE (? IS NULL OR r.data_iso >= ?) AND (? IS NULL OR r.data_iso <= ?) "
+            "GROUP BY i.tipo",
+            (data_inicio, data_inicio, data_fim, data_fim)
+        ).fetchall()
+        totais = {tipo: total for tipo, total in rows}
+        particoes = self._particoes_ativas(data_inicio, data_fim)
+        if particoes:
+            import pandas as pd
+
+            itens = self._consultar_arquivados(["tipo", "valor_total"], data_inicio=data_inicio, data_fim=data_fim,
+                                               particoes=particoes, tabela="itens")
+            for tipo, total in itens.groupby("tipo", dropna=False)["valor_total"].sum().items():
+                tipo = None if pd.isna(tipo) else tipo   # como o GROUP BY do SQL
+                totais[tipo] = (totais.get(tipo) or 0) + float(total)
+        return totais
+
+    @_sincronizado
+    def resumo_periodo(self, periodo, data):
+        rows = self.conexao.execute(
+            "SELECT categoria, quantidade, valor FROM resumos WHERE periodo = ? AND data = ?", (periodo, data)
+        ).fetchall()
+        return {categoria: (quantidade, round(valor, 2)) for categoria, quantidade, valor in rows}
+
+    @_sincronizado
+    @_relendo_particoes
+    def dados_relatorio(self, data_inicio=None, data_fim=None):
+        import pandas as pd
+
+        # Só as condições usadas entram no SQL, para o período ser lido pelo índice de data_iso
+        condicoes, parametros = [], []
+        if data_inicio:
+            condicoes.append("r.data_iso >= ?")
+            parametros.append(data_inicio)
+        if data_fim:
+            condicoes.append("r.data_iso <= ?")
+            parametros.append(data_fim)
+        where = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+        recibos = pd.read_sql_query(
+            f"SELECT {', '.join('r.' + col for col in COLUNAS_RELATORIO)} FROM recibos r {where}",
+            self.conexao, params=parametros)
+        colunas_itens = ", ".join("r.data_iso" if col == "data_iso" else f'i."{col}"' for col in COLUNAS_RELATORIO_ITENS)
+        itens = pd.read_sql_query(
+            f"SELECT {colunas_itens} FROM recibos r JOIN itens_recibo i ON i.Numero_Recibo = r.Numero_Recibo {where}",
+            self.conexao, params=parametros)
+        # Anos arquivados: só as partições do período, e só as colunas do relatório (leitura colunar)
+        particoes = self._particoes_ativas(data_inicio, data_fim)
+        if particoes:
+            recibos = _concatenar([recibos, self._consultar_arquivados(
+                COLUNAS_RELATORIO, data_inicio=data_inicio, data_fim=data_fim, particoes=particoes)], COLUNAS_RELATORIO)
+            itens = _concatenar([itens, self._consultar_arquivados(
+                COLUNAS_RELATORIO_ITENS, data_inicio=data_inicio, data_fim=data_fim, particoes=particoes,
+                tabela="itens")], COLUNAS_RELATORIO_ITENS)
+        return recibos, itens
+
+    @_sincronizado
+    def salvar(self, dados, novo=False, versao=None):
+        dados = dict(dados)
+        todas_colunas = COLUNAS_RECIBO + list(COLUNAS_NORMALIZADAS)
+        colunas = ", ".join(f'"{col}"' for col in todas_colunas)
+        marcadores = ", ".join("?" for _ in todas_colunas)
+        atualizacoes = ", ".join(f'"{col}" = excluded."{col}"' for col in todas_colunas[1:]) + ", versao = versao + 1"
+        with self._transacao() as cur:
+            if novo:
+                # A transação IMMEDIATE serializa escritores: o incremento é atômico entre instâncias
+                cur.execute("UPDATE sequencias SET valor = valor + 1 WHERE nome = 'recibo'")
+                numero = cur.execute("SELECT valor FROM sequencias WHERE nome = 'recibo'").fetchone()[0]
+                dados["Numero_Recibo"] = str(numero).zfill(6)
+                existia = False
+                chaves_anteriores, catalogo_anterior = {}, set()
+            else:
+                dados["Numero_Recibo"] = normalizar_numero_recibo(dados["Numero_Recibo"])
+                self._reidratar(cur, dados["Numero_Recibo"])
+                existia = self._verificar_versao(cur, dados["Numero_Recibo"], versao) is not None
+                chaves_anteriores = self._chaves_cadastro(cur, dados["Numero_Recibo"])
+                catalogo_anterior = self._chaves_catalogo(cur, dados["Numero_Recibo"])
+                if existia:
+                    # A versão anterior do recibo sai dos resumos antes de a nova entrar
+                    self._aplicar_resumo(cur, self._contribuicao_resumo(cur, dados["Numero_Recibo"]), -1)
+                if dados["Numero_Recibo"].isdigit():
+                    cur.execute("UPDATE sequencias SET valor = MAX(valor, ?) WHERE nome = 'recibo'",
+                                (int(dados["Numero_Recibo"]),))
+            cur.execute(
+                f"INSERT INTO recibos ({colunas}) VALUES ({marcadores}) "
+                f"ON CONFLICT(Numero_Recibo) DO UPDATE SET {atualizacoes}",
+                self._linha_para_parametros(dados)
+            )
+            self._gravar_itens(cur, dados["Numero_Recibo"], dados.get("Itens_Recibo") or [])
+            self._indexar_texto(cur, dados["Numero_Recibo"])
+            self._atualizar_cadastros(cur, dados["Numero_Recibo"])
+            # CPF/CNPJ ou placa trocado: o cadastro da chave antiga deixa de contar este recibo
+            chaves_novas = self._chaves_cadastro(cur, dados["Numero_Recibo"])
+            self._recalcular_cadastros(cur, {tipo: chave for tipo, chave in chaves_anteriores.items()
+                                             if chave != chaves_novas[tipo]})
+            self._indexar_chaves_itens(cur, dados["Numero_Recibo"])
+            cur.execute(_sql_catalogo("AND Numero_Recibo = ?"), (dados["Numero_Recibo"],))
+            # Itens tirados na edição: se este recibo era o uso mais recente, vale o anterior a ele
+            self._recalcular_catalogo(cur, catalogo_anterior - self._chaves_catalogo(cur, dados["Numero_Recibo"]))
+            self._aplicar_resumo(cur, self._contribuicao_resumo(cur, dados["Numero_Recibo"]), 1)
+            self._registrar_alteracao(cur, dados["Numero_Recibo"])
+        return dados["Numero_Recibo"], existia
+
+    @_sincronizado
+    def deletar(self, numero_recibo, versao=None):
+        numero_recibo = normalizar_numero_recibo(numero_recibo)
+        with self._transacao() as cur:
+            self._reidratar(cur, numero_recibo)
+            if self._verificar_versao(cur, numero_recibo, versao) is None:
+                return False
+            self._aplicar_resumo(cur, self._contribuicao_resumo(cur, numero_recibo), -1)
+            chaves = self._chaves_cadastro(cur, numero_recibo)
+            catalogo = self._chaves_catalogo(cur, numero_recibo)
+            cur.execute("DELETE FROM itens_recibo WHERE Numero_Recibo = ?", (numero_recibo,))
+            cur.execute("DELETE FROM chaves_itens WHERE Numero_Recibo = ?", (numero_recibo,))
+            self._desindexar_texto(cur, numero_recibo)
+            cur.execute("DELETE FROM recibos WHERE Numero_Recibo = ?", (numero_recibo,))
+            self._recalcular_cadastros(cur, chaves)
+            self._recalcular_catalogo(cur, catalogo)
+            self._registrar_alteracao(cur, numero_recibo, excluido=True)
+            return True
+
+    @_sincronizado
+    def versao_dados(self):
+        return self.conexao.execute("PRAGMA data_version").fetchone()[0]
+
+    @_sincronizado
+    def ultima_alteracao(self):
+        return self.conexao.execute("SELECT COALESCE(MAX(id), 0) FROM alteracoes").fetchone()[0]
+
+    @_sincronizado
+    def alteracoes_desde(self, id_alteracao):
+        rows = self.conexao.execute(
+            "SELECT id, Numero_Recibo, excluido FROM alteracoes WHERE id > ? ORDER BY id", (id_alteracao,)
+        ).fetchall()
+        return [{"id": row["id"], "Numero_Recibo": row["Numero_Recibo"], "excluido": bool(row["excluido"])}
+                for row in rows]
+
+    @_sincronizado
+    @_relendo_particoes
+    def linhas_historico(self, numeros):
+        numeros = [normalizar_numero_recibo(numero) for numero in numeros]
+        if not numeros:
+            return {}
+        marcadores = ", ".join("?" for _ in numeros)
+        rows = self.conexao.execute(
+            f"SELECT {', '.join(COLUNAS_HISTORICO)} FROM recibos WHERE Numero_Recibo IN ({marcadores})", numeros
+        ).fetchall()
+        linhas = {row["Numero_Recibo"]: dict(row) for row in rows}
+        faltando = [numero for numero in numeros if numero not in linhas]
+        if faltando:
+            # Recibos arquivados: as colunas da lista estão no índice deles, sem abrir partições
+            marcadores = ", ".join("?" for _ in faltando)
+            rows = self.conexao.execute(
+                f"SELECT {', '.join(COLUNAS_HISTORICO)} FROM recibos_arquivados WHERE Numero_Recibo IN ({marcadores})",
+                faltando).fetchall()
+            linhas.update((row["Numero_Recibo"], dict(row)) for row in rows)
+        return linhas
+
+    @_sincronizado
+    def proximo_numero(self):
+        return self.conexao.execute("SELECT valor FROM sequencias WHERE nome = 'recibo'").fetchone()[0] + 1
+
+    @_sincronizado
+    @_relendo_particoes
+    def enderecos_por_cep(self):
+        colunas = ["CEP_Cliente", "Rua_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente"]
+        rows = []
+        # Anos arquivados primeiro (do mais antigo), para que os recibos do banco prevaleçam. Sem
+        # partições nem pandas nem pyarrow são carregados (semeia o cache de CEP na abertura)
+        particoes = self._particoes_ativas()
+        if particoes:
+            arquivados = self._consultar_arquivados(colunas, particoes=particoes[::-1])
+            rows = [tuple(linha[col] for col in colunas) for linha in _registros(arquivados)
+                    if linha["CEP_Cliente"] and linha["Rua_Cliente"]]
+        rows += self.conexao.execute(
+            "SELECT CEP_Cliente, Rua_Cliente, Bairro_Cliente, Cidade_Cliente, UF_Cliente FROM recibos "
+            "WHERE COALESCE(CEP_Cliente, '') != '' AND COALESCE(Rua_Cliente, '') != '' "
+            "ORDER BY Numero_Recibo"
+        ).fetchall()
+        enderecos = {}
+        for cep, rua, bairro, cidade, uf in rows:
+            cep = "".join(c for c in str(cep) if c.isdigit())
+            if len(cep) == 8:
+                # Em ordem crescente de número: o recibo mais recente prevalece
+                enderecos[cep] = {"logradouro": rua, "bairro": bairro or "", "localidade": cidade or "", "uf": uf or ""}
+        return enderecos
+
+    @_sincronizado
+    def listar_cadastro(self, tipo):
+        cadastro = CADASTROS[tipo]
+        rows = self.conexao.execute(
+            f"SELECT {cadastro['chave']}, {cadastro['rotulo']} FROM {tipo} ORDER BY {cadastro['chave']}"
+        ).fetchall()
+        return [(chave, rotulo) for chave, rotulo in rows]
+
+    @_sincronizado
+    def obter_cadastro(self, tipo, chave):
+        cadastro = CADASTROS[tipo]
+        normalizar = normalizar_documento if tipo == "clientes" else normalizar_placa
+        colunas = ", ".join(f'"{col}"' for col in cadastro["colunas"])
+        row = self.conexao.execute(
+            f"SELECT {colunas} FROM {tipo} WHERE {cadastro['chave']} = ?", (normalizar(chave),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    @_sincronizado
+    def listar_catalogo(self):
+        colunas = ", ".join(COLUNAS_CATALOGO)
+        return [dict(row) for row in self.conexao.execute(f"SELECT {colunas} FROM catalogo ORDER BY chave")]
+
+    @_sincronizado
+    def buscar_catalogo(self, codigo=None, descricao=None, limite=20):
+        if codigo is not None:
+            coluna, prefixo = "chave", normalizar_codigo_item(codigo)
+        else:
+            coluna, prefixo = "descricao_normalizada", normalizar_nome(descricao)
+        if not prefixo:
+            return []
+        colunas = ", ".join(COLUNAS_CATALOGO)
+        rows = self.conexao.execute(
+            f"SELECT {colunas} FROM catalogo WHERE {coluna} >= ? AND {coluna} < ? ORDER BY {coluna} LIMIT ?",
+            (prefixo, prefixo + "\U0010ffff", limite)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @_sincronizado
+    def importar_excel(self, caminho_excel):
+        """ Migra a planilha antiga para o banco (executado uma única vez) """
+        import pandas as pd
+
+        # Conversões vetorizadas (uma operação por coluna, não uma função Python por célula)
+        colunas_texto = ['Numero_Recibo', 'KM_Atual_Veiculo', 'Valor_Total_Final', 'Deslocamento', 'Desconto_Geral']
+        df = pd.read_excel(caminho_excel, dtype={col: str for col in colunas_texto})
+        numeros = df['Numero_Recibo'].astype(str).str.strip()
+        df['Numero_Recibo'] = numeros.where(~numeros.str.isdigit(), numeros.str.zfill(6))
+        for col in ['Valor_Total_Final', 'Deslocamento', 'Desconto_Geral']:
+            if col in df.columns:
+                df[col] = _serie_monetaria(df[col])
+        # Compatibilidade com a coluna antiga KM_Atual_Veiculo
+        if 'KM_Atual_Veiculo' in df.columns:
+            km_atual = _serie_quilometragem(df['KM_Atual_Veiculo'])
+            if 'KM_Entrada_Veiculo' not in df.columns:
+                df['KM_Entrada_Veiculo'] = km_atual
+            else:
+                df['KM_Entrada_Veiculo'] = df['KM_Entrada_Veiculo'].fillna(km_atual)
+        for col in COLUNAS_RECIBO:
+            if col not in df.columns:
+                df[col] = None
+        df = df[COLUNAS_RECIBO].astype(object).where(df[COLUNAS_RECIBO].notna(), None)
+
+        colunas = ", ".join(f'"{col}"' for col in COLUNAS_RECIBO)
+        marcadores = ", ".join("?" for _ in COLUNAS_RECIBO)
+        with self._transacao() as cur:
+            cur.executemany(
+                f"INSERT OR REPLACE INTO recibos ({colunas}) VALUES ({marcadores})",
+                df.itertuples(index=False, name=None)
+            )
+            self._preencher_colunas_normalizadas(cur)
+            self._migrar_itens_legados(cur)
+            self._ajustar_sequencia(cur)
+            self._reindexar_texto(cur)
+            self._reconstruir_cadastros(cur)
+            self._indexar_chaves_itens(cur)
+            cur.execute(_sql_catalogo())
+            self._reconstruir_resumos(cur)
+            self._registrar_alteracao(cur, ALTERACAO_TODOS)
+            cur.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('excel_importado', ?)", (caminho_excel,))
+        print(f"{len(df)} recibos importados de {caminho_excel} para {self.caminho_banco}", file=sys.stderr)
+
+    @_sincronizado
+    @_relendo_particoes
+    def exportar_excel(self, caminho_excel):
+        import pandas as pd
+
+        df = pd.read_sql_query(f"SELECT {_SELECT_RECIBO} FROM recibos ORDER BY Numero_Recibo", self.conexao)
+        # Na planilha, os itens voltam a aparecer como texto na coluna Detalhes_Itens
+        colunas_item = ", ".join(f'"{col}"' for col in COLUNAS_ITEM)
+        itens = pd.read_sql_query(
+            f"SELECT Numero_Recibo, posicao, {colunas_item} FROM itens_recibo ORDER BY Numero_Recibo, posicao",
+            self.conexao)
+        particoes = self._particoes_ativas()
+        if particoes:
+            df = _concatenar([df, self._consultar_arquivados(COLUNAS_RECIBO, particoes=particoes)], COLUNAS_RECIBO)
+            df = df.sort_values("Numero_Recibo", ignore_index=True)
+            itens = _concatenar([itens, self._consultar_arquivados(
+                ["Numero_Recibo", "posicao"] + COLUNAS_ITEM, particoes=particoes, tabela="itens")], list(itens.columns))
+            itens = itens.sort_values(["Numero_Recibo", "posicao"], ignore_index=True)
+        detalhes = {
+            numero: formatar_detalhes_itens(grupo.to_dict("records"))
+            for numero, grupo in itens.groupby("Numero_Recibo", sort=False)
+        }
+        df["Detalhes_Itens"] = df["Numero_Recibo"].map(detalhes)
+        with gravacao_atomica(caminho_excel) as temporario:
+            df.to_excel(temporario, index=False)
+        print(f"{len(df)} recibos exportados para {caminho_excel}", file=sys.stderr)
+        return len(df)
+
+    @_sincronizado
+    def copiar_banco(self, caminho):
+        # API de backup do SQLite: copia as páginas de uma leitura consistente, na mesma ordem do original
+        destino = sqlite3.connect(caminho)
+        try:
+            self.conexao.backup(destino)
+        finally:
+            destino.close()
+
+    @_sincronizado
+    def arquivar(self, ate_ano=None):
+        ate_ano = str(ate_ano or datetime.now().year).zfill(4)
+        # Anos fechados com recibos no banco, e partições com linhas de recibos que voltaram ao banco
+        sql_anos = ("SELECT DISTINCT substr(data_iso, 1, 4) FROM recibos WHERE data_iso < ? "
+                    "UNION SELECT ano FROM particoes WHERE quantidade < linhas_arquivo AND ano < ? ORDER BY 1")
+        sql_geracoes = "SELECT ano, geracao FROM particoes"
+        # Consulta sem reservar a escrita: na abertura do aplicativo quase sempre não há nada a fazer
+        if (not self.conexao.execute(sql_anos, (ate_ano, ate_ano)).fetchall()
+                and not self.particoes.obsoletas(dict(self.conexao.execute(sql_geracoes).fetchall()))):
+            return {}
+        arquivados = {}
+        with self._transacao() as cur:
+            # Com a escrita reservada nenhuma outra estação está gravando uma geração nova, e as
+            # substituídas em arquivamentos já confirmados não são mais apontadas pelo índice.
+            # As que este arquivamento substituir ficam para o próximo: apagá-las antes do COMMIT
+            # perderia os recibos se ele falhasse
+            self.particoes.limpar(dict(cur.execute(sql_geracoes).fetchall()))
+            for (ano,) in cur.execute(sql_anos, (ate_ano, ate_ano)).fetchall():
+                arquivados[ano] = self._arquivar_ano(cur, ano)
+            if arquivados:
+                self._registrar_alteracao(cur, ALTERACAO_TODOS)
+        if arquivados:
+            print(f"Arquivamento: {sum(arquivados.values())} recibo(s) de {', '.join(arquivados)} "
+                  f"movido(s) para {self.particoes.pasta}", file=sys.stderr)
+        return arquivados
+
+    @_sincronizado
+    def listar_particoes(self):
+        rows = self.conexao.execute(
+            "SELECT ano, geracao, quantidade, numero_min, numero_max FROM particoes WHERE quantidade > 0 "
+            "ORDER BY ano").fetchall()
+        return [{"ano": row["ano"], "recibos": row["quantidade"], "numero_min": row["numero_min"],
+                 "numero_max": row["numero_max"], "bytes": self.particoes.tamanho(row["ano"], row["geracao"])}
+                for row in rows]
+
+    @_sincronizado
+    def fechar(self):
+        self.conexao.close()
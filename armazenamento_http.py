@@ -0,0 +1,162 @@
+import json
+import threading
+
+from armazenamento import ArmazenamentoRecibos, ConflitoVersao
+from arquivos import gravar_arquivo
+from servidor import de_json, para_json
+
+# --- Cliente do Servidor de Recibos ---
+# Mesma interface de ArmazenamentoRecibos, atendida pelo servidor.py de outra máquina (ou da
+# mesma). As chamadas reaproveitam conexões keep-alive de uma única sessão HTTP, compartilhada
+# entre as threads do aplicativo.
+
+
+class ArmazenamentoHTTP(ArmazenamentoRecibos):
+    def __init__(self, url, token=None, timeout=30, conexoes=8):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.conexoes = conexoes
+        self._sessao = None
+        self._trava = threading.Lock()
+
+    def _sessao_http(self):
+        with self._trava:
+            if self._sessao is None:
+                import requests  # Adiado, como na consulta de CEP: não pesa na abertura do aplicativo
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                sessao.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.conexoes))
+                sessao.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.conexoes))
+                if self.token:
+                    sessao.headers["Authorization"] = f"Bearer {self.token}"
+                self._sessao = sessao
+            return self._sessao
+
+    def _requisitar(self, metodo_http, caminho, corpo=None):
+        """ Resposta já conferida; erros do servidor viram as mesmas exceções do armazenamento local
+        (ConflitoVersao, ValueError, RuntimeError) e falhas de rede, OSError (RequestException) """
+        dados = None if corpo is None else json.dumps(corpo, default=para_json).encode("utf-8")
+        resposta = self._sessao_http().request(
+            metodo_http, self.url + caminho, data=dados, timeout=self.timeout,
+            headers={"Content-Type": "application/json"} if dados is not None else None)
+        if resposta.status_code == 200:
+            return resposta
+        try:
+            erro = resposta.json()
+        except ValueError:
+            erro = {"mensagem": resposta.text}
+        if resposta.status_code == 409:
+            raise ConflitoVersao(erro["numero_recibo"], erro["versao_atual"])
+        if resposta.status_code == 400:
+            raise ValueError(erro.get("mensagem"))
+        raise RuntimeError(f"Servidor de recibos ({resposta.status_code}): {erro.get('mensagem')}")
+
+    def _chamar(self, metodo, *args, **kwargs):
+        resposta = self._requisitar("POST", f"/api/{metodo}", {"args": list(args), "kwargs": kwargs})
+        return json.loads(resposta.content, object_hook=de_json)["resultado"]
+
+    def obter(self, numero_recibo):
+        return self._chamar("obter", numero_recibo)
+
+    def salvar(self, dados, novo=False, versao=None):
+        numero_recibo, atualizado = self._chamar("salvar", dados, novo=novo, versao=versao)
+        return numero_recibo, atualizado
+
+    def deletar(self, numero_recibo, versao=None):
+        return self._chamar("deletar", numero_recibo, versao=versao)
+
+    def versao_dados(self):
+        # No servidor todas as estações gravam pela mesma conexão, cujo PRAGMA data_version não muda
+        # com as próprias gravações: o id da última alteração é o contador que vale para todos
+        return self._chamar("ultima_alteracao")
+
+    def ultima_alteracao(self):
+        return self._chamar("ultima_alteracao")
+
+    def alteracoes_desde(self, id_alteracao):
+        return self._chamar("alteracoes_desde", id_alteracao)
+
+    def linhas_historico(self, numeros):
+        return self._chamar("linhas_historico", list(numeros))
+
+    def listar_recentes(self, limite=50, deslocamento=0):
+        return self._chamar("listar_recentes", limite=limite, deslocamento=deslocamento)
+
+    def buscar(self, campo, valor, limite=200):
+        return self._chamar("buscar", campo, valor, limite=limite)
+
+    def listar_numeros(self, data_inicio=None, data_fim=None, campo=None, valor=None):
+        return self._chamar("listar_numeros", data_inicio, data_fim, campo, valor)
+
+    def contar(self, campo=None, valor=None):
+        return self._chamar("contar", campo, valor)
+
+    def listar_pagina(self, ordem="numero", decrescente=True, campo=None, valor=None, apos=None, limite=200):
+        return self._chamar("listar_pagina", ordem, decrescente, campo, valor, apos=apos, limite=limite)
+
+    def totais_por_tipo_item(self, data_inicio=None, data_fim=None):
+        return self._chamar("totais_por_tipo_item", data_inicio, data_fim)
+
+    def dados_relatorio(self, data_inicio=None, data_fim=None):
+        recibos, itens = self._chamar("dados_relatorio", data_inicio, data_fim)
+        return recibos, itens
+
+    def resumo_periodo(self, periodo, data):
+        return {categoria: tuple(valores) for categoria, valores in self._chamar("resumo_periodo", periodo, data).items()}
+
+    def proximo_numero(self):
+        return self._chamar("proximo_numero")
+
+    def enderecos_por_cep(self):
+        return self._chamar("enderecos_por_cep")
+
+    def listar_cadastro(self, tipo):
+        return [tuple(par) for par in self._chamar("listar_cadastro", tipo)]
+
+    def obter_cadastro(self, tipo, chave):
+        return self._chamar("obter_cadastro", tipo, chave)
+
+    def listar_catalogo(self):
+        return self._chamar("listar_catalogo")
+
+    def buscar_catalogo(self, codigo=None, descricao=None, limite=20):
+        return self._chamar("buscar_catalogo", codigo, descricao, limite=limite)
+
+    def arquivar(self, ate_ano=None):
+        return self._chamar("arquivar", ate_ano)
+
+    def listar_particoes(self):
+        return self._chamar("listar_particoes")
+
+    def exportar_excel(self, caminho_excel):
+        resposta = self._requisitar("GET", "/excel")
+        gravar_arquivo(caminho_excel, resposta.content)
+        return int(resposta.headers["X-Recibos"])
+
+    def fechar(self):
+        if self._sessao is not None:
+            self._sessao.close()
+
+
+class RenderizadorHTTP:
+    """ Gera os PDFs nos processos de renderização do servidor (mesma assinatura de
+    RenderizadorRecibo.gerar_pdf); o arquivo é gravado localmente """
+
+    remoto = True
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def aquecer(self):
+        pass   # o servidor mantém os processos de renderização aquecidos
+
+    def gerar_pdf(self, dados_recibo, caminho_pdf, data_atual, hora_atual, progresso=None):
+        progresso = progresso or (lambda percentual, etapa: None)
+        resposta = self.cliente._requisitar("POST", "/pdf", {
+            "dados": dados_recibo, "data_atual": data_atual, "hora_atual": hora_atual})
+        progresso(70, "PDF gerado no servidor")
+        gravar_arquivo(caminho_pdf, resposta.content)
+        progresso(100, "PDF gravado")
+        return caminho_pdf
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# --- Gravação Atômica de Arquivos ---
+# Planilhas, relatórios, PDFs e a base de CEP são gravados em um temporário na mesma pasta,
+# sincronizados com o disco (fsync) e só então trocados pelo arquivo final (os.replace, atômico).
+# Uma queda de energia ou um erro no meio da gravação deixa o arquivo anterior intacto, nunca
+# um arquivo pela metade.
+
+
+def _sincronizar(caminho, diretorio=False):
+    if diretorio:
+        # A troca de nome só fica gravada quando a pasta é sincronizada (POSIX; no Windows não se aplica)
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        descritor = os.open(caminho, os.O_RDONLY | os.O_DIRECTORY)
+    else:
+        descritor = os.open(caminho, os.O_RDWR)
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+
+@contextmanager
+def gravacao_atomica(caminho):
+    """ Fornece um caminho temporário (mesma pasta e extensão) onde o conteúdo deve ser gravado;
+    ao sair sem erro ele substitui caminho. Com erro, o temporário é apagado e caminho não muda """
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    # A extensão é mantida: o pandas escolhe o formato da planilha por ela
+    descritor, temporario = tempfile.mkstemp(prefix=f".{nome}.", suffix=".tmp" + os.path.splitext(nome)[1], dir=pasta)
+    os.close(descritor)
+    try:
+        yield temporario
+        _sincronizar(temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    _sincronizar(pasta, diretorio=True)
+
+
+def gravar_arquivo(caminho, conteudo):
+    """ Grava os bytes em caminho de forma atômica """
+    with gravacao_atomica(caminho) as temporario:
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(conteudo)
+    return caminho
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from arquivos import gravacao_atomica, gravar_arquivo
+from particoes import PASTA_PARTICOES
+
+# --- Backups Incrementais ---
+# Cada backup é um manifesto (snapshots/<id>.json) que descreve o banco e os PDFs como listas de
+# blocos; os blocos ficam em blocos/<2 primeiros>/<sha256>, um arquivo por conteúdo distinto.
+# Bloco que já existe no destino não é gravado de novo (deduplicação), então cada backup só
+# acrescenta o que mudou desde o anterior:
+#   - banco: cópia consistente pela API de backup do SQLite, em blocos alinhados às páginas;
+#     páginas intocadas dão os mesmos blocos, e só as páginas dos recibos alterados são novas
+#   - PDFs: arquivo com o mesmo tamanho e data de modificação do backup anterior nem é lido
+#   - partições arquivadas (Arquivo_Recibos): como os PDFs; cada geração é gravada uma vez só
+# Blocos são gravados antes do manifesto, ambos de forma atômica: um backup interrompido não
+# deixa snapshot pela metade, só blocos sem manifesto (reaproveitados no próximo).
+
+TAMANHO_BLOCO_BANCO = 16 * 1024         # 4 páginas do SQLite: menor regrava menos, mas multiplica os arquivos
+TAMANHO_BLOCO_ARQUIVO = 1024 * 1024    # PDFs raramente mudam: o ganho vem de não ler os inalterados
+NOME_BANCO = "Recibos_Historico.sqlite3"
+PASTA_PDFS = "Recibos_Gerados"
+
+
+class ResultadoBackup:
+    def __init__(self, snapshot, arquivos, reaproveitados, blocos_novos, bytes_novos, bytes_total, segundos):
+        self.snapshot = snapshot
+        self.arquivos = arquivos
+        self.reaproveitados = reaproveitados
+        self.blocos_novos = blocos_novos
+        self.bytes_novos = bytes_novos
+        self.bytes_total = bytes_total
+        self.segundos = segundos
+
+    def resumo(self):
+        return (f"backup {self.snapshot}: {self.arquivos} arquivo(s) ({self.reaproveitados} sem alteração), "
+                f"{self.bytes_total / 1e6:.1f} MB descritos, {self.blocos_novos} bloco(s) novo(s) "
+                f"({self.bytes_novos / 1e6:.1f} MB gravados) em {self.segundos:.1f} s")
+
+
+class RepositorioBackup:
+    """ Pasta de backups: blocos deduplicados por conteúdo e um manifesto por snapshot """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.pasta_blocos = os.path.join(pasta, "blocos")
+        self.pasta_snapshots = os.path.join(pasta, "snapshots")
+
+    # --- Blocos ---
+
+    def _caminho_bloco(self, resumo):
+        return os.path.join(self.pasta_blocos, resumo[:2], resumo)
+
+    def _gravar_blocos(self, arquivo, tamanho_bloco, estatisticas):
+        """ Divide o arquivo aberto em blocos, grava os ainda inexistentes e retorna os resumos (sha256) """
+        resumos = []
+        while True:
+            bloco = arquivo.read(tamanho_bloco)
+            if not bloco:
+                return resumos
+            resumo = hashlib.sha256(bloco).hexdigest()
+            caminho = self._caminho_bloco(resumo)
+            if not os.path.exists(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                gravar_arquivo(caminho, bloco)
+                estatisticas["blocos_novos"] += 1
+                estatisticas["bytes_novos"] += len(bloco)
+            resumos.append(resumo)
+
+    def _ler_bloco(self, resumo):
+        with open(self._caminho_bloco(resumo), "rb") as arquivo:
+            bloco = arquivo.read()
+        if hashlib.sha256(bloco).hexdigest() != resumo:
+            raise ValueError(f"Bloco {resumo} do backup está danificado.")
+        return bloco
+
+    # --- Snapshots ---
+
+    def listar(self):
+        """ ids dos snapshots, do mais antigo para o mais recente """
+        if not os.path.isdir(self.pasta_snapshots):
+            return []
+        return sorted(nome[:-len(".json")] for nome in os.listdir(self.pasta_snapshots) if nome.endswith(".json"))
+
+    def manifesto(self, snapshot):
+        with open(os.path.join(self.pasta_snapshots, snapshot + ".json"), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+
+    def escolher(self, ate=None):
+        """ Snapshot mais recente feito até a data/hora dada ("aaaa-mm-dd", "aaaa-mm-dd hh:mm" ou um id);
+        sem data, o mais recente. Levanta LookupError se não houver """
+        snapshots = self.listar()
+        if ate:
+            chave = "".join(c for c in ate if c.isdigit())
+            snapshots = [s for s in snapshots if "".join(c for c in s if c.isdigit())[:len(chave)] <= chave]
+        if not snapshots:
+            raise LookupError(f"Nenhum backup encontrado em {self.pasta}" + (f" até {ate}" if ate else "") + ".")
+        return snapshots[-1]
+
+    def _novo_id(self):
+        base = datetime.now().strftime("%Y%m%d-%H%M%S")
+        snapshot, sequencia = base, 1
+        while os.path.exists(os.path.join(self.pasta_snapshots, snapshot + ".json")):
+            sequencia += 1
+            snapshot = f"{base}-{sequencia}"
+        return snapshot
+
+    # --- Backup e restauração ---
+
+    def _incluir_pasta(self, pasta, prefixo, anterior, arquivos, estatisticas):
+        """ Acrescenta os arquivos da pasta a arquivos ("<prefixo>/<caminho relativo>"), reaproveitando
+        do manifesto anterior os que não mudaram. Retorna quantos foram reaproveitados """
+        reaproveitados = 0
+        for raiz, _, nomes in os.walk(pasta):
+            for nome in sorted(nomes):
+                if nome.startswith("."):
+                    continue   # temporários de gravações em andamento (arquivos.gravacao_atomica)
+                caminho = os.path.join(raiz, nome)
+                relativo = "/".join([prefixo] + os.path.relpath(caminho, pasta).split(os.sep))
+                info = os.stat(caminho)
+                antigo = anterior.get(relativo)
+                if antigo and antigo["tamanho"] == info.st_size and antigo["modificado_ns"] == info.st_mtime_ns:
+                    arquivos[relativo] = antigo
+                    reaproveitados += 1
+                    continue
+                with open(caminho, "rb") as arquivo:
+                    blocos = self._gravar_blocos(arquivo, TAMANHO_BLOCO_ARQUIVO, estatisticas)
+                arquivos[relativo] = {"tamanho": info.st_size, "modificado_ns": info.st_mtime_ns, "blocos": blocos}
+        return reaproveitados
+
+    def criar(self, armazenamento, pasta_pdfs=None):
+        """ Novo snapshot do banco (armazenamento local), das suas partições arquivadas e dos PDFs de
+        pasta_pdfs. Retorna ResultadoBackup """
+        inicio = time.perf_counter()
+        os.makedirs(self.pasta_snapshots, exist_ok=True)
+        anteriores = self.listar()
+        anterior = self.manifesto(anteriores[-1])["arquivos"] if anteriores else {}
+        estatisticas = {"blocos_novos": 0, "bytes_novos": 0}
+        arquivos, reaproveitados = {}, 0
+
+        # Banco: cópia consistente (outras estações podem continuar gravando durante o backup)
+        descritor, copia = tempfile.mkstemp(suffix=".sqlite3", dir=self.pasta)
+        os.close(descritor)
+        try:
+            armazenamento.copiar_banco(copia)
+            with open(copia, "rb") as arquivo:
+                arquivos[NOME_BANCO] = {"tamanho": os.path.getsize(copia),
+                                        "blocos": self._gravar_blocos(arquivo, TAMANHO_BLOCO_BANCO, estatisticas)}
+        finally:
+            os.remove(copia)
+
+        # Partições depois da cópia do banco: as que ela referencia já existem (e só são apagadas
+        # quando um arquivamento posterior as substitui)
+        if os.path.isdir(armazenamento.particoes.pasta):
+            reaproveitados += self._incluir_pasta(armazenamento.particoes.pasta, PASTA_PARTICOES, anterior,
+                                                  arquivos, estatisticas)
+        if pasta_pdfs and os.path.isdir(pasta_pdfs):
+            reaproveitados += self._incluir_pasta(pasta_pdfs, PASTA_PDFS, anterior, arquivos, estatisticas)
+
+        snapshot = self._novo_id()
+        manifesto = {"snapshot": snapshot, "criado_em": datetime.now().isoformat(timespec="seconds"),
+                     "arquivos": arquivos}
+        gravar_arquivo(os.path.join(self.pasta_snapshots, snapshot + ".json"),
+                       json.dumps(manifesto, ensure_ascii=False).encode("utf-8"))
+        resultado = ResultadoBackup(snapshot, len(arquivos), reaproveitados, estatisticas["blocos_novos"],
+                                    estatisticas["bytes_novos"], sum(a["tamanho"] for a in arquivos.values()),
+                                    time.perf_counter() - inicio)
+        print(f"Backup: {resultado.resumo()}", file=sys.stderr)
+        return resultado
+
+    def restaurar(self, pasta_saida, snapshot=None):
+        """ Recria em pasta_saida o banco, as partições e os PDFs do snapshot (padrão: o mais recente), conferindo o
+        resumo de cada bloco. Não mexe no banco em uso: feche o aplicativo e copie os arquivos de volta.
+        Retorna a lista de arquivos gravados """
+        snapshot = snapshot or self.escolher()
+        gravados = []
+        for relativo, info in self.manifesto(snapshot)["arquivos"].items():
+            destino = os.path.join(pasta_saida, *relativo.split("/"))
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            with gravacao_atomica(destino) as temporario, open(temporario, "wb") as arquivo:
+                for resumo in info["blocos"]:
+                    arquivo.write(self._ler_bloco(resumo))
+            gravados.append(destino)
+        print(f"Backup {snapshot}: {len(gravados)} arquivo(s) restaurado(s) em {pasta_saida}", file=sys.stderr)
+        return gravados
@@ -0,0 +1,65 @@
+"""
+Mede o backup incremental: o primeiro backup (tudo é novo) contra os seguintes, depois de
+editar alguns recibos e gerar alguns PDFs, e a restauração do último.
+
+Uso: python benchmarks/bench_backup.py [recibos] [pdfs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import ArmazenamentoSQLite
+from backup import RepositorioBackup
+
+
+def _recibo(i):
+    return {"Nome_Cliente": f"Cliente {i}", "Placa_Veiculo": f"ABC{i % 10}D{i % 100:02d}",
+            "Data_Recibo": f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/2024", "Valor_Total_Final": 100.0 + i,
+            "Itens_Recibo": [{"tipo": "Serviço", "codigo": "S1", "descricao": "Alinhamento e balanceamento",
+                              "valor": 80.0, "quantia": 1, "desc": 0.0, "valor_total": 80.0}]}
+
+
+def _gerar_pdfs(pasta, inicio, quantidade):
+    for i in range(inicio, inicio + quantidade):
+        with open(os.path.join(pasta, f"Recibo_{i:06d}.pdf"), "wb") as arquivo:
+            arquivo.write(os.urandom(150 * 1024))   # tamanho típico de um recibo com logo
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    pdfs = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = ArmazenamentoSQLite(os.path.join(pasta, "recibos.sqlite3"))
+        for i in range(quantidade):
+            banco.salvar(_recibo(i), novo=True)
+        pasta_pdfs = os.path.join(pasta, "Recibos_Gerados")
+        os.makedirs(pasta_pdfs)
+        _gerar_pdfs(pasta_pdfs, 0, pdfs)
+        repositorio = RepositorioBackup(os.path.join(pasta, "Backups"))
+
+        resultados = [("primeiro backup", repositorio.criar(banco, pasta_pdfs))]
+        resultados.append(("sem alterações", repositorio.criar(banco, pasta_pdfs)))
+        # Um dia de trabalho: alguns recibos novos e editados, com seus PDFs
+        for i in range(30):
+            banco.salvar(_recibo(quantidade + i), novo=True)
+            editado = banco.obter(f"{i * 97 + 1:06d}")
+            banco.salvar(dict(editado, Nome_Cliente="Editado"))
+        _gerar_pdfs(pasta_pdfs, pdfs, 30)
+        resultados.append(("após um dia de trabalho", repositorio.criar(banco, pasta_pdfs)))
+
+        inicio = time.perf_counter()
+        repositorio.restaurar(os.path.join(pasta, "Restaurado"))
+        restauracao_s = time.perf_counter() - inicio
+        banco.fechar()
+
+    for nome, resultado in resultados:
+        print(f"{nome + ':':26s}{resultado.segundos:8.2f} s  {resultado.bytes_novos / 1e6:8.1f} MB gravados "
+              f"de {resultado.bytes_total / 1e6:.1f} MB")
+    print(f"{'restauração:':26s}{restauracao_s:8.2f} s")
+
+
+if __name__ == "__main__":
+    main()
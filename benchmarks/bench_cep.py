@@ -0,0 +1,138 @@
+"""
+Mede a consulta de CEP com cache contra um servidor local que imita a ViaCEP
+(com atraso de rede simulado), inclusive com o servidor desligado (offline), e confere o
+comportamento do cache: validade (TTL), descarte dos menos usados (LRU), entrada expirada usada
+offline e semeadura pelo histórico. Termina com código 1 se algum resultado estiver errado.
+
+Uso: python benchmarks/bench_cep.py [atraso_ms]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import ArmazenamentoSQLite
+from cep import CacheCEP, ConsultaCEP, ErroConsultaCEP
+
+ATRASO_SEGUNDOS = 0.05
+REQUISICOES = []   # CEPs pedidos ao servidor local, para conferir quando a consulta foi à rede
+
+
+class ViaCEPLocal(BaseHTTPRequestHandler):
+    """ Responde /ws/<cep>/json/ como a ViaCEP; CEPs terminados em 999 não existem """
+
+    def do_GET(self):
+        time.sleep(ATRASO_SEGUNDOS)
+        cep = self.path.strip("/").split("/")[1]
+        REQUISICOES.append(cep)
+        if cep.endswith("999"):
+            corpo = {"erro": True}
+        else:
+            corpo = {"cep": cep, "logradouro": f"Rua {cep}", "bairro": "Centro", "localidade": "Rio de Janeiro", "uf": "RJ"}
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+def _medir_us(funcao, repeticoes=1):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) * 1e6 / repeticoes, resultado
+
+
+def _conferir_lru(pasta):
+    """ Com o cache cheio sai o CEP usado há mais tempo (também do disco), não o mais antigo gravado """
+    caminho = os.path.join(pasta, "cache_lru.sqlite3")
+    cache = CacheCEP(caminho, max_entradas=2)
+    cache.gravar("00000001", {"logradouro": "Rua A"})
+    cache.gravar("00000002", {"logradouro": "Rua B"})
+    cache.obter("00000001")
+    cache.gravar("00000003", {"logradouro": "Rua C"})
+    presentes = [cep for cep in ("00000001", "00000002", "00000003") if cache.obter(cep) is not None]
+    cache.fechar()
+    cache = CacheCEP(caminho, max_entradas=2)
+    reaberto = [cep for cep in ("00000001", "00000002", "00000003") if cache.obter(cep) is not None]
+    cache.fechar()
+    return presentes == reaberto == ["00000001", "00000003"]
+
+
+def main():
+    global ATRASO_SEGUNDOS
+    ATRASO_SEGUNDOS = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), ViaCEPLocal)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/ws/{{cep}}/json/"
+
+    with tempfile.TemporaryDirectory() as pasta:
+        armazenamento = ArmazenamentoSQLite(os.path.join(pasta, "recibos.sqlite3"))
+        armazenamento.salvar({"Nome_Cliente": "Cliente", "CEP_Cliente": "21540-500",
+                              "Rua_Cliente": "Estrada do Barro Vermelho", "Bairro_Cliente": "Rocha Miranda",
+                              "Cidade_Cliente": "Rio de Janeiro", "UF_Cliente": "RJ"}, novo=True)
+        cache = CacheCEP(os.path.join(pasta, "cache_cep.sqlite3"))
+        cache.semear(armazenamento)
+        consulta = ConsultaCEP(cache, url=url)
+
+        falhas = []
+        rede_us, _ = _medir_us(lambda: consulta.consultar("20000-001"))
+        cache_us, repetida = _medir_us(lambda: consulta.consultar("20000-001"), 10000)
+        if REQUISICOES != ["20000001"] or repetida["logradouro"] != "Rua 20000001":
+            falhas.append(f"consulta repetida foi à rede ou mudou: {REQUISICOES}, {repetida}")
+        semeado_us, endereco = _medir_us(lambda: consulta.consultar("21540500"), 10000)
+        if "21540500" in REQUISICOES or endereco["logradouro"] != "Estrada do Barro Vermelho":
+            falhas.append(f"CEP do histórico não veio da semeadura: {endereco}")
+        inexistente = consulta.consultar("20000-999")
+        if inexistente is not None:
+            falhas.append(f"CEP inexistente retornou {inexistente}")
+
+        # Validade: entrada vencida volta à rede (e é regravada) enquanto o servidor responde
+        cache.validade_segundos = 0
+        time.sleep(0.01)
+        requisicoes = len(REQUISICOES)
+        consulta.consultar("20000-001")
+        if len(REQUISICOES) != requisicoes + 1:
+            falhas.append("entrada expirada não foi consultada de novo na rede")
+
+        servidor.shutdown()
+        servidor.server_close()
+        time.sleep(0.01)   # tudo expirado: sem rede, deve cair no cache antigo
+        try:
+            offline_us, offline = _medir_us(lambda: consulta.consultar("20000-001"))
+        except ErroConsultaCEP:
+            offline_us, offline = 0.0, None
+        if offline is None or offline["logradouro"] != "Rua 20000001":
+            falhas.append(f"offline, entrada expirada não foi usada: {offline}")
+        try:
+            consulta.consultar("30000-001")
+            falhas.append("offline, CEP fora do cache não levantou ErroConsultaCEP")
+        except ErroConsultaCEP:
+            pass
+        if not _conferir_lru(pasta):
+            falhas.append("LRU: o CEP descartado não foi o usado há mais tempo")
+        consulta.fechar()
+        armazenamento.fechar()
+
+    print(f"Primeira consulta (rede, {ATRASO_SEGUNDOS * 1000:.0f} ms de atraso): {rede_us:10.1f} us")
+    print(f"Consulta repetida (cache):                {cache_us:10.1f} us")
+    print(f"CEP semeado do histórico:                 {semeado_us:10.1f} us  {endereco['logradouro']}")
+    print(f"CEP inexistente:                          {inexistente}")
+    print(f"Offline, entrada expirada:                {offline_us:10.1f} us  {offline and offline['logradouro']}")
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    print("Comportamento do cache: " + ("ERRADO" if falhas else "ok (TTL, LRU, offline, semeadura)"))
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
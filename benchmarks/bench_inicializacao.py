@@ -0,0 +1,72 @@
+"""
+Mede o tempo de inicialização do armazenamento com um histórico grande.
+
+Meta: com 100.000 recibos, abrir o banco, calcular o próximo número e carregar
+a primeira página de recibos recentes deve levar menos de 200 ms no total.
+
+Uso: python benchmarks/bench_inicializacao.py [quantidade_de_recibos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import ArmazenamentoSQLite, COLUNAS_RECIBO
+
+META_INICIALIZACAO_MS = 200
+
+
+def _popular(caminho_banco, quantidade):
+    armazenamento = ArmazenamentoSQLite(caminho_banco)
+    colunas = ", ".join(f'"{col}"' for col in COLUNAS_RECIBO)
+    marcadores = ", ".join("?" for _ in COLUNAS_RECIBO)
+    linhas = []
+    for i in range(1, quantidade + 1):
+        dados = {col: "" for col in COLUNAS_RECIBO}
+        dados.update({
+            "Numero_Recibo": str(i).zfill(6),
+            "Data_Recibo": f"{(i % 28) + 1:02d}/{(i % 12) + 1:02d}/2024",
+            "Nome_Cliente": f"Cliente {i % 5000}",
+            "Placa_Veiculo": f"ABC{i % 10}D{i % 100:02d}",
+            "Total_Itens": 150.0,
+            "Valor_Total_Final": 150.0,
+        })
+        linhas.append([dados[col] for col in COLUNAS_RECIBO])
+    with armazenamento._transacao() as cur:
+        cur.executemany(f"INSERT INTO recibos ({colunas}) VALUES ({marcadores})", linhas)
+        armazenamento._preencher_colunas_normalizadas(cur)
+        armazenamento._ajustar_sequencia(cur)
+    armazenamento.fechar()
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_banco = os.path.join(pasta, "bench.sqlite3")
+        _popular(caminho_banco, quantidade)
+
+        inicio = time.perf_counter()
+        armazenamento = ArmazenamentoSQLite(caminho_banco)
+        t_abrir = time.perf_counter()
+        proximo = armazenamento.proximo_numero()
+        t_numero = time.perf_counter()
+        pagina = armazenamento.listar_recentes(50)
+        t_pagina = time.perf_counter()
+        armazenamento.obter(str(quantidade // 2))
+        t_busca = time.perf_counter()
+        armazenamento.fechar()
+
+        total_ms = (t_pagina - inicio) * 1000
+        print(f"Recibos no histórico:     {quantidade}")
+        print(f"Abrir banco:              {(t_abrir - inicio) * 1000:8.2f} ms")
+        print(f"Próximo número ({proximo}): {(t_numero - t_abrir) * 1000:8.2f} ms")
+        print(f"Primeira página ({len(pagina)}):    {(t_pagina - t_numero) * 1000:8.2f} ms")
+        print(f"Busca por número:         {(t_busca - t_pagina) * 1000:8.2f} ms")
+        print(f"Inicialização total:      {total_ms:8.2f} ms (meta: < {META_INICIALIZACAO_MS} ms)")
+        return 0 if total_ms < META_INICIALIZACAO_MS else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
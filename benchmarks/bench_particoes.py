@@ -0,0 +1,89 @@
+"""
+Mede as consultas do dia a dia com o histórico todo no banco e depois de arquivar os anos
+fechados em partições Parquet, e as consultas que precisam abrir as partições.
+
+Uso: python benchmarks/bench_particoes.py [anos] [recibos_por_ano]   (requer pyarrow)
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from armazenamento import ArmazenamentoSQLite
+
+
+def _recibo(i, ano, por_ano):
+    dia = i % por_ano * 365 // por_ano
+    data = date.fromordinal(date(ano, 1, 1).toordinal() + min(dia, 364))
+    return {"Nome_Cliente": f"Cliente {i % 3000}", "Placa_Veiculo": f"ABC{i % 10}D{i % 100:02d}",
+            "CPF_CNPJ_Cliente": f"{i % 3000:011d}", "Data_Recibo": data.strftime("%d/%m/%Y"),
+            "Marca_Veiculo": "Fiat", "Modelo_Veiculo": ["Uno", "Palio", "Siena"][i % 3],
+            "Valor_Total_Final": 100.0 + i % 500, "Observacoes_Gerais": "cliente antigo" if i % 7 == 0 else "",
+            "Itens_Recibo": [{"tipo": "Peça", "codigo": f"P{i % 300}", "descricao": "Pastilha de freio",
+                              "valor": 90.0, "quantia": 1, "desc": 0.0, "valor_total": 90.0},
+                             {"tipo": "Serviço", "codigo": "S1", "descricao": "Alinhamento",
+                              "valor": 80.0, "quantia": 1, "desc": 0.0, "valor_total": 80.0}]}
+
+
+def _medir_ms(funcao, repeticoes=20):
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) * 1000 / repeticoes
+
+
+def _medicoes(banco, ano_atual):
+    return {
+        "histórico, 1ª página por número": _medir_ms(lambda: banco.listar_pagina("numero", limite=200)),
+        "histórico, 1ª página por data": _medir_ms(lambda: banco.listar_pagina("data", limite=200)),
+        "histórico, 1ª página por nome": _medir_ms(lambda: banco.listar_pagina("nome", False, limite=200)),
+        "recibos recentes (50)": _medir_ms(lambda: banco.listar_recentes(50)),
+        "buscar placa (200)": _medir_ms(lambda: banco.buscar("placa", "ABC1D01")),
+        "buscar número do ano": _medir_ms(lambda: banco.buscar("numero", banco.proximo_numero() - 1)),
+        "contar recibos": _medir_ms(lambda: banco.contar()),
+        "relatório do mês corrente": _medir_ms(lambda: banco.dados_relatorio(f"{ano_atual}-03-01", f"{ano_atual}-03-31")),
+        "lote do ano corrente": _medir_ms(lambda: banco.listar_numeros(f"{ano_atual}-01-01", f"{ano_atual}-12-31")),
+        "obter recibo antigo": _medir_ms(lambda: banco.obter("000010")),
+        "buscar texto 'palio antigo'": _medir_ms(lambda: banco.buscar("texto", "palio antigo"), 5),
+        "relatório de todo o histórico": _medir_ms(lambda: banco.dados_relatorio(), 3),
+    }
+
+
+def main():
+    anos = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    por_ano = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    ano_atual = date.today().year
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "recibos.sqlite3")
+        banco = ArmazenamentoSQLite(caminho)
+        i = 0
+        for ano in range(ano_atual - anos + 1, ano_atual + 1):
+            for _ in range(por_ano):
+                banco.salvar(_recibo(i, ano, por_ano), novo=True)
+                i += 1
+        banco.conexao.execute("VACUUM")
+        antes = _medicoes(banco, ano_atual)
+        tamanho_antes = os.path.getsize(caminho)
+
+        inicio = time.perf_counter()
+        banco.arquivar()
+        arquivamento_s = time.perf_counter() - inicio
+        banco.conexao.execute("VACUUM")
+        depois = _medicoes(banco, ano_atual)
+        tamanho_depois = os.path.getsize(caminho)
+        particoes = sum(particao["bytes"] for particao in banco.listar_particoes())
+        banco.fechar()
+
+    print(f"{anos} anos x {por_ano} recibos; arquivamento em {arquivamento_s:.1f} s")
+    print(f"banco: {tamanho_antes / 1e6:.1f} MB -> {tamanho_depois / 1e6:.1f} MB + partições {particoes / 1e6:.1f} MB")
+    print(f"{'':34s}{'tudo no banco':>14s}{'arquivado':>12s}")
+    for nome, ms in antes.items():
+        print(f"{nome + ':':34s}{ms:11.2f} ms{depois[nome]:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
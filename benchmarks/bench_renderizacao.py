@@ -0,0 +1,54 @@
+"""
+Compara a primeira renderização de um recibo (sem cache) com as seguintes,
+que reaproveitam logo, template compilado, CSS interpretado e fontes.
+
+Uso: python benchmarks/bench_renderizacao.py [repeticoes]
+(executar na pasta do aplicativo, onde estão resources/recibo_template.html e o logo)
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderizacao import RenderizadorRecibo
+
+RECIBO_EXEMPLO = {
+    "Numero_Recibo": "000123", "Data_Recibo": "15/03/2024", "Hora_Recibo": "10:30:00",
+    "Nome_Cliente": "Cliente de Teste", "Placa_Veiculo": "ABC1D23", "Modelo_Veiculo": "Gol",
+    "KM_Entrada_Veiculo": 123456, "Total_Itens": 350.0, "Valor_Total_Final": 350.0,
+    "Itens_Recibo": [
+        {"tipo": "Peça", "codigo": f"P{i}", "descricao": f"Peça {i}", "uni": "un",
+         "valor": 25.0, "quantia": 2, "desc": 0.0, "valor_total": 50.0}
+        for i in range(7)
+    ],
+}
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    pasta_app = os.path.abspath(".")
+    renderizador = RenderizadorRecibo(
+        os.path.join(pasta_app, "resources"), {"nome": "Oficina"},
+        caminhos_logo=[os.path.join(pasta_app, "logo.png"), os.path.join(pasta_app, "resources", "logo.png")]
+    )
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_pdf = os.path.join(pasta, "recibo.pdf")
+
+        inicio = time.perf_counter()
+        renderizador.gerar_pdf(RECIBO_EXEMPLO, caminho_pdf, "15/03/2024", "10:30:00")
+        primeira_ms = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            renderizador.gerar_pdf(RECIBO_EXEMPLO, caminho_pdf, "15/03/2024", "10:30:00")
+        seguintes_ms = (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    print(f"Primeira renderização:         {primeira_ms:8.1f} ms")
+    print(f"Renderizações com cache (média): {seguintes_ms:8.1f} ms  ({repeticoes} repetições)")
+    print(f"Ganho:                          {primeira_ms / seguintes_ms:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
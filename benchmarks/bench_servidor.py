@@ -0,0 +1,80 @@
+"""
+Mede o servidor de recibos localmente: chamadas pela sessão com keep-alive contra uma conexão
+nova por chamada, várias estações simultâneas e conflito de versão entre elas.
+
+Uso: python benchmarks/bench_servidor.py [recibos]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import nucleo
+from armazenamento import ArmazenamentoSQLite, ConflitoVersao
+from armazenamento_http import ArmazenamentoHTTP
+from servidor import iniciar_servidor
+
+
+def _recibo(i):
+    return {"Nome_Cliente": f"Cliente {i}", "Placa_Veiculo": f"ABC{i % 10}D{i % 100:02d}",
+            "Data_Recibo": "15/03/2024", "Valor_Total_Final": 100.0 + i,
+            "Itens_Recibo": [{"tipo": "Serviço", "codigo": "S1", "descricao": "Alinhamento",
+                              "valor": 80.0, "quantia": 1, "desc": 0.0, "valor_total": 80.0}]}
+
+
+def _medir_us(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) * 1e6 / repeticoes
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = ArmazenamentoSQLite(os.path.join(pasta, "recibos.sqlite3"))
+        for i in range(quantidade):
+            banco.salvar(_recibo(i), novo=True)
+        servidor = iniciar_servidor(banco, nucleo.criar_renderizador(local=True), porta=0, processos=1,
+                                    em_segundo_plano=True)
+        cliente = ArmazenamentoHTTP(servidor.url)
+
+        keep_alive_us = _medir_us(lambda: cliente.obter("000010"), 500)
+        corpo = {"args": ["000010"], "kwargs": {}}
+        nova_conexao_us = _medir_us(lambda: requests.post(servidor.url + "/api/obter", json=corpo).json(), 500)
+        busca_us = _medir_us(lambda: cliente.buscar("texto", "alinhamento", limite=20), 200)
+
+        # 8 estações gravando ao mesmo tempo pelo mesmo servidor
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as estacoes:
+            numeros = list(estacoes.map(lambda i: cliente.salvar(_recibo(i), novo=True)[0], range(400)))
+        gravacoes_por_s = len(numeros) / (time.perf_counter() - inicio)
+
+        # Duas estações editando o mesmo recibo: a segunda recebe o conflito
+        lido = cliente.obter(numeros[0])
+        cliente.salvar(dict(lido, Nome_Cliente="Estação 1"), versao=lido["versao"])
+        try:
+            cliente.salvar(dict(lido, Nome_Cliente="Estação 2"), versao=lido["versao"])
+            conflito = "NÃO detectado"
+        except ConflitoVersao as e:
+            conflito = f"detectado ({e})"
+
+        cliente.fechar()
+        servidor.shutdown()
+        servidor.server_close()
+        banco.fechar()
+
+    print(f"obter, sessão keep-alive:        {keep_alive_us:10.1f} us")
+    print(f"obter, conexão nova por chamada: {nova_conexao_us:10.1f} us")
+    print(f"buscar texto (20 recibos):       {busca_us:10.1f} us")
+    print(f"salvar, 8 estações simultâneas:  {gravacoes_por_s:10.1f} recibos/s")
+    print(f"Conflito de versão:              {conflito}")
+
+
+if __name__ == "__main__":
+    main()
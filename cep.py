@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# --- Consulta de CEP ---
+# Endereços consultados na ViaCEP ficam em um cache local (SQLite) com validade (TTL)
+# e descarte dos menos usados (LRU). O cache é semeado com os endereços já digitados
+# no histórico de recibos, então CEPs conhecidos respondem sem rede, inclusive offline.
+
+# Pode ser trocada (ex.: por um servidor local de testes) pela variável de ambiente RECIBOS_URL_VIACEP
+URL_VIACEP = os.environ.get("RECIBOS_URL_VIACEP", "https://viacep.com.br/ws/{cep}/json/")
+
+CAMPOS_ENDERECO = ["logradouro", "bairro", "localidade", "uf"]
+
+
+def normalizar_cep(cep):
+    """ CEP só com os 8 dígitos, ou None se não tiver 8 dígitos """
+    cep = "".join(c for c in str(cep or "") if c.isdigit())
+    return cep if len(cep) == 8 else None
+
+
+class ErroConsultaCEP(Exception):
+    """ ViaCEP inacessível e CEP ausente do cache """
+
+
+class CacheCEP:
+    """ Cache CEP -> endereço persistido em disco.
+
+    As entradas ficam também em memória (OrderedDict na ordem de uso), então uma consulta ao
+    cache não toca o disco. O último acesso é gravado junto com as próximas escritas e ao fechar. """
+
+    def __init__(self, caminho_banco, max_entradas=20000, validade_dias=180):
+        self.caminho_banco = caminho_banco
+        self.max_entradas = max_entradas
+        self.validade_segundos = validade_dias * 86400
+        self._trava = threading.RLock()
+        self.conexao = sqlite3.connect(caminho_banco, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS cache_cep ("
+            "cep TEXT PRIMARY KEY, logradouro TEXT, bairro TEXT, localidade TEXT, uf TEXT, "
+            "origem TEXT, gravado_em REAL NOT NULL, acessado_em REAL NOT NULL)"
+        )
+        self.conexao.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT)")
+        self._entradas = OrderedDict()   # cep -> (endereco, gravado_em)
+        self._acessos = {}               # cep -> acessado_em ainda não gravado
+        rows = self.conexao.execute(
+            "SELECT cep, logradouro, bairro, localidade, uf, gravado_em FROM cache_cep ORDER BY acessado_em"
+        ).fetchall()
+        for cep, logradouro, bairro, localidade, uf, gravado_em in rows:
+            self._entradas[cep] = (dict(zip(CAMPOS_ENDERECO, (logradouro, bairro, localidade, uf))), gravado_em)
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obter(self, cep, aceitar_expirado=False):
+        """ Endereço em cache para o CEP, ou None se ausente (ou expirado, salvo com aceitar_expirado) """
+        with self._trava:
+            entrada = self._entradas.get(cep)
+            if entrada is None:
+                return None
+            endereco, gravado_em = entrada
+            agora = time.time()
+            if not aceitar_expirado and agora - gravado_em > self.validade_segundos:
+                return None
+            self._entradas.move_to_end(cep)
+            self._acessos[cep] = agora
+            return dict(endereco)
+
+    def gravar(self, cep, endereco, origem="viacep"):
+        self.gravar_varios({cep: endereco}, origem)
+
+    def gravar_varios(self, enderecos, origem="viacep", substituir=True):
+        """ Grava vários CEPs em uma transação. Com substituir=False mantém os já existentes """
+        with self._trava:
+            agora = time.time()
+            linhas = []
+            for cep, endereco in enderecos.items():
+                if not substituir and cep in self._entradas:
+                    continue
+                endereco = {campo: endereco.get(campo) or "" for campo in CAMPOS_ENDERECO}
+                self._entradas[cep] = (endereco, agora)
+                self._entradas.move_to_end(cep)
+                self._acessos.pop(cep, None)
+                linhas.append((cep, *(endereco[campo] for campo in CAMPOS_ENDERECO), origem, agora, agora))
+            descartados = []
+            while len(self._entradas) > self.max_entradas:
+                cep, _ = self._entradas.popitem(last=False)
+                self._acessos.pop(cep, None)
+                descartados.append((cep,))
+
+            self.conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self.conexao.executemany(
+                    "INSERT OR REPLACE INTO cache_cep (cep, logradouro, bairro, localidade, uf, origem, gravado_em, acessado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+                self.conexao.executemany("DELETE FROM cache_cep WHERE cep = ?", descartados)
+                self._gravar_acessos()
+            except BaseException:
+                self.conexao.execute("ROLLBACK")
+                raise
+            self.conexao.execute("COMMIT")
+            return len(linhas)
+
+    def _gravar_acessos(self):
+        self.conexao.executemany("UPDATE cache_cep SET acessado_em = ? WHERE cep = ?",
+                                 [(acessado_em, cep) for cep, acessado_em in self._acessos.items()])
+        self._acessos.clear()
+
+    def semear(self, armazenamento):
+        """ Preenche o cache, uma única vez, com os endereços já registrados no histórico de recibos """
+        with self._trava:
+            if self.conexao.execute("SELECT 1 FROM meta WHERE chave = 'semeado_historico'").fetchone():
+                return 0
+            incluidos = self.gravar_varios(armazenamento.enderecos_por_cep(), origem="historico", substituir=False)
+            self.conexao.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('semeado_historico', ?)",
+                                 (str(time.time()),))
+            print(f"Cache de CEP: {incluidos} endereços importados do histórico", file=sys.stderr)
+            return incluidos
+
+    def fechar(self):
+        with self._trava:
+            if self._acessos:
+                self.conexao.execute("BEGIN IMMEDIATE")
+                self._gravar_acessos()
+                self.conexao.execute("COMMIT")
+            self.conexao.close()
+
+
+class ConsultaCEP:
+    """ Consulta de CEP: primeiro o cache, depois a base offline (se instalada) e por fim a ViaCEP;
+    sem rede, usa até entradas expiradas do cache.
+
+    Pode ser chamada de várias threads: as requisições reaproveitam conexões (keep-alive) de uma
+    única sessão HTTP, e consultas simultâneas ao mesmo CEP esperam a mesma requisição. """
+
+    def __init__(self, cache, url=URL_VIACEP, timeout=5, base_offline=None):
+        self.cache = cache
+        self.base_offline = base_offline
+        self.url = url
+        self.timeout = timeout
+        self._sessao = None
+        self._trava = threading.Lock()
+        self._em_andamento = {}   # cep -> Future da requisição em curso
+
+    def _sessao_http(self):
+        with self._trava:
+            if self._sessao is None:
+                import requests  # Adiado: só carrega quando um CEP precisa ir à rede
+                from requests.adapters import HTTPAdapter
+
+                sessao = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+                sessao.mount("https://", adaptador)
+                sessao.mount("http://", adaptador)
+                self._sessao = sessao
+            return self._sessao
+
+    def consultar(self, cep):
+        """ Endereço do CEP (chaves de CAMPOS_ENDERECO) ou None se a ViaCEP não o conhece.
+        Levanta ErroConsultaCEP se a ViaCEP estiver inacessível e o CEP não estiver em cache """
+        cep = normalizar_cep(cep)
+        if cep is None:
+            raise ValueError("CEP deve conter 8 dígitos numéricos.")
+        endereco = self.consultar_local(cep)
+        if endereco is not None:
+            return endereco
+
+        with self._trava:
+            futuro = self._em_andamento.get(cep)
+            primeiro = futuro is None
+            if primeiro:
+                futuro = self._em_andamento[cep] = Future()
+        if not primeiro:
+            # Mesmo CEP já sendo consultado por outra thread: aguarda o mesmo resultado
+            return futuro.result()
+        try:
+            futuro.set_result(self._consultar_viacep(cep))
+        except BaseException as e:
+            futuro.set_exception(e)
+        finally:
+            with self._trava:
+                del self._em_andamento[cep]
+        return futuro.result()
+
+    def consultar_local(self, cep):
+        """ Endereço vindo do cache ou da base offline, sem acessar a rede (None se não houver) """
+        endereco = self.cache.obter(cep)
+        if endereco is None and self.base_offline is not None:
+            endereco = self.base_offline.obter(cep)
+        return endereco
+
+    def _consultar_viacep(self, cep):
+        sessao = self._sessao_http()
+        import requests
+
+        try:
+            response = sessao.get(self.url.format(cep=cep), timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            endereco = self.cache.obter(cep, aceitar_expirado=True)
+            if endereco is not None:
+                print(f"ViaCEP indisponível ({e}); usando endereço em cache para {cep}", file=sys.stderr)
+                return endereco
+            raise ErroConsultaCEP(str(e)) from e
+        print(f"DEBUG: Resposta da ViaCEP: {data}", file=sys.stderr)
+
+        if "erro" in data:
+            return None
+        endereco = {campo: data.get(campo, "") or "" for campo in CAMPOS_ENDERECO}
+        self.cache.gravar(cep, endereco)
+        return endereco
+
+    def fechar(self):
+        if self._sessao is not None:
+            self._sessao.close()
+        if self.base_offline is not None:
+            self.base_offline.fechar()
+        self.cache.fechar()
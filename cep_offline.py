@@ -0,0 +1,135 @@
+import csv
+import mmap
+import struct
+import sys
+
+from arquivos import gravacao_atomica
+
+# --- Base de CEPs Offline ---
+# Arquivo binário ordenado por CEP, aberto com mmap: só as páginas tocadas pela busca
+# são lidas do disco, e nada é carregado na memória ao abrir.
+#
+# Formato (inteiros little-endian):
+#   cabeçalho   MAGICO (8 bytes), quantidade de registros (uint32)
+#   índice      1001 uint32: posição do primeiro registro de cada prefixo de 3 dígitos (000-999),
+#               mais o total no fim; os CEPs do prefixo p estão em [indice[p], indice[p + 1])
+#   registros   quantidade x (cep uint32, deslocamento uint32, tamanho uint32), em ordem de CEP
+#   textos      UTF-8 "logradouro\tbairro\tlocalidade\tuf" de cada registro
+
+MAGICO = b"CEPBIN1\0"
+_CABECALHO = struct.Struct("<8sI")
+_REGISTRO = struct.Struct("<III")
+_PREFIXOS = 1000
+_INDICE = struct.Struct(f"<{_PREFIXOS + 1}I")
+
+# Nomes de coluna aceitos no arquivo de importação (cabeçalho sem diferenciar maiúsculas)
+_COLUNAS_IMPORTACAO = {
+    "cep": ["cep"],
+    "logradouro": ["logradouro", "rua", "endereco", "endereço"],
+    "bairro": ["bairro"],
+    "localidade": ["localidade", "cidade", "municipio", "município"],
+    "uf": ["uf", "estado"],
+}
+
+
+class BaseCEPOffline:
+    """ Consulta somente leitura de um arquivo gerado por importar_base_cep """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, "rb") as arquivo:
+            self._mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magico, self.quantidade = _CABECALHO.unpack_from(self._mapa, 0)
+        if magico != MAGICO:
+            self._mapa.close()
+            raise ValueError(f"{caminho} não é uma base de CEP válida")
+        self._indice = _INDICE.unpack_from(self._mapa, _CABECALHO.size)
+        self._inicio_registros = _CABECALHO.size + _INDICE.size
+        self._inicio_textos = self._inicio_registros + self.quantidade * _REGISTRO.size
+
+    def __len__(self):
+        return self.quantidade
+
+    def _registro(self, posicao):
+        return _REGISTRO.unpack_from(self._mapa, self._inicio_registros + posicao * _REGISTRO.size)
+
+    def obter(self, cep):
+        """ Endereço do CEP (8 dígitos) no formato da ViaCEP, ou None se não estiver na base """
+        if not (isinstance(cep, str) and len(cep) == 8 and cep.isdigit()):
+            return None
+        valor = int(cep)
+        prefixo = valor // 100000
+        # Busca binária apenas dentro da faixa do prefixo
+        baixo, alto = self._indice[prefixo], self._indice[prefixo + 1]
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            cep_meio, deslocamento, tamanho = self._registro(meio)
+            if cep_meio < valor:
+                baixo = meio + 1
+            elif cep_meio > valor:
+                alto = meio
+            else:
+                inicio = self._inicio_textos + deslocamento
+                campos = self._mapa[inicio:inicio + tamanho].decode("utf-8").split("\t")
+                return dict(zip(["logradouro", "bairro", "localidade", "uf"], campos))
+        return None
+
+    def fechar(self):
+        self._mapa.close()
+
+
+def _colunas_do_cabecalho(cabecalho):
+    nomes = [nome.strip().lower() for nome in cabecalho]
+    posicoes = {}
+    for campo, aceitos in _COLUNAS_IMPORTACAO.items():
+        for aceito in aceitos:
+            if aceito in nomes:
+                posicoes[campo] = nomes.index(aceito)
+                break
+        else:
+            raise ValueError(f"Coluna '{campo}' não encontrada no cabeçalho: {cabecalho}")
+    return posicoes
+
+
+def importar_base_cep(caminho_csv, caminho_saida, encoding="utf-8-sig"):
+    """ Converte um CSV (cabeçalho com cep, logradouro, bairro, cidade/localidade e uf;
+    separador detectado automaticamente) no arquivo binário lido por BaseCEPOffline.
+    Retorna a quantidade de CEPs gravados. """
+    with open(caminho_csv, newline="", encoding=encoding) as arquivo:
+        dialeto = csv.Sniffer().sniff(arquivo.read(65536), delimiters=",;\t|")
+        arquivo.seek(0)
+        leitor = csv.reader(arquivo, dialeto)
+        posicoes = _colunas_do_cabecalho(next(leitor))
+        enderecos = {}
+        for linha in leitor:
+            try:
+                cep = "".join(c for c in linha[posicoes["cep"]] if c.isdigit())
+                campos = [linha[posicoes[campo]].strip().replace("\t", " ")
+                          for campo in ["logradouro", "bairro", "localidade", "uf"]]
+            except IndexError:
+                continue
+            if len(cep) == 8:
+                enderecos[int(cep)] = "\t".join(campos).encode("utf-8")
+
+    ceps = sorted(enderecos)
+    indice = [0] * (_PREFIXOS + 1)
+    for cep in ceps:
+        indice[cep // 100000 + 1] += 1
+    for prefixo in range(1, _PREFIXOS + 1):
+        indice[prefixo] += indice[prefixo - 1]
+
+    # Grava em arquivo temporário e troca no fim: uma importação interrompida não corrompe a base atual
+    with gravacao_atomica(caminho_saida) as temporario, open(temporario, "wb") as saida:
+        saida.write(_CABECALHO.pack(MAGICO, len(ceps)))
+        saida.write(_INDICE.pack(*indice))
+        deslocamento = 0
+        registros = bytearray()
+        for cep in ceps:
+            texto = enderecos[cep]
+            registros += _REGISTRO.pack(cep, deslocamento, len(texto))
+            deslocamento += len(texto)
+        saida.write(registros)
+        for cep in ceps:
+            saida.write(enderecos[cep])
+    print(f"Base de CEP: {len(ceps)} CEPs importados de {caminho_csv} para {caminho_saida}", file=sys.stderr)
+    return len(ceps)
@@ -0,0 +1,304 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QLineEdit, QPushButton,
+    QComboBox, QCheckBox, QDateEdit, QRadioButton, QDialogButtonBox, QFileDialog,
+    QTableView, QAbstractItemView, QHeaderView, QTableWidget, QTableWidgetItem, QMessageBox
+)
+from PyQt5.QtCore import Qt, QDate, QTimer, QThreadPool, pyqtSignal
+
+from modelo_historico import CABECALHOS_HISTORICO, ModeloHistorico
+from tarefas import TarefaRelatorio
+
+
+class DialogoExportacaoLote(QDialog):
+    """ Seleção dos recibos (período, cliente ou placa) e do formato da exportação em lote """
+
+    def __init__(self, parent=None, pasta_inicial=""):
+        super().__init__(parent)
+        self.setWindowTitle("Exportar Recibos em Lote (PDF)")
+        self.setMinimumWidth(480)
+
+        layout = QVBoxLayout(self)
+        grid = QGridLayout()
+        layout.addLayout(grid)
+
+        self.check_periodo = QCheckBox("Filtrar por período:")
+        self.check_periodo.setChecked(True)
+        grid.addWidget(self.check_periodo, 0, 0)
+        hoje = QDate.currentDate()
+        self.data_inicio = QDateEdit(QDate(hoje.year(), hoje.month(), 1))
+        self.data_inicio.setCalendarPopup(True)
+        self.data_inicio.setDisplayFormat("dd/MM/yyyy")
+        self.data_fim = QDateEdit(hoje)
+        self.data_fim.setCalendarPopup(True)
+        self.data_fim.setDisplayFormat("dd/MM/yyyy")
+        grid.addWidget(self.data_inicio, 0, 1)
+        grid.addWidget(QLabel("até"), 0, 2)
+        grid.addWidget(self.data_fim, 0, 3)
+        self.check_periodo.toggled.connect(self.data_inicio.setEnabled)
+        self.check_periodo.toggled.connect(self.data_fim.setEnabled)
+
+        grid.addWidget(QLabel("Filtrar por:"), 1, 0)
+        self.combo_campo = QComboBox()
+        for texto, campo in [("Todos os recibos", None), ("Placa", "placa"), ("CPF/CNPJ", "cpf_cnpj"),
+                             ("Nome do cliente", "nome")]:
+            self.combo_campo.addItem(texto, campo)
+        grid.addWidget(self.combo_campo, 1, 1)
+        self.entry_valor = QLineEdit()
+        self.entry_valor.setPlaceholderText("Valor do filtro")
+        grid.addWidget(self.entry_valor, 1, 2, 1, 2)
+
+        grid.addWidget(QLabel("Pasta de destino:"), 2, 0)
+        self.entry_pasta = QLineEdit(pasta_inicial)
+        grid.addWidget(self.entry_pasta, 2, 1, 1, 2)
+        btn_pasta = QPushButton("...")
+        btn_pasta.clicked.connect(self._escolher_pasta)
+        grid.addWidget(btn_pasta, 2, 3)
+
+        formato_layout = QHBoxLayout()
+        layout.addLayout(formato_layout)
+        self.radio_individual = QRadioButton("Um PDF por recibo")
+        self.radio_individual.setChecked(True)
+        self.radio_unico = QRadioButton("Um único PDF com todos")
+        formato_layout.addWidget(self.radio_individual)
+        formato_layout.addWidget(self.radio_unico)
+
+        botoes = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        botoes.accepted.connect(self.accept)
+        botoes.rejected.connect(self.reject)
+        layout.addWidget(botoes)
+
+    def _escolher_pasta(self):
+        pasta = QFileDialog.getExistingDirectory(self, "Pasta de Destino", self.entry_pasta.text())
+        if pasta:
+            self.entry_pasta.setText(pasta)
+
+    def parametros(self):
+        """ Filtros no formato de ArmazenamentoRecibos.listar_numeros, mais pasta e formato """
+        periodo = self.check_periodo.isChecked()
+        return {
+            "data_inicio": self.data_inicio.date().toString("yyyy-MM-dd") if periodo else None,
+            "data_fim": self.data_fim.date().toString("yyyy-MM-dd") if periodo else None,
+            "campo": self.combo_campo.currentData(),
+            "valor": self.entry_valor.text().strip(),
+            "pasta_saida": self.entry_pasta.text().strip(),
+            "arquivo_unico": self.radio_unico.isChecked(),
+        }
+
+
+class DialogoHistorico(QDialog):
+    """ Lista rolável do histórico, com filtro e ordenação feitos no banco """
+
+    reciboEscolhido = pyqtSignal(str)
+
+    def __init__(self, armazenamento, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Histórico de Recibos")
+        self.resize(760, 520)
+
+        layout = QVBoxLayout(self)
+        filtro_layout = QHBoxLayout()
+        layout.addLayout(filtro_layout)
+        filtro_layout.addWidget(QLabel("Filtrar por:"))
+        self.combo_campo = QComboBox()
+        for texto, campo in [("Qualquer palavra", "texto"), ("Nome do cliente", "nome"), ("Placa", "placa"),
+                             ("CPF/CNPJ", "cpf_cnpj"), ("Número", "numero")]:
+            self.combo_campo.addItem(texto, campo)
+        filtro_layout.addWidget(self.combo_campo)
+        self.entry_filtro = QLineEdit()
+        self.entry_filtro.setPlaceholderText("Digite para filtrar...")
+        filtro_layout.addWidget(self.entry_filtro, 1)
+        self.label_total = QLabel()
+        filtro_layout.addWidget(self.label_total)
+
+        self.modelo = ModeloHistorico(armazenamento, parent=self)
+        self.tabela = QTableView()
+        self.tabela.setModel(self.modelo)
+        self.tabela.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tabela.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela.verticalHeader().setVisible(False)
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.tabela.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        # Ordenação pelo cabeçalho: o modelo repassa a ordem para a consulta
+        self.tabela.setSortingEnabled(True)
+        self.tabela.sortByColumn(0, Qt.DescendingOrder)
+        self.tabela.horizontalHeader().sortIndicatorChanged.connect(self._conferir_ordenacao)
+        self.tabela.doubleClicked.connect(self._abrir_selecionado)
+        layout.addWidget(self.tabela)
+
+        botoes = QHBoxLayout()
+        layout.addLayout(botoes)
+        botoes.addStretch(1)
+        btn_abrir = QPushButton("Abrir Recibo")
+        btn_abrir.clicked.connect(self._abrir_selecionado)
+        botoes.addWidget(btn_abrir)
+        btn_fechar = QPushButton("Fechar")
+        btn_fechar.clicked.connect(self.close)
+        botoes.addWidget(btn_fechar)
+
+        # Filtra enquanto o usuário digita, sem consultar a cada tecla
+        self._timer_filtro = QTimer(self)
+        self._timer_filtro.setSingleShot(True)
+        self._timer_filtro.setInterval(250)
+        self._timer_filtro.timeout.connect(self._aplicar_filtro)
+        self.entry_filtro.textChanged.connect(self._timer_filtro.start)
+        self.combo_campo.currentIndexChanged.connect(self._timer_filtro.start)
+        self._atualizar_total()
+
+    def _aplicar_filtro(self):
+        texto = self.entry_filtro.text().strip()
+        self.modelo.definir_filtro(self.combo_campo.currentData() if texto else None, texto)
+        self._atualizar_total()
+
+    def _atualizar_total(self):
+        self.label_total.setText(f"{self.modelo.total_filtrado()} recibo(s)")
+
+    def atualizar(self):
+        """ Recarrega a lista (ex.: depois de salvar ou excluir um recibo) """
+        self.modelo.atualizar()
+        self._atualizar_total()
+
+    def atualizar_recibos(self, numeros):
+        """ Atualiza só as linhas dos recibos alterados ou excluídos em outra estação """
+        self.modelo.atualizar_recibos(numeros)
+        self._atualizar_total()
+
+    def _conferir_ordenacao(self, coluna, ordem):
+        """ Coluna sem ordenação no banco (CABECALHOS_HISTORICO): o modelo mantém a ordem atual,
+        então o indicador do cabeçalho volta para ela """
+        if CABECALHOS_HISTORICO[coluna][1] is not None:
+            return
+        atual = [chave for _, chave in CABECALHOS_HISTORICO].index(self.modelo.ordem)
+        cabecalho = self.tabela.horizontalHeader()
+        cabecalho.blockSignals(True)   # sem reordenar: a ordem não mudou
+        cabecalho.setSortIndicator(atual, Qt.DescendingOrder if self.modelo.decrescente else Qt.AscendingOrder)
+        cabecalho.blockSignals(False)
+
+    def _abrir_selecionado(self, *args):
+        linha = self.tabela.currentIndex().row()
+        if linha >= 0:
+            self.reciboEscolhido.emit(self.modelo.numero_recibo(linha))
+
+
+def _formatar_celula(valor):
+    if isinstance(valor, float):
+        return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    return "" if valor is None else str(valor)
+
+
+class DialogoRelatorios(QDialog):
+    """ Faturamento e serviços de um período; o cálculo roda em segundo plano """
+
+    def __init__(self, armazenamento, parent=None):
+        super().__init__(parent)
+        self.armazenamento = armazenamento
+        self.relatorio = None
+        self._tarefa = None
+        self.setWindowTitle("Relatórios")
+        self.resize(820, 560)
+
+        layout = QVBoxLayout(self)
+        periodo_layout = QHBoxLayout()
+        layout.addLayout(periodo_layout)
+        periodo_layout.addWidget(QLabel("Período:"))
+        hoje = QDate.currentDate()
+        self.data_inicio = QDateEdit(QDate(hoje.year(), 1, 1))
+        self.data_fim = QDateEdit(hoje)
+        for data in (self.data_inicio, self.data_fim):
+            data.setCalendarPopup(True)
+            data.setDisplayFormat("dd/MM/yyyy")
+        periodo_layout.addWidget(self.data_inicio)
+        periodo_layout.addWidget(QLabel("até"))
+        periodo_layout.addWidget(self.data_fim)
+        self.btn_gerar = QPushButton("Gerar")
+        self.btn_gerar.clicked.connect(self.gerar)
+        periodo_layout.addWidget(self.btn_gerar)
+        periodo_layout.addStretch(1)
+
+        self.label_resumo = QLabel("")
+        layout.addWidget(self.label_resumo)
+
+        self.combo_relatorio = QComboBox()
+        self.combo_relatorio.currentIndexChanged.connect(self._mostrar_tabela)
+        layout.addWidget(self.combo_relatorio)
+        self.tabela = QTableWidget()
+        self.tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela.verticalHeader().setVisible(False)
+        layout.addWidget(self.tabela)
+
+        botoes = QHBoxLayout()
+        layout.addLayout(botoes)
+        botoes.addStretch(1)
+        self.btn_exportar = QPushButton("Exportar...")
+        self.btn_exportar.setEnabled(False)
+        self.btn_exportar.clicked.connect(self._exportar)
+        botoes.addWidget(self.btn_exportar)
+        btn_fechar = QPushButton("Fechar")
+        btn_fechar.clicked.connect(self.close)
+        botoes.addWidget(btn_fechar)
+
+    def gerar(self):
+        if self._tarefa is not None:
+            return
+        self._tarefa = TarefaRelatorio(self.armazenamento, self.data_inicio.date().toString("yyyy-MM-dd"),
+                                       self.data_fim.date().toString("yyyy-MM-dd"))
+        self._tarefa.sinais.concluido.connect(self._relatorio_pronto)
+        self._tarefa.sinais.falhou.connect(self._relatorio_falhou)
+        self.btn_gerar.setEnabled(False)
+        self.label_resumo.setText("Calculando...")
+        QThreadPool.globalInstance().start(self._tarefa)
+
+    def _relatorio_pronto(self, relatorio):
+        from relatorios import RELATORIOS  # pandas já carregado pela tarefa
+
+        self._tarefa = None
+        self.btn_gerar.setEnabled(True)
+        self.relatorio = relatorio
+        resumo = relatorio.resumo()
+        tipos = "  |  ".join(f"{tipo}: R$ {_formatar_celula(valor)}" for tipo, valor in resumo["itens_por_tipo"].items())
+        self.label_resumo.setText(
+            f"{resumo['recibos']} recibo(s)  |  Faturamento: R$ {_formatar_celula(resumo['faturamento'])}  |  "
+            f"Ticket médio: R$ {_formatar_celula(resumo['ticket_medio'])}" + (f"  |  {tipos}" if tipos else ""))
+        atual = self.combo_relatorio.currentData()
+        self.combo_relatorio.blockSignals(True)
+        self.combo_relatorio.clear()
+        for nome, titulo in RELATORIOS.items():
+            self.combo_relatorio.addItem(titulo, nome)
+        self.combo_relatorio.setCurrentIndex(max(self.combo_relatorio.findData(atual), 0))
+        self.combo_relatorio.blockSignals(False)
+        self._mostrar_tabela()
+        self.btn_exportar.setEnabled(True)
+
+    def _relatorio_falhou(self, mensagem):
+        self._tarefa = None
+        self.btn_gerar.setEnabled(True)
+        self.label_resumo.setText("")
+        QMessageBox.critical(self, "Relatórios", f"Erro ao gerar o relatório: {mensagem}")
+
+    def _mostrar_tabela(self):
+        if self.relatorio is None or self.combo_relatorio.currentData() is None:
+            return
+        df = self.relatorio.tabela(self.combo_relatorio.currentData())
+        self.tabela.clear()
+        self.tabela.setRowCount(len(df))
+        self.tabela.setColumnCount(len(df.columns))
+        self.tabela.setHorizontalHeaderLabels([str(coluna) for coluna in df.columns])
+        for linha, valores in enumerate(df.itertuples(index=False, name=None)):
+            for coluna, valor in enumerate(valores):
+                item = QTableWidgetItem(_formatar_celula(valor.item() if hasattr(valor, "item") else valor))
+                if not isinstance(valor, str):
+                    item.setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
+                self.tabela.setItem(linha, coluna, item)
+        self.tabela.resizeColumnsToContents()
+
+    def _exportar(self):
+        caminho, _ = QFileDialog.getSaveFileName(
+            self, "Exportar Relatórios", "relatorio.xlsx", "Planilha Excel (*.xlsx);;CSV (*.csv)")
+        if not caminho:
+            return
+        try:
+            arquivos = self.relatorio.exportar(caminho)
+        except Exception as e:
+            QMessageBox.critical(self, "Relatórios", f"Erro ao exportar: {e}")
+            return
+        QMessageBox.information(self, "Relatórios", "Relatórios exportados:\n" + "\n".join(arquivos))
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
+
+from arquivos import gravacao_atomica
+from renderizacao import RenderizadorRecibo
+from nucleo import nome_arquivo_pdf
+
+# --- Exportação de Recibos em Lote ---
+# Cada processo de trabalho monta o seu RenderizadorRecibo (Jinja2 + WeasyPrint)
+# uma única vez no inicializador e depois renderiza vários recibos.
+
+_renderizador_processo = None
+
+
+def _inicializar_processo(pasta_templates, info_oficina, caminhos_logo):
+    global _renderizador_processo
+    _renderizador_processo = RenderizadorRecibo(pasta_templates, info_oficina, caminhos_logo)
+    _renderizador_processo.aquecer()
+
+
+def _renderizar_recibo(dados_recibo, caminho_pdf, data_atual, hora_atual):
+    _renderizador_processo.gerar_pdf(dados_recibo, caminho_pdf, data_atual, hora_atual)
+    return dados_recibo["Numero_Recibo"], caminho_pdf
+
+
+class ResultadoExportacao:
+    def __init__(self, total, arquivos, falhas, segundos, gerados=None):
+        self.total = total            # recibos pedidos
+        self.arquivos = arquivos      # caminhos dos PDFs gerados (só o arquivo único, se pedido)
+        self.falhas = falhas          # lista de (numero_recibo, mensagem)
+        self.segundos = segundos
+        self.gerados = len(arquivos) if gerados is None else gerados   # recibos renderizados
+
+    @property
+    def recibos_por_segundo(self):
+        # Só os renderizados: falhas e recibos não encontrados não são vazão
+        return self.gerados / self.segundos if self.segundos > 0 else 0.0
+
+    def resumo(self):
+        return (f"{self.gerados} de {self.total} recibos em {self.segundos:.1f} s "
+                f"({self.recibos_por_segundo:.1f} recibos/s), {len(self.falhas)} falha(s)")
+
+
+def mesclar_pdfs(caminhos_pdf, caminho_saida):
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        raise RuntimeError("Para gerar um PDF único instale o pacote 'pypdf' (pip install pypdf).")
+    escritor = PdfWriter()
+    for caminho in caminhos_pdf:
+        escritor.append(caminho)
+    with gravacao_atomica(caminho_saida) as temporario, open(temporario, "wb") as arquivo:
+        escritor.write(arquivo)
+    return caminho_saida
+
+
+def _renderizar_remoto(renderizador, dados_recibo, caminho_pdf, data_atual, hora_atual):
+    renderizador.gerar_pdf(dados_recibo, caminho_pdf, data_atual, hora_atual)
+    return dados_recibo["Numero_Recibo"], caminho_pdf
+
+
+def exportar_lote(armazenamento, numeros_recibo, pasta_saida, renderizador, arquivo_unico=None,
+                  processos=None, progresso=None):
+    """ Gera os PDFs dos recibos em pasta_saida usando um processo por núcleo.
+
+    arquivo_unico: se informado, os PDFs individuais são unidos nesse arquivo (e removidos).
+    progresso: função opcional chamada com (concluidos, total) a cada recibo. """
+    os.makedirs(pasta_saida, exist_ok=True)
+    progresso = progresso or (lambda concluidos, total: None)
+    agora = datetime.now()
+    data_atual, hora_atual = agora.strftime("%d/%m/%Y"), agora.strftime("%H:%M:%S")
+
+    inicio = time.perf_counter()
+    arquivos, falhas = {}, []
+    total = len(numeros_recibo)
+    if getattr(renderizador, "remoto", False):
+        # Servidor de recibos: os processos de renderização são os dele; aqui só threads de espera
+        trabalhadores = processos or 4
+        executor = ThreadPoolExecutor(max_workers=trabalhadores)
+        renderizar = partial(_renderizar_remoto, renderizador)
+    else:
+        trabalhadores = processos or os.cpu_count()
+        executor = ProcessPoolExecutor(
+            max_workers=trabalhadores,
+            initializer=_inicializar_processo,
+            initargs=(renderizador.pasta_templates, renderizador.info_oficina, renderizador.caminhos_logo)
+        )
+        renderizar = _renderizar_recibo
+    # Recibos lidos à frente da renderização: os processos nunca ficam sem trabalho enquanto o banco
+    # é lido, e um lote grande não fica inteiro na memória (e na fila dos processos) de uma vez
+    limite_pendentes = 2 * trabalhadores
+    concluidos = 0
+
+    def recolher(pendentes, quando):
+        nonlocal concluidos
+        prontos, _ = wait(pendentes, return_when=quando)
+        for futuro in prontos:
+            numero_recibo = pendentes.pop(futuro)
+            try:
+                _, caminho_pdf = futuro.result()
+                arquivos[numero_recibo] = caminho_pdf
+            except Exception as e:
+                print(f"Erro ao gerar PDF do recibo {numero_recibo}: {e}", file=sys.stderr)
+                falhas.append((numero_recibo, str(e)))
+            concluidos += 1
+            progresso(concluidos, total)
+
+    with executor:
+        pendentes = {}
+        for numero_recibo in numeros_recibo:
+            dados_recibo = armazenamento.obter(numero_recibo)
+            if dados_recibo is None:
+                falhas.append((numero_recibo, "recibo não encontrado"))
+                concluidos += 1
+                progresso(concluidos, total)
+                continue
+            caminho_pdf = os.path.join(pasta_saida, nome_arquivo_pdf(dados_recibo["Numero_Recibo"]) + ".pdf")
+            pendentes[executor.submit(renderizar, dados_recibo, caminho_pdf, data_atual, hora_atual)] = numero_recibo
+            if len(pendentes) >= limite_pendentes:
+                recolher(pendentes, FIRST_COMPLETED)
+        while pendentes:
+            recolher(pendentes, FIRST_COMPLETED)
+
+    # Mantém a ordem dos números pedidos, não a ordem de conclusão
+    caminhos = [arquivos[numero] for numero in numeros_recibo if numero in arquivos]
+    if arquivo_unico and caminhos:
+        mesclar_pdfs(caminhos, arquivo_unico)
+        for caminho in caminhos:
+            os.remove(caminho)
+        caminhos = [arquivo_unico]
+
+    resultado = ResultadoExportacao(total, caminhos, falhas, time.perf_counter() - inicio, gerados=len(arquivos))
+    print(f"Exportação em lote: {resultado.resumo()}", file=sys.stderr)
+    return resultado
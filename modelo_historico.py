@@ -0,0 +1,126 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from armazenamento import COLUNAS_HISTORICO
+
+# --- Histórico de Recibos (lista paginada) ---
+# As linhas vêm do armazenamento em páginas, conforme a lista rola (canFetchMore/fetchMore).
+# Ordenação e filtro são feitos pelo banco, pelos índices; o modelo só guarda as linhas já
+# exibidas, como tuplas curtas.
+
+# (título, chave de ORDENACOES_HISTORICO ou None se a coluna não ordena)
+CABECALHOS_HISTORICO = [
+    ("Número", "numero"), ("Data", "data"), ("Cliente", "nome"),
+    ("Placa", "placa"), ("Modelo", None), ("Valor Total", "valor"),
+]
+
+
+class ModeloHistorico(QAbstractTableModel):
+    def __init__(self, armazenamento, tamanho_pagina=200, parent=None):
+        super().__init__(parent)
+        self.armazenamento = armazenamento
+        self.tamanho_pagina = tamanho_pagina
+        self.ordem = "numero"
+        self.decrescente = True
+        self.campo = None
+        self.valor = None
+        self._linhas = []
+        self._ultima_chave = None
+        self._fim = False
+
+    def _recomecar(self):
+        self.beginResetModel()
+        self._linhas = []
+        self._ultima_chave = None
+        self._fim = False
+        self.endResetModel()
+        # A primeira página é carregada já, sem esperar a view pedir
+        if self.canFetchMore():
+            self.fetchMore()
+
+    def definir_filtro(self, campo, valor):
+        """ Filtro como em ArmazenamentoRecibos.buscar; campo None mostra todos os recibos """
+        self.campo = campo or None
+        self.valor = valor if campo else None
+        self._recomecar()
+
+    def atualizar(self):
+        self._recomecar()
+
+    def atualizar_recibos(self, numeros):
+        """ Relê só as linhas já exibidas dos recibos dados (alterados em outra estação) e retira as
+        dos excluídos. Recibo que ainda não está na lista (novo) recomeça a lista, para entrar na posição
+        certa. A posição das linhas alteradas é refeita na próxima ordenação ou filtro """
+        coluna_numero = COLUNAS_HISTORICO.index("Numero_Recibo")
+        posicoes = {linha[coluna_numero]: i for i, linha in enumerate(self._linhas)}
+        linhas = self.armazenamento.linhas_historico(numeros)
+        if any(numero in linhas and numero not in posicoes for numero in numeros):
+            self._recomecar()
+            return
+        for numero in numeros:
+            if numero in linhas and numero in posicoes:
+                i = posicoes[numero]
+                self._linhas[i] = tuple(linhas[numero][col] for col in COLUNAS_HISTORICO)
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(COLUNAS_HISTORICO) - 1))
+        # Excluídos: de baixo para cima, para as posições restantes continuarem válidas
+        for i in sorted((posicoes[n] for n in numeros if n in posicoes and n not in linhas), reverse=True):
+            self.beginRemoveRows(QModelIndex(), i, i)
+            del self._linhas[i]
+            self.endRemoveRows()
+
+    def total_filtrado(self):
+        return self.armazenamento.contar(self.campo, self.valor)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._linhas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(CABECALHOS_HISTORICO)
+
+    def headerData(self, secao, orientacao, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientacao == Qt.Horizontal:
+            return CABECALHOS_HISTORICO[secao][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        valor = self._linhas[index.row()][index.column()]
+        if role == Qt.DisplayRole:
+            if valor is None:
+                return ""
+            if COLUNAS_HISTORICO[index.column()] == "Valor_Total_Final":
+                return "R$ " + f"{float(valor):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            return str(valor)
+        if role == Qt.TextAlignmentRole and COLUNAS_HISTORICO[index.column()] == "Valor_Total_Final":
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._fim
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._fim:
+            return
+        pagina = self.armazenamento.listar_pagina(
+            self.ordem, self.decrescente, self.campo, self.valor,
+            apos=self._ultima_chave, limite=self.tamanho_pagina)
+        if len(pagina) < self.tamanho_pagina:
+            self._fim = True
+        if not pagina:
+            return
+        self._ultima_chave = pagina[-1]["_chave"]
+        inicio = len(self._linhas)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(pagina) - 1)
+        self._linhas.extend(tuple(linha[col] for col in COLUNAS_HISTORICO) for linha in pagina)
+        self.endInsertRows()
+
+    def sort(self, coluna, ordem=Qt.AscendingOrder):
+        chave = CABECALHOS_HISTORICO[coluna][1]
+        if chave is None:
+            return
+        self.ordem = chave
+        self.decrescente = ordem == Qt.DescendingOrder
+        self._recomecar()
+
+    def numero_recibo(self, linha):
+        return self._linhas[linha][COLUNAS_HISTORICO.index("Numero_Recibo")]
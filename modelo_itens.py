@@ -0,0 +1,181 @@
+import math
+from array import array
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+from nucleo import ErroValidacao, calcular_item
+
+# --- Itens do Recibo (Peças e Serviços) ---
+# Os itens ficam uma única vez, em colunas: textos em listas e números em arrays compactos.
+# O total é mantido por diferença a cada inclusão, remoção ou edição, sem somar a lista toda.
+
+COLUNAS_TABELA = [
+    ("tipo", "Tipo"), ("codigo", "Código"), ("descricao", "Descrição"),
+    ("quantia", "Qtd"), ("valor", "Val Unit"), ("desc", "Desc. (%)"), ("valor_total", "Total"),
+]
+COLUNAS_EDITAVEIS = {"quantia", "valor", "desc"}
+
+
+def _formatar_moeda(valor):
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+class ListaItens:
+    """ Itens de um recibo em armazenamento colunar, com total corrente """
+
+    def __init__(self, itens=()):
+        self.limpar()
+        for item in itens:
+            self.adicionar(item)
+
+    def limpar(self):
+        self.tipo, self.codigo, self.descricao, self.uni = [], [], [], []
+        self.quantia = array('q')
+        self.valor = array('d')
+        self.desc = array('d')
+        self.valor_total = array('d')
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.valor_total)
+
+    def adicionar(self, item):
+        self.tipo.append(item["tipo"])
+        self.codigo.append(item["codigo"])
+        self.descricao.append(item["descricao"])
+        self.uni.append(item.get("uni") or "un")
+        self.quantia.append(int(item["quantia"] or 0))
+        self.valor.append(float(item["valor"] or 0.0))
+        self.desc.append(float(item["desc"] or 0.0))
+        self.valor_total.append(float(item["valor_total"] or 0.0))
+        self.total += self.valor_total[-1]
+
+    def remover(self, linha):
+        self.total -= self.valor_total[linha]
+        for coluna in (self.tipo, self.codigo, self.descricao, self.uni,
+                       self.quantia, self.valor, self.desc, self.valor_total):
+            del coluna[linha]
+        if not len(self):
+            self.total = 0.0  # Zera o resíduo de arredondamento acumulado
+
+    def alterar(self, linha, campo, valor):
+        """ Altera quantia, valor ou desc da linha, revalidando e recalculando o total do item.
+        Levanta ErroValidacao com a mesma mensagem da inclusão se o novo valor for inválido """
+        dados = self.item(linha)
+        dados[campo] = valor
+        novo = calcular_item(dados["tipo"], dados["codigo"], dados["descricao"],
+                             dados["valor"], dados["quantia"], dados["desc"])
+        self.quantia[linha] = novo["quantia"]
+        self.valor[linha] = novo["valor"]
+        self.desc[linha] = novo["desc"]
+        self.total += novo["valor_total"] - self.valor_total[linha]
+        self.valor_total[linha] = novo["valor_total"]
+
+    def valor_coluna(self, linha, campo):
+        return getattr(self, campo)[linha]
+
+    def item(self, linha):
+        return {
+            "tipo": self.tipo[linha], "codigo": self.codigo[linha], "descricao": self.descricao[linha],
+            "uni": self.uni[linha], "valor": self.valor[linha], "quantia": self.quantia[linha],
+            "desc": self.desc[linha], "valor_total": self.valor_total[linha],
+        }
+
+    def itens(self):
+        """ Cópia dos itens como lista de dicionários (formato de Itens_Recibo) """
+        return [self.item(linha) for linha in range(len(self))]
+
+    def recalcular_total(self):
+        self.total = math.fsum(self.valor_total)
+        return self.total
+
+
+class ModeloItens(QAbstractTableModel):
+    """ Tabela de itens para QTableView; quantidade, valor unitário e desconto editáveis no lugar """
+
+    totalAlterado = pyqtSignal(float)
+    edicaoInvalida = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lista = ListaItens()
+
+    @property
+    def total(self):
+        return self.lista.total
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lista)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUNAS_TABELA)
+
+    def headerData(self, secao, orientacao, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientacao == Qt.Horizontal:
+            return COLUNAS_TABELA[secao][1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        campo = COLUNAS_TABELA[index.column()][0]
+        valor = self.lista.valor_coluna(index.row(), campo)
+        if role == Qt.DisplayRole:
+            if campo in ("valor", "valor_total"):
+                return f"R$ {_formatar_moeda(valor)}"
+            if campo == "desc":
+                return f"{valor:.0f}%"
+            return str(valor)
+        if role == Qt.EditRole:
+            return valor
+        if role == Qt.TextAlignmentRole and campo in ("quantia", "valor", "desc", "valor_total"):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and COLUNAS_TABELA[index.column()][0] in COLUNAS_EDITAVEIS:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, valor, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        campo = COLUNAS_TABELA[index.column()][0]
+        if campo not in COLUNAS_EDITAVEIS:
+            return False
+        try:
+            self.lista.alterar(index.row(), campo, valor)
+        except ErroValidacao as e:
+            self.edicaoInvalida.emit(str(e))
+            return False
+        # Só a linha editada é redesenhada (o campo e o total do item)
+        self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), len(COLUNAS_TABELA) - 1))
+        self.totalAlterado.emit(self.lista.total)
+        return True
+
+    def adicionar(self, item):
+        linha = len(self.lista)
+        self.beginInsertRows(QModelIndex(), linha, linha)
+        self.lista.adicionar(item)
+        self.endInsertRows()
+        self.totalAlterado.emit(self.lista.total)
+
+    def remover(self, linha):
+        self.beginRemoveRows(QModelIndex(), linha, linha)
+        self.lista.remover(linha)
+        self.endRemoveRows()
+        self.totalAlterado.emit(self.lista.total)
+
+    def carregar(self, itens):
+        """ Substitui todos os itens (ex.: ao abrir um recibo do histórico) """
+        self.beginResetModel()
+        self.lista = ListaItens(itens)
+        self.endResetModel()
+        self.totalAlterado.emit(self.lista.total)
+
+    def limpar(self):
+        self.carregar(())
+
+    def itens(self):
+        return self.lista.itens()
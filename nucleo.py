@@ -0,0 +1,273 @@
+import os
+import sys
+from bisect import bisect_left
+from datetime import datetime
+
+from armazenamento import ArmazenamentoSQLite, normalizar_numero_recibo, formatar_detalhes_itens
+
+# --- Regras de Negócio dos Recibos ---
+# Tudo o que não depende da interface: caminhos, cálculo de itens, montagem,
+# validação e preparação do recibo para gravação. Usado pelo ReciboApp e pelo
+# recibos_cli.py (que roda sem importar o PyQt5).
+
+
+# --- Configurações Globais ---
+def resource_path(relative_path):
+    """ Retorna o caminho absoluto para um recurso, funciona para dev e para PyInstaller """
+    try:
+        # PyInstaller cria uma pasta temporária e armazena o caminho em _MEIPASS
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+# Determina o diretório base para arquivos de DADOS (Excel, PDFs gerados)
+if getattr(sys, 'frozen', False):
+    # Se estiver rodando como um executável PyInstaller (.exe)
+    application_path = os.path.dirname(sys.executable)
+else:
+    # Se estiver rodando como um script .py normal
+    application_path = os.path.dirname(os.path.abspath(__file__))
+
+# Banco SQLite com o histórico de recibos (sempre ao lado do .exe)
+ARQUIVO_BANCO_RECIBOS = os.path.join(application_path, "Recibos_Historico.sqlite3")
+# Planilha Excel: exportação sob demanda e origem da migração do histórico antigo
+ARQUIVO_EXCEL_RECIBO = os.path.join(application_path, "Recibos_Historico.xlsx")
+# Cache local dos endereços consultados por CEP
+ARQUIVO_CACHE_CEP = os.path.join(application_path, "Cache_CEP.sqlite3")
+# Base de CEPs offline (opcional), gerada por "recibos_cli.py importar-cep"
+ARQUIVO_BASE_CEP = os.path.join(application_path, "Base_CEP.bin")
+# Pasta para PDFs (sempre ao lado do .exe)
+PASTA_RECIBOS_GERADOS = os.path.join(application_path, "Recibos_Gerados")
+# Backups incrementais do banco e dos PDFs (recibos_cli.py backup); pode ser outro disco
+PASTA_BACKUPS = os.environ.get("RECIBOS_PASTA_BACKUPS", os.path.join(application_path, "Backups"))
+
+# Servidor de recibos (servidor.py) compartilhado pelas estações, ex.: "http://192.168.0.10:8765".
+# Sem ele cada estação abre o banco diretamente
+URL_SERVIDOR = os.environ.get("RECIBOS_SERVIDOR")
+TOKEN_SERVIDOR = os.environ.get("RECIBOS_TOKEN")
+
+# Recursos internos da aplicação (imagens, templates)
+ARQUIVO_LOGO = resource_path(os.path.join("resources", "logo.png"))
+HTML_TEMPLATE_RECIBO = resource_path("recibo_template.html") # Ajustado para pegar da raiz do bundle
+
+INFO_OFICINA = {
+    "nome": "CR Soluções Automotivas",
+    "endereco": "Estrada do barro vermelho 341 - Rocha Miranda - RJ",
+    "cep": "21540-500",
+    "telefone": "(21) 99757-0103 / 97125-0490",
+    "email": "thiagosoarescruz01@gmail.com",
+    "cnpj": "48.969.894/0001-59"
+}
+
+
+def abrir_armazenamento(local=False):
+    """ Cliente do servidor de recibos, se URL_SERVIDOR estiver definida, senão o banco local.
+    local=True sempre abre o banco (usado pelo próprio servidor) """
+    if URL_SERVIDOR and not local:
+        from armazenamento_http import ArmazenamentoHTTP
+
+        return ArmazenamentoHTTP(URL_SERVIDOR, token=TOKEN_SERVIDOR)
+    return ArmazenamentoSQLite(ARQUIVO_BANCO_RECIBOS, caminho_excel_legado=ARQUIVO_EXCEL_RECIBO)
+
+
+def abrir_consulta_cep(armazenamento):
+    """ Consulta de CEP com o cache em disco, semeado com os endereços do histórico na primeira vez,
+    e com a base offline se ela estiver instalada """
+    from cep import CacheCEP, ConsultaCEP
+
+    base_offline = None
+    if os.path.exists(ARQUIVO_BASE_CEP):
+        from cep_offline import BaseCEPOffline
+
+        try:
+            base_offline = BaseCEPOffline(ARQUIVO_BASE_CEP)
+        except (OSError, ValueError) as e:
+            print(f"ALERTA: base de CEP offline ignorada: {e}", file=sys.stderr)
+    cache = CacheCEP(ARQUIVO_CACHE_CEP)
+    cache.semear(armazenamento)
+    return ConsultaCEP(cache, base_offline=base_offline)
+
+
+def criar_renderizador(local=False):
+    """ Renderizador de PDFs: o do servidor de recibos, se configurado, senão o local """
+    if URL_SERVIDOR and not local:
+        from armazenamento_http import ArmazenamentoHTTP, RenderizadorHTTP
+
+        return RenderizadorHTTP(ArmazenamentoHTTP(URL_SERVIDOR, token=TOKEN_SERVIDOR))
+    # Importado aqui: o WeasyPrint só é carregado por quem realmente gera PDF
+    from renderizacao import RenderizadorRecibo
+
+    return RenderizadorRecibo(
+        resource_path("resources"), INFO_OFICINA,
+        caminhos_logo=[resource_path("logo.png"), resource_path(os.path.join("resources", "logo.png"))]
+    )
+
+
+class ErroValidacao(ValueError):
+    """ Dado informado pelo usuário inválido; a mensagem pode ser exibida diretamente """
+
+
+def calcular_item(tipo, codigo, descricao, valor_unitario, quantidade, desconto_percentual=0.0):
+    """ Valida os campos de um item e devolve o dicionário com o valor total já calculado.
+    Aceita textos como os digitados na tela ("10,50") ou números. """
+    tipo, codigo, descricao = str(tipo or "").strip(), str(codigo or "").strip(), str(descricao or "").strip()
+    valor_str = str(valor_unitario if valor_unitario is not None else "").strip().replace(',', '.')
+    qtd_str = str(quantidade if quantidade is not None else "").strip()
+    desc_perc_str = str(desconto_percentual if desconto_percentual is not None else "").strip()
+
+    if not tipo or not codigo or not descricao or not valor_str or not qtd_str:
+        raise ErroValidacao("Por favor, preencha todos os campos do item.")
+
+    try:
+        valor_unitario = float(valor_str)
+        quantidade = int(qtd_str)
+        desconto_percentual = float(desc_perc_str) if desc_perc_str else 0.0
+    except ValueError:
+        raise ErroValidacao("Valores numéricos inválidos. Use apenas números.")
+
+    if valor_unitario <= 0 or quantidade <= 0:
+        raise ErroValidacao("Valor unitário e quantidade devem ser maiores que zero.")
+    if not (0 <= desconto_percentual <= 100):
+        raise ErroValidacao("Desconto percentual deve estar entre 0 e 100.")
+
+    valor_total_item_sem_desc = valor_unitario * quantidade
+    valor_total_item = valor_total_item_sem_desc * (1 - (desconto_percentual / 100))
+
+    return {
+        "tipo": tipo,
+        "codigo": codigo,
+        "descricao": descricao,
+        "uni": "un",
+        "valor": valor_unitario,
+        "quantia": quantidade,
+        "desc": desconto_percentual,
+        "valor_total": valor_total_item
+    }
+
+
+def montar_recibo(campos, itens):
+    """ Monta o dicionário completo do recibo a partir dos campos digitados (nomes de coluna)
+    e da lista de itens, preenchendo totais, endereço combinado e data/hora atuais se faltarem """
+    dados = dict(campos)
+    agora = datetime.now()
+    dados.setdefault("Data_Recibo", agora.strftime("%d/%m/%Y"))
+    dados.setdefault("Hora_Recibo", agora.strftime("%H:%M:%S"))
+
+    # Cria a string de endereço combinado para compatibilidade
+    dados["Endereco_Cliente"] = ", ".join(filter(None, [
+        dados.get("Rua_Cliente"), dados.get("Numero_Cliente"), dados.get("Bairro_Cliente"),
+        dados.get("Cidade_Cliente"), dados.get("UF_Cliente")
+    ]))
+    for campo in ["Problema_Informado", "Problema_Constatado", "Servico_Executado"]:
+        dados.setdefault(campo, "")  # Não usado diretamente no recibo
+
+    # Texto mantido apenas para o template; no banco os itens são gravados em Itens_Recibo
+    dados["Detalhes_Itens"] = formatar_detalhes_itens(itens)
+    dados["Total_Itens"] = sum(item['valor_total'] for item in itens)
+    dados["Deslocamento"] = 0.0  # Removido da interface, mantido para compatibilidade
+    dados["Desconto_Geral"] = 0.0  # Removido da interface, mantido para compatibilidade
+    dados["Valor_Total_Final"] = dados["Total_Itens"]  # Simplificado - apenas subtotal dos itens
+    dados["Itens_Recibo"] = itens
+    return dados
+
+
+def validar_recibo(dados, exigir_numero=False):
+    """ Lista com os nomes dos campos obrigatórios não preenchidos (vazia se o recibo é válido) """
+    campos_obrigatorios = {
+        "Nome_Cliente": "Nome do Cliente",
+        "Valor_Total_Final": "Valor Total Final"
+    }
+    if exigir_numero:
+        campos_obrigatorios = {"Numero_Recibo": "Número do Recibo", **campos_obrigatorios}
+
+    campos_vazios = []
+    for campo, nome_exibicao in campos_obrigatorios.items():
+        valor = dados.get(campo)
+        # Checa se o valor é None, string vazia, ou um número que é zero
+        if valor is None or (isinstance(valor, str) and not valor.strip()) or (isinstance(valor, (int, float)) and valor == 0):
+            # Especial para Valor_Total_Final que pode ser string "0,00"
+            if campo == "Valor_Total_Final" and str(valor) in ["0,00", "0.0", "0"]:
+                campos_vazios.append(nome_exibicao)
+            elif campo != "Valor_Total_Final":
+                campos_vazios.append(nome_exibicao)
+
+    # Verificar se há pelo menos um item
+    if not dados.get("Itens_Recibo"):
+        campos_vazios.append("Pelo menos um item/serviço")
+    return campos_vazios
+
+
+def preparar_para_salvar(dados):
+    """ Cópia do recibo com textos e números no formato gravado no banco """
+    dados_salvar = dict(dados)
+
+    # Define colunas que devem ser tratadas como texto
+    colunas_texto = [
+        "Rua_Cliente", "Numero_Cliente", "Bairro_Cliente", "Cidade_Cliente", "UF_Cliente",
+        "CEP_Cliente", "Telefone_Cliente", "CPF_CNPJ_Cliente", "Nome_Cliente",
+        "Placa_Veiculo", "Marca_Veiculo", "Modelo_Veiculo", "Cor_Veiculo", "Ano_Veiculo"
+    ]
+    for col in colunas_texto:
+        if col in dados_salvar:
+            dados_salvar[col] = str(dados_salvar[col]) if dados_salvar[col] is not None else ""
+
+    # Conversão e limpeza de dados numéricos para salvar no banco
+    colunas_numericas = ["KM_Entrada_Veiculo", "KM_Saida_Veiculo", "Total_Itens", "Valor_Total_Final"]
+    for key in colunas_numericas:
+        val = dados_salvar.get(key)
+        if isinstance(val, str):
+            clean_val = val.replace('.', '').replace(',', '.')
+            if clean_val.isdigit():
+                dados_salvar[key] = float(clean_val)
+            else:
+                dados_salvar[key] = None
+        elif isinstance(val, (int, float)):
+            pass # já está no formato correto
+        else:
+            dados_salvar[key] = None
+
+    dados_salvar["Numero_Recibo"] = normalizar_numero_recibo(dados_salvar.get("Numero_Recibo", ""))
+    return dados_salvar
+
+
+def nome_arquivo_pdf(numero_recibo):
+    return "recibo_" + "".join(c for c in str(numero_recibo) if c.isalnum() or c == '_')
+
+
+class IndicePrefixo:
+    """ Chaves em lista ordenada para sugestões por prefixo (busca binária, sem consultar o banco).
+    Usado no autocompletar de placa e CPF/CNPJ, com os pares de listar_cadastro """
+
+    def __init__(self, pares=()):
+        pares = sorted(pares)
+        self.chaves = [chave for chave, _ in pares]
+        self.rotulos = [rotulo for _, rotulo in pares]
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def __contains__(self, chave):
+        posicao = bisect_left(self.chaves, chave)
+        return posicao < len(self.chaves) and self.chaves[posicao] == chave
+
+    def sugestoes(self, prefixo, limite=10):
+        """ Até limite pares (chave, rótulo) cujas chaves começam com prefixo, em ordem """
+        inicio = bisect_left(self.chaves, prefixo)
+        fim = min(bisect_left(self.chaves, prefixo + "\U0010ffff", inicio), inicio + limite)
+        return list(zip(self.chaves[inicio:fim], self.rotulos[inicio:fim]))
+
+    def adicionar(self, chave, rotulo):
+        """ Inclui a chave na posição ordenada, ou só troca o rótulo se ela já existir """
+        posicao = bisect_left(self.chaves, chave)
+        if posicao < len(self.chaves) and self.chaves[posicao] == chave:
+            self.rotulos[posicao] = rotulo
+        else:
+            self.chaves.insert(posicao, chave)
+            self.rotulos.insert(posicao, rotulo)
+
+    def remover(self, chave):
+        posicao = bisect_left(self.chaves, chave)
+        if posicao < len(self.chaves) and self.chaves[posicao] == chave:
+            del self.chaves[posicao]
+            del self.rotulos[posicao]
@@ -0,0 +1,126 @@
+import os
+from collections import OrderedDict
+
+from arquivos import gravacao_atomica
+
+# --- Partições Anuais (Arquivo Morto) ---
+# Recibos de anos já fechados saem do banco e vão para arquivos Parquet (colunares, comprimidos
+# com zstd), um par por ano, na pasta Arquivo_Recibos ao lado do banco:
+#   recibos_<ano>_<geracao>.parquet   colunas do recibo, chaves normalizadas e versao
+#   itens_<ano>_<geracao>.parquet     itens dos recibos do ano, com a data_iso do recibo
+# O índice das partições fica no banco (tabelas particoes e recibos_arquivados) e é quem manda:
+#   - um arquivo nunca é regravado: cada arquivamento do ano grava uma geração nova e o índice
+#     passa a apontar para ela na mesma transação que tira os recibos do banco
+#   - linhas de uma geração que o índice não aponta mais para a partição (recibo editado depois
+#     de arquivado) são ignoradas na leitura e descartadas no arquivamento seguinte
+#   - as gerações substituídas só são apagadas no arquivamento seguinte, com a escrita do banco
+#     reservada; quem leu o índice antigo e não acha mais o arquivo repete a consulta
+# Como uma geração nunca muda, as partições lidas ficam em memória (tabelas do pyarrow, até
+# LIMITE_CACHE_BYTES, as menos usadas saem primeiro): abrir e decodificar um Parquet custa mais que
+# a própria consulta, e a mesma partição costuma ser consultada várias vezes seguidas.
+# Requer o pacote opcional pyarrow; sem ele os recibos continuam todos no banco.
+
+PASTA_PARTICOES = "Arquivo_Recibos"
+TABELAS_PARTICAO = ("recibos", "itens")
+LIMITE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def particoes_disponiveis():
+    """ True se o pyarrow (leitura e gravação de Parquet pelo pandas) estiver instalado """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ParticoesAnuais:
+    """ Arquivos de uma pasta de partições; quais gerações valem é decidido pelo índice no banco.
+    Usada sob a trava do armazenamento (não é segura entre threads por si) """
+
+    def __init__(self, pasta, limite_cache=LIMITE_CACHE_BYTES):
+        self.pasta = pasta
+        self.limite_cache = limite_cache
+        self._cache = OrderedDict()   # (tabela, ano, geracao) -> pyarrow.Table
+        self._bytes_cache = 0
+
+    def nome(self, tabela, ano, geracao):
+        return f"{tabela}_{ano}_{geracao}.parquet"
+
+    def caminho(self, tabela, ano, geracao):
+        return os.path.join(self.pasta, self.nome(tabela, ano, geracao))
+
+    def _exigir_pyarrow(self):
+        if not particoes_disponiveis():
+            raise RuntimeError("Há recibos arquivados em partições Parquet: instale o pacote 'pyarrow' "
+                               "(pip install pyarrow) para consultá-los.")
+
+    def gravar(self, tabela, ano, geracao, df):
+        self._exigir_pyarrow()
+        os.makedirs(self.pasta, exist_ok=True)
+        with gravacao_atomica(self.caminho(tabela, ano, geracao)) as temporario:
+            df.to_parquet(temporario, engine="pyarrow", compression="zstd", index=False)
+
+    def _tabela(self, tabela, ano, geracao):
+        chave = (tabela, ano, geracao)
+        if chave in self._cache:
+            self._cache.move_to_end(chave)
+            return self._cache[chave]
+        self._exigir_pyarrow()
+        import pyarrow.parquet as pq
+
+        dados = pq.read_table(self.caminho(tabela, ano, geracao))
+        self._cache[chave] = dados
+        self._bytes_cache += dados.nbytes
+        while self._bytes_cache > self.limite_cache and len(self._cache) > 1:
+            self._bytes_cache -= self._cache.popitem(last=False)[1].nbytes
+        return dados
+
+    def _selecionar(self, tabela, ano, geracao, colunas, numeros):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        dados = self._tabela(tabela, ano, geracao)
+        if numeros is not None:
+            tipo = dados.schema.field("Numero_Recibo").type
+            dados = dados.filter(pc.is_in(dados["Numero_Recibo"], value_set=pa.array(list(numeros), type=tipo)))
+        return dados if colunas is None else dados.select(colunas)
+
+    def ler(self, tabela, ano, geracao, colunas=None, numeros=None):
+        """ DataFrame da partição, só com as colunas pedidas (conversão colunar) e, com numeros, só
+        com esses recibos (filtrados ainda no pyarrow, antes da conversão para o pandas) """
+        return self._selecionar(tabela, ano, geracao, colunas, numeros).to_pandas()
+
+    def registros(self, tabela, ano, geracao, colunas=None, numeros=None):
+        """ Como ler, mas em dicionários com tipos do Python (None nos vazios), sem passar pelo pandas """
+        return self._selecionar(tabela, ano, geracao, colunas, numeros).to_pylist()
+
+    def tamanho(self, ano, geracao):
+        """ Bytes ocupados pelos arquivos da partição """
+        return sum(os.path.getsize(self.caminho(tabela, ano, geracao)) for tabela in TABELAS_PARTICAO
+                   if os.path.exists(self.caminho(tabela, ano, geracao)))
+
+    def obsoletas(self, atuais):
+        """ Arquivos de gerações anteriores às atuais ({ano: geracao} do índice confirmado). Gerações
+        mais novas e anos fora do índice podem ser de um arquivamento ainda não confirmado em outra
+        estação e nunca entram """
+        if not os.path.isdir(self.pasta):
+            return []
+        nomes = []
+        for nome in os.listdir(self.pasta):
+            # Temporários (".") podem ser de um arquivamento em andamento em outra estação
+            if not nome.endswith(".parquet") or nome.startswith("."):
+                continue
+            partes = nome[:-len(".parquet")].split("_")
+            if (len(partes) == 3 and partes[0] in TABELAS_PARTICAO and partes[1] in atuais
+                    and partes[2].isdigit() and int(partes[2]) < atuais[partes[1]]):
+                nomes.append(nome)
+        return nomes
+
+    def limpar(self, atuais):
+        """ Apaga as gerações obsoletas; chamar com a escrita do banco reservada """
+        for nome in self.obsoletas(atuais):
+            try:
+                os.remove(os.path.join(self.pasta, nome))
+            except OSError:
+                pass   # ainda aberto por um leitor (Windows): sai no próximo arquivamento
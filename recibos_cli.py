@@ -0,0 +1,338 @@
+"""
+Linha de comando para criar, consultar e gerar PDFs de recibos sem abrir a interface.
+
+Exemplos:
+    python recibos_cli.py criar recibo.json --pdf
+    python recibos_cli.py buscar placa ABC1D23
+    python recibos_cli.py buscar texto "pastilha freio"
+    python recibos_cli.py listar --limite 20
+    python recibos_cli.py pdf 000123 -o recibo_000123.pdf
+    python recibos_cli.py lote --de 2024-03-01 --ate 2024-03-31 --pasta Recibos_Marco
+    python recibos_cli.py catalogo --descricao pastilha
+    python recibos_cli.py resumo --mes 2024-03
+    python recibos_cli.py relatorio --de 2024-01-01 --ate 2024-12-31 -o relatorio_2024.xlsx
+    python recibos_cli.py exportar-excel Historico.xlsx
+    python recibos_cli.py servidor --host 0.0.0.0 --porta 8765 --token SEGREDO
+    python recibos_cli.py backup --destino E:\\Backups_Recibos
+    python recibos_cli.py restaurar --ate 2024-03-31 --saida Restaurado
+    python recibos_cli.py arquivar --listar
+    python recibos_cli.py importar-cep ceps.csv
+
+O arquivo de entrada de "criar" é um JSON com os campos do recibo (mesmos nomes das
+colunas do histórico, ex.: "Nome_Cliente", "Placa_Veiculo") e a lista "itens", cada um com
+tipo, codigo, descricao, valor, quantia e desc (opcional). Também aceita uma lista de recibos.
+Com "versao" (a mostrada por "obter") o recibo só é atualizado se ninguém o alterou depois.
+Sem "Numero_Recibo" o recibo recebe o próximo número da sequência.
+A saída é sempre JSON, para uso por scripts e outras ferramentas.
+Com a variável RECIBOS_SERVIDOR (ex.: http://192.168.0.10:8765) os comandos usam o servidor de
+recibos em vez do banco local.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import nucleo
+from armazenamento import ArmazenamentoSQLite
+from nucleo import ErroValidacao, calcular_item, montar_recibo, validar_recibo, preparar_para_salvar, nome_arquivo_pdf
+
+
+def _ler_json(caminho):
+    if caminho == "-":
+        return json.load(sys.stdin)
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def _escrever_json(dados):
+    json.dump(dados, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+def _precisa_armazenamento(args):
+    """ Restauração, lista de backups e base de CEP não usam o banco: restaurar precisa funcionar
+    justamente quando ele está danificado """
+    return not (args.comando in ("restaurar", "importar-cep") or (args.comando == "backup" and args.listar))
+
+
+def _abrir(args):
+    if not _precisa_armazenamento(args):
+        return None
+    if args.banco:
+        return ArmazenamentoSQLite(args.banco)
+    # Servidor e backup trabalham com o arquivo local, mesmo com RECIBOS_SERVIDOR definida
+    return nucleo.abrir_armazenamento(local=args.comando in ("servidor", "backup"))
+
+
+def recibo_de_json(entrada):
+    """ Converte um recibo no formato do arquivo de entrada para o dicionário salvo no banco """
+    campos = {chave: valor for chave, valor in entrada.items() if chave != "itens"}
+    itens = [
+        calcular_item(item.get("tipo"), item.get("codigo"), item.get("descricao"),
+                      item.get("valor"), item.get("quantia"), item.get("desc", 0))
+        for item in entrada.get("itens", [])
+    ]
+    dados = montar_recibo(campos, itens)
+    campos_vazios = validar_recibo(dados)
+    if campos_vazios:
+        raise ErroValidacao("Campos obrigatórios não preenchidos: " + ", ".join(campos_vazios))
+    return preparar_para_salvar(dados)
+
+
+def _gerar_pdf(dados_recibo, caminho_pdf):
+    agora = datetime.now()
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_pdf)), exist_ok=True)
+    nucleo.criar_renderizador().gerar_pdf(
+        dados_recibo, caminho_pdf, agora.strftime("%d/%m/%Y"), agora.strftime("%H:%M:%S"))
+    return caminho_pdf
+
+
+def comando_criar(args, armazenamento):
+    entrada = _ler_json(args.arquivo)
+    recibos = entrada if isinstance(entrada, list) else [entrada]
+    # Valida tudo antes de gravar: um arquivo com erro não deixa metade dos recibos no banco
+    preparados = [recibo_de_json(recibo) for recibo in recibos]
+
+    resultado = []
+    for recibo, dados in zip(recibos, preparados):
+        # "versao" (a mostrada por obter) torna a atualização condicional: falha se o recibo mudou desde então
+        numero, atualizado = armazenamento.salvar(dados, novo=not dados["Numero_Recibo"], versao=recibo.get("versao"))
+        saida = {"Numero_Recibo": numero, "atualizado": atualizado, "Valor_Total_Final": dados["Valor_Total_Final"]}
+        if args.pdf:
+            pasta = args.pasta or nucleo.PASTA_RECIBOS_GERADOS
+            saida["pdf"] = _gerar_pdf(armazenamento.obter(numero), os.path.join(pasta, nome_arquivo_pdf(numero) + ".pdf"))
+        resultado.append(saida)
+    _escrever_json(resultado if isinstance(entrada, list) else resultado[0])
+
+
+def comando_obter(args, armazenamento):
+    dados = armazenamento.obter(args.numero)
+    if dados is None:
+        raise LookupError(f"Recibo {args.numero} não encontrado.")
+    _escrever_json(dados)
+
+
+def comando_buscar(args, armazenamento):
+    _escrever_json(armazenamento.buscar(args.campo, args.valor, limite=args.limite))
+
+
+def comando_listar(args, armazenamento):
+    _escrever_json(armazenamento.listar_recentes(limite=args.limite, deslocamento=args.deslocamento))
+
+
+def comando_pdf(args, armazenamento):
+    dados = armazenamento.obter(args.numero)
+    if dados is None:
+        raise LookupError(f"Recibo {args.numero} não encontrado.")
+    caminho_pdf = args.saida or os.path.join(nucleo.PASTA_RECIBOS_GERADOS, nome_arquivo_pdf(dados["Numero_Recibo"]) + ".pdf")
+    _escrever_json({"Numero_Recibo": dados["Numero_Recibo"], "pdf": _gerar_pdf(dados, caminho_pdf)})
+
+
+def comando_lote(args, armazenamento):
+    from exportacao_lote import exportar_lote
+
+    numeros = armazenamento.listar_numeros(args.de, args.ate, args.campo, args.valor)
+    pasta = args.pasta or nucleo.PASTA_RECIBOS_GERADOS
+    resultado = exportar_lote(armazenamento, numeros, pasta, nucleo.criar_renderizador(),
+                              arquivo_unico=args.arquivo_unico, processos=args.processos)
+    _escrever_json({"total": resultado.total, "gerados": resultado.gerados, "arquivos": resultado.arquivos,
+                    "falhas": [{"Numero_Recibo": n, "erro": m} for n, m in resultado.falhas],
+                    "segundos": round(resultado.segundos, 3)})
+
+
+def comando_catalogo(args, armazenamento):
+    if args.codigo is None and args.descricao is None:
+        _escrever_json(armazenamento.listar_catalogo())
+    else:
+        _escrever_json(armazenamento.buscar_catalogo(args.codigo, args.descricao, limite=args.limite))
+
+
+def comando_relatorio(args, armazenamento):
+    from relatorios import gerar_relatorio
+
+    relatorio = gerar_relatorio(armazenamento, args.de, args.ate)
+    saida = relatorio.resumo()
+    if args.saida:
+        saida["arquivos"] = relatorio.exportar(args.saida)
+    _escrever_json(saida)
+
+
+def comando_resumo(args, armazenamento):
+    hoje = datetime.now()
+    saida = {}
+    for periodo, data in (("dia", args.dia or hoje.strftime("%Y-%m-%d")), ("mes", args.mes or hoje.strftime("%Y-%m"))):
+        resumo = armazenamento.resumo_periodo(periodo, data)
+        saida[periodo] = {"data": data}
+        saida[periodo].update({categoria: {"quantidade": quantidade, "valor": valor}
+                               for categoria, (quantidade, valor) in resumo.items()})
+    _escrever_json(saida)
+
+
+def comando_servidor(args, armazenamento):
+    from servidor import iniciar_servidor
+
+    iniciar_servidor(armazenamento, nucleo.criar_renderizador(local=True), host=args.host, porta=args.porta,
+                     processos=args.processos, token=args.token or nucleo.TOKEN_SERVIDOR)
+
+
+def comando_backup(args, armazenamento):
+    from backup import RepositorioBackup
+
+    repositorio = RepositorioBackup(args.destino or nucleo.PASTA_BACKUPS)
+    if args.listar:
+        _escrever_json(repositorio.listar())
+        return
+    resultado = repositorio.criar(armazenamento, None if args.sem_pdfs else nucleo.PASTA_RECIBOS_GERADOS)
+    _escrever_json({"snapshot": resultado.snapshot, "arquivos": resultado.arquivos,
+                    "sem_alteracao": resultado.reaproveitados, "blocos_novos": resultado.blocos_novos,
+                    "bytes_novos": resultado.bytes_novos, "segundos": round(resultado.segundos, 3)})
+
+
+def comando_restaurar(args, armazenamento):
+    from backup import RepositorioBackup
+
+    repositorio = RepositorioBackup(args.destino or nucleo.PASTA_BACKUPS)
+    snapshot = args.snapshot or repositorio.escolher(args.ate)
+    _escrever_json({"snapshot": snapshot, "arquivos": repositorio.restaurar(args.saida, snapshot)})
+
+
+def comando_arquivar(args, armazenamento):
+    if not args.listar:
+        armazenamento.arquivar(args.ate_ano)
+    _escrever_json(armazenamento.listar_particoes())
+
+
+def comando_exportar_excel(args, armazenamento):
+    _escrever_json({"excel": args.caminho, "recibos": armazenamento.exportar_excel(args.caminho)})
+
+
+def comando_importar_cep(args, armazenamento):
+    from cep_offline import importar_base_cep
+
+    destino = args.destino or nucleo.ARQUIVO_BASE_CEP
+    _escrever_json({"base_cep": destino, "ceps": importar_base_cep(args.arquivo, destino, encoding=args.encoding)})
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(prog="recibos_cli", description="Gestão de recibos sem interface gráfica")
+    parser.add_argument("--banco", help="banco SQLite a usar (padrão: o mesmo do aplicativo)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("criar", help="cria ou atualiza recibos a partir de um JSON ('-' lê da entrada padrão)")
+    p.add_argument("arquivo")
+    p.add_argument("--pdf", action="store_true", help="gera também o PDF de cada recibo")
+    p.add_argument("--pasta", help="pasta dos PDFs (padrão: Recibos_Gerados)")
+    p.set_defaults(funcao=comando_criar)
+
+    p = sub.add_parser("obter", help="mostra um recibo completo, com itens")
+    p.add_argument("numero")
+    p.set_defaults(funcao=comando_obter)
+
+    p = sub.add_parser("buscar", help="busca recibos por número, placa, CPF/CNPJ, início do nome "
+                                      "ou qualquer palavra ('texto': cliente, veículo, observações e itens)")
+    p.add_argument("campo", choices=["numero", "placa", "cpf_cnpj", "nome", "texto"])
+    p.add_argument("valor")
+    p.add_argument("--limite", type=int, default=200)
+    p.set_defaults(funcao=comando_buscar)
+
+    p = sub.add_parser("listar", help="lista os recibos mais recentes")
+    p.add_argument("--limite", type=int, default=50)
+    p.add_argument("--deslocamento", type=int, default=0)
+    p.set_defaults(funcao=comando_listar)
+
+    p = sub.add_parser("pdf", help="gera o PDF de um recibo salvo")
+    p.add_argument("numero")
+    p.add_argument("-o", "--saida", help="caminho do PDF (padrão: Recibos_Gerados/recibo_<numero>.pdf)")
+    p.set_defaults(funcao=comando_pdf)
+
+    p = sub.add_parser("lote", help="gera os PDFs de vários recibos em paralelo")
+    p.add_argument("--de", help="data inicial (aaaa-mm-dd)")
+    p.add_argument("--ate", help="data final (aaaa-mm-dd)")
+    p.add_argument("--campo", choices=["placa", "cpf_cnpj", "nome"])
+    p.add_argument("--valor")
+    p.add_argument("--pasta", help="pasta de destino (padrão: Recibos_Gerados)")
+    p.add_argument("--arquivo-unico", help="junta todos os PDFs neste arquivo (requer pypdf)")
+    p.add_argument("--processos", type=int)
+    p.set_defaults(funcao=comando_lote)
+
+    p = sub.add_parser("catalogo", help="peças e serviços já lançados, com o último valor unitário")
+    grupo = p.add_mutually_exclusive_group()
+    grupo.add_argument("--codigo", help="início do código")
+    grupo.add_argument("--descricao", help="início da descrição")
+    p.add_argument("--limite", type=int, default=20)
+    p.set_defaults(funcao=comando_catalogo)
+
+    p = sub.add_parser("resumo", help="recibos, faturamento e itens por tipo de um dia e de um mês (padrão: hoje)")
+    p.add_argument("--dia", help="aaaa-mm-dd")
+    p.add_argument("--mes", help="aaaa-mm")
+    p.set_defaults(funcao=comando_resumo)
+
+    p = sub.add_parser("relatorio", help="faturamento, peças x serviços, principais clientes, por responsável e box")
+    p.add_argument("--de", help="data inicial (aaaa-mm-dd)")
+    p.add_argument("--ate", help="data final (aaaa-mm-dd)")
+    p.add_argument("-o", "--saida", help="exporta as tabelas: .xlsx (uma aba por relatório) ou .csv (um arquivo por relatório)")
+    p.set_defaults(funcao=comando_relatorio)
+
+    p = sub.add_parser("servidor", help="atende as estações pela rede (defina RECIBOS_SERVIDOR=http://host:porta nelas)")
+    p.add_argument("--host", default="127.0.0.1", help="0.0.0.0 para aceitar conexões da rede local (exige --token)")
+    p.add_argument("--porta", type=int, default=8765)
+    p.add_argument("--processos", type=int, default=2, help="processos de renderização de PDF")
+    p.add_argument("--token", help="exige 'Authorization: Bearer <token>' (padrão: RECIBOS_TOKEN); "
+                                        "obrigatório fora de 127.0.0.1")
+    p.set_defaults(funcao=comando_servidor)
+
+    p = sub.add_parser("backup", help="backup incremental do banco e dos PDFs (só o que mudou desde o último)")
+    p.add_argument("--destino", help="pasta dos backups (padrão: Backups ao lado do aplicativo)")
+    p.add_argument("--sem-pdfs", action="store_true", help="só o banco")
+    p.add_argument("--listar", action="store_true", help="lista os backups existentes")
+    p.set_defaults(funcao=comando_backup)
+
+    p = sub.add_parser("restaurar", help="recria o banco e os PDFs de um backup em outra pasta")
+    p.add_argument("--saida", required=True, help="pasta onde os arquivos serão recriados")
+    p.add_argument("--destino", help="pasta dos backups (padrão: Backups ao lado do aplicativo)")
+    grupo = p.add_mutually_exclusive_group()
+    grupo.add_argument("--snapshot", help="id do backup (ver backup --listar); padrão: o mais recente")
+    grupo.add_argument("--ate", help="o backup mais recente feito até esta data (aaaa-mm-dd [hh:mm])")
+    p.set_defaults(funcao=comando_restaurar)
+
+    p = sub.add_parser("arquivar", help="move os recibos de anos fechados para partições Parquet (requer pyarrow)")
+    grupo = p.add_mutually_exclusive_group()
+    grupo.add_argument("--ate-ano", type=int, help="arquiva os anos anteriores a este (padrão: o ano corrente)")
+    grupo.add_argument("--listar", action="store_true", help="só lista as partições existentes, sem arquivar")
+    p.set_defaults(funcao=comando_arquivar)
+
+    p = sub.add_parser("exportar-excel", help="exporta o histórico para uma planilha")
+    p.add_argument("caminho")
+    p.set_defaults(funcao=comando_exportar_excel)
+
+    p = sub.add_parser("importar-cep", help="instala a base de CEPs offline a partir de um CSV "
+                                            "(colunas cep, logradouro, bairro, cidade, uf)")
+    p.add_argument("arquivo")
+    p.add_argument("--destino", help="arquivo da base (padrão: Base_CEP.bin ao lado do aplicativo)")
+    p.add_argument("--encoding", default="utf-8-sig")
+    p.set_defaults(funcao=comando_importar_cep)
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    armazenamento = None
+    try:
+        armazenamento = _abrir(args)
+        args.funcao(args, armazenamento)
+    except (ErroValidacao, LookupError, OSError, RuntimeError, ValueError, sqlite3.DatabaseError) as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if armazenamento is not None:
+            armazenamento.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+from arquivos import gravacao_atomica
+
+# --- Relatórios de Faturamento e Serviços ---
+# Os recibos e os itens do período são lidos uma vez, em colunas tipadas (DataFrames), e cada
+# relatório é uma agregação vetorizada (groupby/pivot) sobre essas colunas, sem laço por recibo.
+
+# Relatórios disponíveis: nome -> título (também o nome da aba na planilha exportada)
+RELATORIOS = {
+    "faturamento_dia": "Faturamento por dia",
+    "faturamento_mes": "Faturamento por mês",
+    "pecas_servicos": "Peças x Serviços",
+    "top_clientes": "Principais clientes",
+    "por_responsavel": "Por responsável",
+    "por_box": "Por box",
+}
+
+
+class Relatorio:
+    """ Relatórios de um período, calculados a partir de ArmazenamentoRecibos.dados_relatorio """
+
+    def __init__(self, recibos, itens, data_inicio=None, data_fim=None):
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self._tabelas = {}
+        self.recibos = recibos.assign(
+            data=pd.to_datetime(recibos["data_iso"], format="%Y-%m-%d", errors="coerce"),
+            valor=pd.to_numeric(recibos["Valor_Total_Final"], errors="coerce").fillna(0.0),
+        )
+        self.itens = itens.assign(
+            data=pd.to_datetime(itens["data_iso"], format="%Y-%m-%d", errors="coerce"),
+            valor_total=pd.to_numeric(itens["valor_total"], errors="coerce").fillna(0.0),
+            tipo=itens["tipo"].fillna("Outros").replace("", "Outros"),
+        )
+
+    def faturamento(self, periodo="dia"):
+        """ Recibos, faturamento e ticket médio por dia ("dia") ou por mês ("mes") """
+        datas = self.recibos["data"].dt.to_period("D" if periodo == "dia" else "M")
+        tabela = self.recibos.groupby(datas)["valor"].agg(recibos="count", faturamento="sum", ticket_medio="mean")
+        tabela.index = tabela.index.astype(str)
+        return tabela.rename_axis(periodo).reset_index()
+
+    def pecas_servicos(self):
+        """ Valor dos itens por mês e tipo (Peça, Serviço...), com o total do mês """
+        meses = self.itens["data"].dt.to_period("M").astype(str).rename("mes")
+        tabela = self.itens.pivot_table(index=meses, columns="tipo", values="valor_total",
+                                        aggfunc="sum", fill_value=0.0)
+        tabela.columns.name = None
+        tabela["Total"] = tabela.sum(axis=1)
+        return tabela.reset_index()
+
+    def top_clientes(self, quantidade=10):
+        """ Clientes com maior faturamento no período (pelo CPF/CNPJ ou, sem ele, pelo nome) """
+        chave = self.recibos["documento_normalizado"].where(
+            self.recibos["documento_normalizado"].fillna("") != "", self.recibos["nome_normalizado"])
+        ordenados = self.recibos.assign(cliente=chave).dropna(subset=["cliente"]).sort_values("Numero_Recibo")
+        tabela = ordenados.groupby("cliente").agg(
+            nome=("Nome_Cliente", "last"), cpf_cnpj=("documento_normalizado", "last"),
+            recibos=("valor", "count"), faturamento=("valor", "sum"), ticket_medio=("valor", "mean"),
+        )
+        return tabela.nlargest(quantidade, "faturamento").reset_index(drop=True)
+
+    def _por_coluna(self, coluna, nome):
+        grupos = self.recibos[coluna].fillna("").replace("", "(não informado)").rename(nome)
+        tabela = self.recibos.groupby(grupos)["valor"].agg(recibos="count", faturamento="sum", ticket_medio="mean")
+        return tabela.sort_values("faturamento", ascending=False).reset_index()
+
+    def por_responsavel(self):
+        return self._por_coluna("Responsavel", "responsavel")
+
+    def por_box(self):
+        return self._por_coluna("Box_Veiculo", "box")
+
+    def resumo(self):
+        """ Totais do período: recibos, faturamento, ticket médio e valor de cada tipo de item """
+        total = float(self.recibos["valor"].sum())
+        quantidade = int(len(self.recibos))
+        por_tipo = self.itens.groupby("tipo")["valor_total"].sum()
+        return {
+            "data_inicio": self.data_inicio, "data_fim": self.data_fim,
+            "recibos": quantidade, "faturamento": round(total, 2),
+            "ticket_medio": round(total / quantidade, 2) if quantidade else 0.0,
+            "itens_por_tipo": {tipo: round(float(valor), 2) for tipo, valor in por_tipo.items()},
+        }
+
+    def tabela(self, nome):
+        """ DataFrame do relatório nome (chave de RELATORIOS), calculado uma vez por período """
+        if nome not in self._tabelas:
+            if nome == "faturamento_dia":
+                self._tabelas[nome] = self.faturamento("dia")
+            elif nome == "faturamento_mes":
+                self._tabelas[nome] = self.faturamento("mes")
+            else:
+                self._tabelas[nome] = getattr(self, nome)()
+        return self._tabelas[nome]
+
+    def exportar(self, caminho):
+        """ .xlsx: uma aba por relatório. Outra extensão: um CSV por relatório, com o nome do
+        relatório acrescentado ao nome do arquivo. Retorna a lista de arquivos gravados """
+        base, extensao = os.path.splitext(caminho)
+        if extensao.lower() == ".xlsx":
+            with gravacao_atomica(caminho) as temporario, pd.ExcelWriter(temporario) as planilha:
+                for nome, titulo in RELATORIOS.items():
+                    self.tabela(nome).to_excel(planilha, sheet_name=titulo[:31], index=False)
+            return [caminho]
+        arquivos = []
+        for nome in RELATORIOS:
+            arquivo = f"{base}_{nome}{extensao or '.csv'}"
+            # ";" e vírgula decimal: abre direto no Excel em português
+            with gravacao_atomica(arquivo) as temporario:
+                self.tabela(nome).to_csv(temporario, sep=";", decimal=",", index=False, encoding="utf-8-sig")
+            arquivos.append(arquivo)
+        return arquivos
+
+
+def gerar_relatorio(armazenamento, data_inicio=None, data_fim=None):
+    """ Lê o período (datas ISO, inclusivas; None = sem limite) e devolve o Relatorio """
+    inicio = time.perf_counter()
+    recibos, itens = armazenamento.dados_relatorio(data_inicio, data_fim)
+    relatorio = Relatorio(recibos, itens, data_inicio, data_fim)
+    print(f"Relatório: {len(recibos)} recibos e {len(itens)} itens lidos em "
+          f"{time.perf_counter() - inicio:.3f} s", file=sys.stderr)
+    return relatorio
@@ -0,0 +1,159 @@
+import base64
+import math
+import os
+import sys
+
+from arquivos import gravacao_atomica
+
+# --- Renderização do Recibo (HTML/PDF) ---
+# Não depende do PyQt5: pode rodar em threads de trabalho ou em outros processos.
+# Jinja2 e WeasyPrint (que traz cairo/pango/fontes) são importados só no primeiro uso,
+# para não atrasar a abertura da janela.
+
+NOME_TEMPLATE_RECIBO = "recibo_template.html"
+
+
+def _vazio(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def format_money(value):
+    try:
+        if _vazio(value):
+            value = 0.0
+        val = float(value)
+        return f"{val:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    except (ValueError, TypeError):
+        return f"{0.00:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def km_format(value):
+    try:
+        if _vazio(value):
+            value = ""
+        clean_text = ''.join(filter(str.isdigit, str(value)))
+        if clean_text:
+            return f"{int(clean_text):,}".replace(',', '.')
+        return ""
+    except (ValueError, TypeError):
+        return ""
+
+
+def default_if_nan(value):
+    if _vazio(value):
+        return ""
+    return str(value)
+
+
+def _assinatura_arquivo(caminho):
+    """ (mtime, tamanho) do arquivo, ou None se não existir: muda quando o arquivo é alterado """
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+class RenderizadorRecibo:
+    """ Mantém entre renderizações o que não muda de um recibo para outro: logo já em base64,
+    template compilado, folhas de estilo (.css da pasta de templates) já interpretadas e a
+    configuração de fontes do WeasyPrint. Cada item é recarregado quando o arquivo de origem muda. """
+
+    def __init__(self, pasta_templates, info_oficina, caminhos_logo=()):
+        self.pasta_templates = pasta_templates
+        self.info_oficina = info_oficina
+        self.caminhos_logo = list(caminhos_logo)
+        self._env = None
+        self._cache_logo = (None, None)          # (assinaturas dos candidatos, base64)
+        self._cache_css = {}                     # caminho -> (assinatura, CSS)
+        self._font_config = None
+
+    @property
+    def env(self):
+        if self._env is None:
+            from jinja2 import Environment, FileSystemLoader
+
+            # auto_reload: o Jinja2 reaproveita o template compilado enquanto o arquivo não mudar
+            self._env = Environment(loader=FileSystemLoader(self.pasta_templates), auto_reload=True)
+            self._env.filters['format_money'] = format_money
+            self._env.filters['km_format'] = km_format
+            self._env.filters['default_if_nan'] = default_if_nan
+        return self._env
+
+    def carregar_logo_base64(self):
+        assinaturas = tuple(_assinatura_arquivo(caminho) for caminho in self.caminhos_logo)
+        if self._cache_logo[0] == assinaturas:
+            return self._cache_logo[1]
+        logo_base64_data = None
+        for logo_absolute_path, assinatura in zip(self.caminhos_logo, assinaturas):
+            if assinatura is not None:
+                with open(logo_absolute_path, "rb") as image_file:
+                    logo_base64_data = base64.b64encode(image_file.read()).decode('utf-8')
+                break
+        else:
+            print(f"ALERTA: Arquivo de logo não encontrado em {self.caminhos_logo}", file=sys.stderr)
+        self._cache_logo = (assinaturas, logo_base64_data)
+        return logo_base64_data
+
+    def _configuracao_fontes(self):
+        if self._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+
+            self._font_config = FontConfiguration()
+        return self._font_config
+
+    def folhas_de_estilo(self):
+        """ CSS da pasta de templates, interpretados uma vez e reaproveitados enquanto não mudarem """
+        try:
+            nomes = sorted(n for n in os.listdir(self.pasta_templates) if n.lower().endswith(".css"))
+        except OSError:
+            nomes = []
+        if nomes:
+            from weasyprint import CSS
+        folhas = []
+        caminhos = set()
+        for nome in nomes:
+            caminho = os.path.join(self.pasta_templates, nome)
+            caminhos.add(caminho)
+            assinatura = _assinatura_arquivo(caminho)
+            em_cache = self._cache_css.get(caminho)
+            if em_cache is None or em_cache[0] != assinatura:
+                em_cache = (assinatura, CSS(filename=caminho, font_config=self._configuracao_fontes()))
+                self._cache_css[caminho] = em_cache
+            folhas.append(em_cache[1])
+        for caminho in set(self._cache_css) - caminhos:
+            del self._cache_css[caminho]
+        return folhas
+
+    def aquecer(self):
+        """ Carrega antecipadamente template, logo, estilos e fontes (ex.: ao iniciar um processo de trabalho) """
+        self.env.get_template(NOME_TEMPLATE_RECIBO)
+        self.carregar_logo_base64()
+        self.folhas_de_estilo()
+
+    def renderizar_html(self, dados_recibo, data_atual, hora_atual):
+        template = self.env.get_template(NOME_TEMPLATE_RECIBO)
+        return template.render({
+            'dados': dados_recibo,
+            'info_oficina': self.info_oficina,
+            'logo_base64': self.carregar_logo_base64(),
+            'data_atual': data_atual,
+            'hora_atual': hora_atual
+        })
+
+    def gerar_pdf(self, dados_recibo, caminho_pdf, data_atual, hora_atual, progresso=None):
+        """ Gera o PDF do recibo em caminho_pdf.
+        progresso, se informado, recebe (percentual, etapa) ao fim de cada etapa """
+        from weasyprint import HTML
+
+        progresso = progresso or (lambda percentual, etapa: None)
+        html_content = self.renderizar_html(dados_recibo, data_atual, hora_atual)
+        progresso(20, "Template preenchido")
+        documento = HTML(string=html_content, base_url=os.getcwd()).render(
+            stylesheets=self.folhas_de_estilo(), font_config=self._configuracao_fontes())
+        progresso(70, "Layout calculado")
+        # PDF pela metade nunca fica no lugar do anterior (ex.: recibo reimpresso e o processo interrompido)
+        with gravacao_atomica(caminho_pdf) as temporario:
+            documento.write_pdf(temporario)
+        progresso(100, "PDF gravado")
+        return caminho_pdf
@@ -0,0 +1,217 @@
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from armazenamento import ConflitoVersao
+from exportacao_lote import _inicializar_processo, _renderizar_recibo
+
+# --- Servidor de Recibos ---
+# Processo único, de longa duração, dono do banco e dos processos de renderização de PDF:
+# índices, cache de templates e WeasyPrint ficam carregados e são compartilhados por todas as
+# estações. Protocolo (JSON, HTTP/1.1 com keep-alive):
+#   POST /api/<metodo>   {"args": [...], "kwargs": {...}} -> {"resultado": ...}
+#                        (métodos de ArmazenamentoRecibos listados em METODOS_REMOTOS)
+#   POST /pdf            {"dados": recibo, "data_atual", "hora_atual"} -> application/pdf
+#   GET  /excel          -> planilha do histórico (.xlsx); quantidade de recibos no cabeçalho X-Recibos
+#   GET  /saude          -> {"recibos": quantidade}
+# Erros: 409 ConflitoVersao, 400 dado inválido, 401 token, 404 caminho/método desconhecido, 500 outros.
+# Fora do próprio computador o token é obrigatório: sem ele qualquer máquina da rede poderia
+# alterar recibos e baixar a planilha com os dados dos clientes.
+
+PORTA_PADRAO = 8765
+
+# Métodos do armazenamento acessíveis pela rede (exportar_excel e fechar têm tratamento próprio)
+METODOS_REMOTOS = {
+    "obter", "salvar", "deletar", "listar_recentes", "buscar", "listar_numeros", "contar", "listar_pagina",
+    "totais_por_tipo_item", "dados_relatorio", "resumo_periodo", "proximo_numero", "enderecos_por_cep",
+    "listar_cadastro", "obter_cadastro", "listar_catalogo", "buscar_catalogo",
+    "versao_dados", "ultima_alteracao", "alteracoes_desde", "linhas_historico", "arquivar", "listar_particoes",
+}
+
+
+def para_json(valor):
+    """ default= do json.dumps: DataFrames (dados_relatorio) viajam no formato "split" do pandas """
+    if hasattr(valor, "to_dict") and hasattr(valor, "columns"):
+        return {"__dataframe__": valor.to_dict(orient="split")}
+    return str(valor)
+
+
+def de_json(objeto):
+    """ object_hook do json.loads, inverso de para_json """
+    if "__dataframe__" in objeto:
+        import pandas as pd
+
+        return pd.DataFrame(**objeto["__dataframe__"])
+    return objeto
+
+
+class ManipuladorRecibos(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: o cliente reaproveita a conexão entre chamadas
+    # Cabeçalhos e corpo saem em escritas separadas: sem TCP_NODELAY, o ACK atrasado do cliente
+    # segura cada resposta por ~40 ms em uma conexão reaproveitada
+    disable_nagle_algorithm = True
+
+    def _responder(self, status, corpo, tipo="application/json", cabecalhos=None):
+        if tipo == "application/json":
+            corpo = json.dumps(corpo, ensure_ascii=False, default=para_json).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _erro(self, status, tipo, mensagem, **extras):
+        self._responder(status, {"erro": tipo, "mensagem": mensagem, **extras})
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(tamanho) or b"{}") if tamanho else {}
+
+    def _autorizado(self):
+        token = self.server.token
+        # compare_digest: o tempo da comparação não revela quantos caracteres do token estão certos
+        if token and not hmac.compare_digest(self.headers.get("Authorization", "").encode("utf-8"),
+                                             f"Bearer {token}".encode("utf-8")):
+            self._erro(401, "token", "Token do servidor de recibos ausente ou inválido.")
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        if self.path == "/saude":
+            self._responder(200, {"recibos": self.server.armazenamento.contar()})
+        elif self.path == "/excel":
+            self._tratar(self._exportar_excel)
+        else:
+            self._erro(404, "caminho", f"Caminho desconhecido: {self.path}")
+
+    def do_POST(self):
+        try:
+            corpo = self._ler_corpo()
+        except ValueError as e:
+            self._erro(400, "json", f"Corpo JSON inválido: {e}")
+            return
+        if not self._autorizado():
+            return
+        if self.path.startswith("/api/"):
+            self._tratar(self._chamar_metodo, self.path[len("/api/"):], corpo)
+        elif self.path == "/pdf":
+            self._tratar(self._gerar_pdf, corpo)
+        else:
+            self._erro(404, "caminho", f"Caminho desconhecido: {self.path}")
+
+    def _tratar(self, funcao, *args):
+        try:
+            funcao(*args)
+        except ConflitoVersao as e:
+            self._erro(409, "conflito", str(e), numero_recibo=e.numero_recibo, versao_atual=e.versao_atual)
+        except (ValueError, TypeError, KeyError) as e:
+            self._erro(400, "validacao", str(e))
+        except Exception as e:
+            print(f"Servidor de recibos: erro em {self.path}: {e}", file=sys.stderr)
+            self._erro(500, "interno", str(e))
+
+    def _chamar_metodo(self, metodo, corpo):
+        if metodo not in METODOS_REMOTOS:
+            self._erro(404, "metodo", f"Método desconhecido: {metodo}")
+            return
+        resultado = getattr(self.server.armazenamento, metodo)(*corpo.get("args", []), **corpo.get("kwargs", {}))
+        self._responder(200, {"resultado": resultado})
+
+    def _gerar_pdf(self, corpo):
+        descritor, caminho_pdf = tempfile.mkstemp(suffix=".pdf")
+        os.close(descritor)
+        try:
+            self.server.renderizacao.submit(
+                _renderizar_recibo, corpo["dados"], caminho_pdf, corpo["data_atual"], corpo["hora_atual"]
+            ).result()
+            with open(caminho_pdf, "rb") as arquivo:
+                self._responder(200, arquivo.read(), tipo="application/pdf")
+        finally:
+            os.remove(caminho_pdf)
+
+    def _exportar_excel(self):
+        pasta = tempfile.mkdtemp()
+        caminho = os.path.join(pasta, "Recibos_Historico.xlsx")
+        try:
+            total = self.server.armazenamento.exportar_excel(caminho)
+            with open(caminho, "rb") as arquivo:
+                self._responder(200, arquivo.read(),
+                                tipo="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                cabecalhos={"X-Recibos": str(total)})
+        finally:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            os.rmdir(pasta)
+
+    def log_request(self, code="-", size="-"):
+        pass   # uma linha por chamada atrasaria o servidor; erros continuam em log_error
+
+    def log_message(self, formato, *args):
+        print(f"Servidor de recibos: {self.address_string()} {formato % args}", file=sys.stderr)
+
+
+class ServidorRecibos(ThreadingHTTPServer):
+    """ Uma thread por conexão; o armazenamento serializa o acesso ao banco e os PDFs vão para um
+    conjunto de processos já aquecidos (mesmos de exportacao_lote) """
+
+    daemon_threads = True
+
+    def __init__(self, endereco, armazenamento, renderizador, processos=2, token=None):
+        super().__init__(endereco, ManipuladorRecibos)
+        self.armazenamento = armazenamento
+        self.token = token
+        self.renderizacao = ProcessPoolExecutor(
+            max_workers=processos, initializer=_inicializar_processo,
+            initargs=(renderizador.pasta_templates, renderizador.info_oficina, renderizador.caminhos_logo)
+        )
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{'127.0.0.1' if host in ('', '0.0.0.0') else host}:{porta}"
+
+    def server_close(self):
+        super().server_close()
+        self.renderizacao.shutdown()
+
+
+def somente_local(host):
+    """ True se o endereço só aceita conexões do próprio computador """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def iniciar_servidor(armazenamento, renderizador, host="127.0.0.1", porta=PORTA_PADRAO, processos=2, token=None,
+                     em_segundo_plano=False):
+    """ Cria o servidor (porta=0 escolhe uma porta livre). em_segundo_plano=True atende em uma thread
+    e retorna logo (uso em testes e benchmarks); senão atende até Ctrl+C. Levanta RuntimeError se
+    host aceitar conexões da rede e não houver token """
+    if not token and not somente_local(host):
+        raise RuntimeError(f"O servidor em {host or '0.0.0.0'} ficaria aberto a toda a rede: "
+                           "defina um token (--token ou RECIBOS_TOKEN).")
+    servidor = ServidorRecibos((host, porta), armazenamento, renderizador, processos=processos, token=token)
+    print(f"Servidor de recibos em {servidor.url}", file=sys.stderr)
+    if em_segundo_plano:
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        return servidor
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return servidor
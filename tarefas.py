@@ -0,0 +1,127 @@
+import sys
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+# --- Tarefas em Segundo Plano ---
+# Trabalhos demorados rodam em um QThreadPool; o resultado volta para a
+# interface pelos sinais (entregues na thread da GUI).
+
+
+class SinaisTarefaPDF(QObject):
+    progresso = pyqtSignal(str, int, str)   # numero_recibo, percentual, etapa
+    concluido = pyqtSignal(str, str)        # numero_recibo, caminho_pdf
+    falhou = pyqtSignal(str, str)           # numero_recibo, mensagem
+
+
+class TarefaGerarPDF(QRunnable):
+    def __init__(self, renderizador, dados_recibo, caminho_pdf, data_atual, hora_atual):
+        super().__init__()
+        self.renderizador = renderizador
+        self.dados_recibo = dados_recibo
+        self.caminho_pdf = caminho_pdf
+        self.data_atual = data_atual
+        self.hora_atual = hora_atual
+        self.sinais = SinaisTarefaPDF()
+
+    def run(self):
+        numero_recibo = str(self.dados_recibo.get("Numero_Recibo", ""))
+        try:
+            self.renderizador.gerar_pdf(
+                self.dados_recibo, self.caminho_pdf, self.data_atual, self.hora_atual,
+                progresso=lambda percentual, etapa: self.sinais.progresso.emit(numero_recibo, percentual, etapa)
+            )
+            self.sinais.concluido.emit(numero_recibo, self.caminho_pdf)
+        except Exception as e:
+            print(f"ERRO CRÍTICO ao gerar PDF: {e}", file=sys.stderr)
+            traceback.print_exc()
+            self.sinais.falhou.emit(numero_recibo, str(e))
+
+
+class SinaisTarefaLote(QObject):
+    progresso = pyqtSignal(int, int)        # concluidos, total
+    concluido = pyqtSignal(object)          # ResultadoExportacao
+    falhou = pyqtSignal(str)                # mensagem
+
+
+class TarefaExportacaoLote(QRunnable):
+    def __init__(self, armazenamento, numeros_recibo, pasta_saida, renderizador, arquivo_unico=None):
+        super().__init__()
+        self.armazenamento = armazenamento
+        self.numeros_recibo = numeros_recibo
+        self.pasta_saida = pasta_saida
+        self.renderizador = renderizador
+        self.arquivo_unico = arquivo_unico
+        self.sinais = SinaisTarefaLote()
+
+    def run(self):
+        try:
+            # Adiado: o pool de processos (multiprocessing) só é carregado na primeira exportação
+            from exportacao_lote import exportar_lote
+
+            resultado = exportar_lote(
+                self.armazenamento, self.numeros_recibo, self.pasta_saida, self.renderizador,
+                arquivo_unico=self.arquivo_unico, progresso=self.sinais.progresso.emit
+            )
+            self.sinais.concluido.emit(resultado)
+        except Exception as e:
+            print(f"ERRO na exportação em lote: {e}", file=sys.stderr)
+            traceback.print_exc()
+            self.sinais.falhou.emit(str(e))
+
+
+class SinaisTarefaRelatorio(QObject):
+    concluido = pyqtSignal(object)          # relatorios.Relatorio, com as tabelas já calculadas
+    falhou = pyqtSignal(str)                # mensagem
+
+
+class TarefaRelatorio(QRunnable):
+    def __init__(self, armazenamento, data_inicio=None, data_fim=None):
+        super().__init__()
+        self.armazenamento = armazenamento
+        self.data_inicio = data_inicio
+        self.data_fim = data_fim
+        self.sinais = SinaisTarefaRelatorio()
+
+    def run(self):
+        try:
+            # Adiado: o pandas só é carregado no primeiro relatório
+            from relatorios import RELATORIOS, gerar_relatorio
+
+            relatorio = gerar_relatorio(self.armazenamento, self.data_inicio, self.data_fim)
+            for nome in RELATORIOS:
+                relatorio.tabela(nome)
+            self.sinais.concluido.emit(relatorio)
+        except Exception as e:
+            print(f"ERRO ao gerar relatório: {e}", file=sys.stderr)
+            traceback.print_exc()
+            self.sinais.falhou.emit(str(e))
+
+
+class SinaisTarefaCEP(QObject):
+    concluido = pyqtSignal(int, str, object)        # geracao, cep, endereço (None = CEP inexistente)
+    falhou = pyqtSignal(int, str, str, bool)        # geracao, cep, mensagem, erro_de_conexao
+
+
+class TarefaConsultarCEP(QRunnable):
+    """ Consulta um CEP fora da thread da GUI. geracao identifica o pedido: a interface descarta
+    respostas de pedidos que o usuário já abandonou ao editar o CEP de novo """
+
+    def __init__(self, consulta_cep, cep, geracao):
+        super().__init__()
+        self.consulta_cep = consulta_cep
+        self.cep = cep
+        self.geracao = geracao
+        self.sinais = SinaisTarefaCEP()
+
+    def run(self):
+        from cep import ErroConsultaCEP
+
+        try:
+            endereco = self.consulta_cep.consultar(self.cep)
+            self.sinais.concluido.emit(self.geracao, self.cep, endereco)
+        except ErroConsultaCEP as e:
+            self.sinais.falhou.emit(self.geracao, self.cep, str(e), True)
+        except Exception as e:
+            print(f"Erro ao consultar CEP {self.cep}: {e}", file=sys.stderr)
+            self.sinais.falhou.emit(self.geracao, self.cep, str(e), False)